@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .exportacao import data_iso, resposta_streaming
+from .models import Alteracao, ItemPeca, OrdemServico, Orcamento, Peca
+from .signals import estoque_alterado
+
+# Change log das tabelas de domínio para sistemas de fora (contabilidade,
+# compras, BI) sincronizarem por incremento em vez de reler tudo.
+#
+# Escrita: receivers de post_save/post_delete e de estoque_alterado gravam
+# uma Alteracao com a linha inteira depois da escrita, dentro da transação
+# dela (save/delete desses models e as movimentações do PecaManager são
+# atômicos). Escritas em lote (update(), bulk_*) chamam registrar() à mão.
+#
+# Leitura: GET /api/alteracoes/?desde=<offset> devolve em JSON lines as
+# entradas com id > offset, em ordem; o consumidor guarda o último offset
+# lido. A compactação (manage.py compactar_alteracoes) apaga entradas
+# antigas que já têm uma mais recente do mesmo objeto.
+
+TABELAS = {model._meta.model_name: model for model in (Peca, Orcamento, OrdemServico, ItemPeca)}
+
+
+def colunas(model):
+    return [campo.attname for campo in model._meta.concrete_fields]
+
+
+def ler_linhas(model, ids):
+    return {linha['id']: linha for linha in model.objects.filter(pk__in=ids).values(*colunas(model))}
+
+
+def registrar(model, ids, operacao, detalhes=None):
+    """Uma entrada por id com a linha atual, lida do banco numa query; detalhes é {id: detalhe}."""
+    linhas = ler_linhas(model, ids)
+    detalhes = detalhes or {}
+    Alteracao.objects.bulk_create([
+        Alteracao(
+            tabela=model._meta.model_name, objeto_id=pk, operacao=operacao,
+            dados=linhas[pk], detalhe=detalhes.get(pk),
+        )
+        for pk in ids if pk in linhas
+    ], batch_size=1000)
+
+
+@receiver(post_save, sender=Peca)
+@receiver(post_save, sender=Orcamento)
+@receiver(post_save, sender=OrdemServico)
+@receiver(post_save, sender=ItemPeca)
+def registrar_save(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None or instance.get_deferred_fields():
+        # save parcial: o resto da instância pode estar velho ou nem ter sido lido
+        dados = ler_linhas(sender, [instance.pk]).get(instance.pk)
+    else:
+        dados = {coluna: getattr(instance, coluna) for coluna in colunas(sender)}
+    Alteracao.objects.create(
+        tabela=sender._meta.model_name, objeto_id=instance.pk,
+        operacao='criacao' if created else 'atualizacao', dados=dados,
+    )
+
+
+@receiver(post_delete, sender=Peca)
+@receiver(post_delete, sender=Orcamento)
+@receiver(post_delete, sender=OrdemServico)
+@receiver(post_delete, sender=ItemPeca)
+def registrar_remocao(sender, instance, **kwargs):
+    Alteracao.objects.create(tabela=sender._meta.model_name, objeto_id=instance.pk, operacao='remocao')
+
+
+@receiver(estoque_alterado, sender=Peca)
+def registrar_estoque(sender, deltas, motivo, **kwargs):
+    registrar(Peca, list(deltas), 'estoque', {
+        peca_id: {'delta': delta, 'motivo': motivo} for peca_id, delta in deltas.items()
+    })
+
+
+def pendentes(desde, tabelas=None):
+    """Entradas depois do offset, em ordem, até o horizonte de ALTERACOES_ATRASO."""
+    queryset = Alteracao.objects.filter(pk__gt=desde).order_by('pk')
+    if tabelas:
+        queryset = queryset.filter(tabela__in=tabelas)
+    atraso = getattr(settings, 'ALTERACOES_ATRASO', 0)
+    if atraso:
+        queryset = queryset.filter(criado_em__lte=timezone.now() - timedelta(seconds=atraso))
+    return queryset
+
+
+def gerar_ndjson(queryset, chunk_size):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    bloco = []
+    campos = ('pk', 'tabela', 'objeto_id', 'operacao', 'dados', 'detalhe', 'criado_em')
+    for offset, tabela, objeto_id, operacao, dados, detalhe, criado_em in \
+            queryset.values_list(*campos).iterator(chunk_size=chunk_size):
+        bloco.append(codificador.encode({
+            'offset': offset, 'tabela': tabela, 'objeto_id': objeto_id, 'operacao': operacao,
+            'dados': dados, 'detalhe': detalhe, 'criado_em': data_iso(criado_em),
+        }) + '\n')
+        if len(bloco) >= chunk_size:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def resposta_alteracoes(request, desde, limite, tabelas=None):
+    chunk_size = min(limite, getattr(settings, 'EXPORTACAO_CHUNK_SIZE', 2000))
+    response = resposta_streaming(
+        request, gerar_ndjson(pendentes(desde, tabelas)[:limite], chunk_size), 'application/x-ndjson'
+    )
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def compactar(ate, remover_exclusoes=False, lote=10000):
+    """
+    Apaga as entradas com id <= ate que têm outra mais recente do mesmo objeto
+    (também <= ate), em blocos de ids; devolve quantas apagou. Cada entrada traz a
+    linha inteira, então a última de cada objeto basta para reconstruir o estado.
+    """
+    apagadas = 0
+    substituida = Exists(Alteracao.objects.filter(
+        tabela=OuterRef('tabela'), objeto_id=OuterRef('objeto_id'), pk__gt=OuterRef('pk'), pk__lte=ate
+    ))
+    inicio = Alteracao.objects.order_by('pk').values_list('pk', flat=True).first()
+    while inicio is not None and inicio <= ate:
+        fim = min(inicio + lote - 1, ate)
+        apagadas += Alteracao.objects.filter(pk__range=(inicio, fim)).filter(substituida).delete()[0]
+        inicio = fim + 1
+    if remover_exclusoes:
+        # depois da compactação a remoção é a única entrada do objeto: sem ela
+        # quem sincronizar do zero não fica sabendo que ele existiu
+        apagadas += Alteracao.objects.filter(pk__lte=ate, operacao='remocao').delete()[0]
+    return apagadas
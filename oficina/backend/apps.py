@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend'
+
+    def ready(self):
+        # receivers das tabelas de resumo, do índice de busca, do cache do
+        # catálogo, do outbox de eventos, do change log e dos contadores do
+        # /metrics; e o wrapper de queries da instrumentação, posto em cada
+        # conexão aberta
+        from . import relatorios, busca, cache, eventos, alteracoes, instrumentacao, contadores  # noqa: F401
@@ -0,0 +1,96 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+# list e retrieve como views async, com o ORM assíncrono (aiterator, aget).
+# Com LEITURA_ASSINCRONA ligado (o padrão sob ASGI, ver oficina/asgi.py) o GET
+# desses endpoints roda no event loop: o usuário da sessão vem de
+# request.auser(), filtros e escopo só montam o queryset, e a página ou o
+# objeto vêm do banco sem prender uma thread do servidor durante a query.
+# Os outros métodos da mesma URL continuam na view síncrona do DRF.
+
+
+class LeituraAssincronaMixin:
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions.get('get') not in ('list', 'retrieve') or not getattr(settings, 'LEITURA_ASSINCRONA', False):
+            return view
+        view_sincrona = sync_to_async(view)
+
+        async def view_async(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await view_sincrona(request, *args, **kwargs)
+
+            # mesmo preparo da view de ViewSetMixin.as_view
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for metodo, acao in actions.items():
+                setattr(self, metodo, getattr(self, acao))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # cls, initkwargs, actions e csrf_exempt, usados pelo router e pelo DRF
+        functools.update_wrapper(view_async, view)
+        return view_async
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() do APIView para GET de list/retrieve."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = self.alist if self.action == 'list' else self.aretrieve
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        # com sessão o usuário já chega resolvido e o initial() do DRF não vai
+        # ao banco; Basic e afins autenticam numa thread
+        django_request = request._request
+        if hasattr(django_request, 'auser') and 'HTTP_AUTHORIZATION' not in django_request.META:
+            django_request.user = await django_request.auser()
+            self.initial(request, *args, **kwargs)
+        else:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            objetos = [obj async for obj in queryset.aiterator()]
+            return Response(self.get_serializer(objetos, many=True).data)
+
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+    async def aget_object(self):
+        """get_object() com aget(): 404 para linha inexistente ou fora do escopo."""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            # mesma mensagem do get_object_or_404
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        self.check_object_permissions(self.request, obj)
+        return obj
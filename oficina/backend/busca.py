@@ -0,0 +1,287 @@
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.expressions import Expression
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from .fields import DocumentoBusca
+from .models import Usuario, Veiculo, Peca, Orcamento
+
+# Busca textual com índice próprio por model: FTS5 no SQLite e tsvector com
+# índice GIN no PostgreSQL. O texto é normalizado aqui (minúsculas e sem
+# acento), então "freio" encontra "Freio" e "peca" encontra "Peça" nos dois
+# bancos. Em outros bancos a busca volta para o SearchFilter (icontains).
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def termos(busca):
+    return re.findall(r'\w+', normalizar(busca))
+
+
+class Indice:
+
+    def __init__(self, model, tabela, documento, select_related=()):
+        self.model = model
+        self.tabela = tabela
+        self.documento = documento
+        self.select_related = select_related
+
+    def texto(self, obj):
+        return normalizar(' '.join(str(parte) for parte in self.documento(obj) if parte))
+
+
+INDICES = {
+    indice.model._meta.model_name: indice for indice in [
+        Indice(
+            Peca, 'backend_busca_peca',
+            lambda p: [p.codigo, p.nome, p.fabricante],
+        ),
+        Indice(
+            Veiculo, 'backend_busca_veiculo',
+            lambda v: [v.placa, v.marca, v.modelo, v.cliente.username, v.cliente.first_name, v.cliente.last_name],
+            select_related=('cliente',),
+        ),
+        Indice(
+            Orcamento, 'backend_busca_orcamento',
+            lambda o: [o.veiculo.placa, o.mecanico_responsavel.username, o.descricao_problema],
+            select_related=('veiculo', 'mecanico_responsavel'),
+        ),
+    ]
+}
+
+
+class BackendSQLite:
+
+    def criar(self, cursor, tabela):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela} "
+            f"USING fts5(documento, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def remover(self, cursor, tabela):
+        cursor.execute(f'DROP TABLE IF EXISTS {tabela}')
+
+    def gravar(self, cursor, tabela, documentos):
+        cursor.executemany(f'DELETE FROM {tabela} WHERE rowid = %s', [(pk,) for pk, _ in documentos])
+        cursor.executemany(f'INSERT INTO {tabela} (rowid, documento) VALUES (%s, %s)', documentos)
+
+    def apagar(self, cursor, tabela, pks):
+        cursor.executemany(f'DELETE FROM {tabela} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def consulta(self, palavras):
+        return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+    def rank(self, compiler, documento, consulta):
+        # bm25 recebe a própria tabela FTS5 (pelo alias do join) e já é "menor é melhor"
+        return f'bm25({compiler.quote_name_unless_alias(documento.alias)})', ()
+
+
+class BackendPostgres:
+
+    def criar(self, cursor, tabela):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {tabela} (rowid bigint PRIMARY KEY, documento tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {tabela}_gin ON {tabela} USING gin (documento)')
+
+    def remover(self, cursor, tabela):
+        cursor.execute(f'DROP TABLE IF EXISTS {tabela}')
+
+    def gravar(self, cursor, tabela, documentos):
+        cursor.executemany(
+            f'INSERT INTO {tabela} (rowid, documento) VALUES (%s, to_tsvector(%s, %s)) '
+            f'ON CONFLICT (rowid) DO UPDATE SET documento = EXCLUDED.documento',
+            [(pk, DocumentoBusca.configuracao_postgres, texto) for pk, texto in documentos]
+        )
+
+    def apagar(self, cursor, tabela, pks):
+        cursor.execute(f'DELETE FROM {tabela} WHERE rowid = ANY(%s)', [list(pks)])
+
+    def consulta(self, palavras):
+        return ' & '.join(f'{palavra}:*' for palavra in palavras)
+
+    def rank(self, compiler, documento, consulta):
+        # negativo para ordenar de forma crescente como no SQLite. ts_rank é
+        # real: em double precision o valor guardado no cursor da paginação
+        # volta igual na comparação, sem arredondamento de float4
+        sql, params = compiler.compile(documento)
+        return (
+            f'-ts_rank({sql}, to_tsquery(%s, %s))::double precision',
+            (*params, DocumentoBusca.configuracao_postgres, consulta),
+        )
+
+
+class RankBusca(Expression):
+    """Relevância do objeto para a consulta; exige o filtro busca__documento__casa."""
+
+    output_field = FloatField()
+
+    def __init__(self, consulta, documento='busca__documento'):
+        super().__init__()
+        self.consulta = consulta
+        self.documento = F(documento)
+
+    def get_source_expressions(self):
+        return [self.documento]
+
+    def set_source_expressions(self, exprs):
+        self.documento, = exprs
+
+    def as_sql(self, compiler, connection):
+        return get_backend(connection).rank(compiler, self.documento, self.consulta)
+
+
+BACKENDS = {
+    'sqlite': BackendSQLite(),
+    'postgresql': BackendPostgres(),
+}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor)
+
+
+def get_indice(model):
+    # por nome para funcionar também com os models históricos das migrations
+    return INDICES.get(model._meta.model_name)
+
+
+def criar_indices(connection):
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for indice in INDICES.values():
+            backend.criar(cursor, indice.tabela)
+
+
+def remover_indices(connection):
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for indice in INDICES.values():
+            backend.remover(cursor, indice.tabela)
+
+
+def indexar(model, objetos, using='default'):
+    connection = connections[using]
+    backend = get_backend(connection)
+    indice = get_indice(model)
+    if backend is None or not objetos:
+        return
+    with connection.cursor() as cursor:
+        backend.gravar(cursor, indice.tabela, [(obj.pk, indice.texto(obj)) for obj in objetos])
+
+
+def reindexar(model, queryset=None, using='default', chunk_size=2000):
+    indice = get_indice(model)
+    if queryset is None:
+        queryset = model._default_manager.using(using).all()
+    queryset = queryset.select_related(*indice.select_related).order_by('pk')
+
+    lote = []
+    total = 0
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        lote.append(obj)
+        if len(lote) >= chunk_size:
+            indexar(model, lote, using=using)
+            total += len(lote)
+            lote = []
+    indexar(model, lote, using=using)
+    return total + len(lote)
+
+
+class BuscaTextoFilter(filters.SearchFilter):
+    """
+    Substitui o SearchFilter usando o índice textual do model quando o banco
+    tem backend; ordena por relevância se o cliente não pediu ?ordering=.
+    Deve vir depois do OrderingFilter em filter_backends.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        indice = get_indice(queryset.model)
+        backend = get_backend(connections[queryset.db])
+        if indice is None or backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        busca = ' '.join(self.get_search_terms(request))
+        palavras = termos(busca)
+        if not busca:
+            return queryset
+        if not palavras:
+            return queryset.none()
+
+        consulta = backend.consulta(palavras)
+        queryset = queryset.filter(busca__documento__casa=consulta)
+
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            # empates de relevância seguem a ordenação do viewset e, no fim, o id,
+            # para que o cursor da paginação tenha ordem total
+            ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+            if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+                ordering.append('id')
+            queryset = queryset.annotate(rank_busca=RankBusca(consulta))
+            queryset = queryset.order_by('rank_busca', *ordering)
+        return queryset
+
+
+# índice sempre em dia com os models
+
+@receiver(post_save, sender=Peca)
+@receiver(post_save, sender=Veiculo)
+@receiver(post_save, sender=Orcamento)
+def indexar_objeto(sender, instance, using, **kwargs):
+    indexar(sender, [instance], using=using)
+
+
+@receiver(post_delete, sender=Peca)
+@receiver(post_delete, sender=Veiculo)
+@receiver(post_delete, sender=Orcamento)
+def remover_objeto(sender, instance, using, **kwargs):
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.apagar(cursor, get_indice(sender).tabela, [instance.pk])
+
+
+@receiver(post_init, sender=Veiculo)
+@receiver(post_init, sender=Usuario)
+def guardar_campos_indexados(sender, instance, **kwargs):
+    # __dict__ para não disparar query com campos adiados
+    campos = CAMPOS_RELACIONADOS[sender]
+    instance._busca_original = tuple(instance.__dict__.get(campo) for campo in campos)
+
+
+@receiver(post_save, sender=Veiculo)
+@receiver(post_save, sender=Usuario)
+def reindexar_documentos_relacionados(sender, instance, created, using, **kwargs):
+    # placa e nomes de usuário entram nos documentos de outros models: só
+    # reindexa quando um desses campos mudou de fato (login não reindexa nada)
+    atual = tuple(getattr(instance, campo) for campo in CAMPOS_RELACIONADOS[sender])
+    alterado = not created and atual != instance._busca_original
+    instance._busca_original = atual
+    if not alterado:
+        return
+
+    if sender is Veiculo:
+        reindexar(Orcamento, Orcamento.objects.using(using).filter(veiculo=instance), using=using)
+    else:
+        reindexar(Veiculo, Veiculo.objects.using(using).filter(cliente=instance), using=using)
+        reindexar(Orcamento, Orcamento.objects.using(using).filter(mecanico_responsavel=instance), using=using)
+
+
+CAMPOS_RELACIONADOS = {
+    Veiculo: ('placa',),
+    Usuario: ('username', 'first_name', 'last_name'),
+}
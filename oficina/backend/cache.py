@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Peca
+from .roteamento import lendo_da_replica
+from .signals import estoque_alterado
+
+# Cache read-through do catálogo de peças (list/retrieve do PecaViewSet).
+# As chaves levam um número de versão: a listagem tem uma versão global e
+# cada peça tem a sua. Qualquer escrita em Peca sobe a versão da lista e a
+# da peça, então entradas antigas deixam de ser encontradas e saem pelo LRU.
+# Com mais de um processo, configure CATALOGO_CACHE_BACKEND com um alias de
+# CACHES compartilhado (Redis/Memcached) para versões e valores; sem ele as
+# versões de um processo não veem as escritas dos outros, então com
+# WEB_CONCURRENCY > 1 o cache fica desligado. As entradas do LRU local
+# expiram em CATALOGO_CACHE_TIMEOUT_LOCAL segundos de qualquer forma.
+# Só leituras do principal enchem o cache: uma réplica atrasada logo depois
+# de uma escrita guardaria o dado velho já na versão nova. Um request
+# roteado para a réplica aproveita o que está no cache e, no miss, responde
+# sem guardar.
+
+logger = logging.getLogger(__name__)
+
+
+class LRU:
+
+    def __init__(self, max_itens, timeout=None):
+        self.max_itens = max_itens
+        self.timeout = timeout
+        self.itens = OrderedDict()
+        self.trava = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave):
+        with self.trava:
+            try:
+                expira, valor = self.itens[chave]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expira is not None and expira <= time.monotonic():
+                del self.itens[chave]
+                self.misses += 1
+                return None
+            self.itens.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def set(self, chave, valor):
+        expira = time.monotonic() + self.timeout if self.timeout is not None else None
+        with self.trava:
+            self.itens[chave] = expira, valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+                self.evictions += 1
+
+    def limpar(self):
+        with self.trava:
+            self.itens.clear()
+
+
+class CacheCatalogo:
+
+    prefixo = 'catalogo'
+
+    def __init__(self, max_itens, backend=None, timeout=300, timeout_local=None, processos=1):
+        self.local = LRU(max_itens, timeout_local)
+        self.backend = caches[backend] if backend else None
+        self.timeout = timeout
+        # versões num dict do processo só valem com um processo servindo
+        self.ativo = self.backend is not None or processos <= 1
+        if not self.ativo:
+            logger.warning(
+                'Cache do catálogo desligado: %s processos sem CATALOGO_CACHE_BACKEND compartilhado', processos,
+            )
+        self.versoes = {}
+        self.trava = threading.Lock()
+        self.hits_compartilhado = 0
+        self.invalidacoes = 0
+
+    def versao(self, nome):
+        if self.backend is not None:
+            return self.backend.get(f'{self.prefixo}:versao:{nome}', 0)
+        return self.versoes.get(nome, 0)
+
+    def subir_versao(self, nome):
+        if self.backend is not None:
+            chave = f'{self.prefixo}:versao:{nome}'
+            if not self.backend.add(chave, 1, timeout=None):
+                self.backend.incr(chave)
+        else:
+            with self.trava:
+                self.versoes[nome] = self.versoes.get(nome, 0) + 1
+
+    def invalidar(self, peca_ids):
+        self.subir_versao('lista')
+        for peca_id in peca_ids:
+            self.subir_versao(f'peca:{peca_id}')
+        self.invalidacoes += 1
+
+    def chave(self, escopo, url):
+        return f'{self.prefixo}:{escopo}:v{self.versao(escopo)}:{url}'
+
+    def obter(self, escopo, url, calcular):
+        """Devolve (dados, veio_do_cache); calcular() só roda em caso de miss."""
+        if not self.ativo:
+            return calcular(), False
+        chave, dados = self.procurar(escopo, url)
+        if dados is not None:
+            return dados, True
+        dados = calcular()
+        self.guardar(chave, dados)
+        return dados, False
+
+    async def aobter(self, escopo, url, calcular):
+        """obter() para views async; calcular é uma corotina."""
+        if not self.ativo:
+            return await calcular(), False
+        if self.backend is not None:
+            # o cache compartilhado faz I/O síncrono: obter() numa thread, calcular de volta no loop
+            return await sync_to_async(self.obter)(escopo, url, async_to_sync(calcular))
+        chave, dados = self.procurar(escopo, url)
+        if dados is not None:
+            return dados, True
+        dados = await calcular()
+        self.guardar(chave, dados)
+        return dados, False
+
+    def procurar(self, escopo, url):
+        chave = self.chave(escopo, url)
+        dados = self.local.get(chave)
+        if dados is None and self.backend is not None:
+            dados = self.backend.get(chave)
+            if dados is not None:
+                self.hits_compartilhado += 1
+                self.local.set(chave, dados)
+        return chave, dados
+
+    def guardar(self, chave, dados):
+        if dados is not None and not invalidacao_pendente() and not lendo_da_replica():
+            self.local.set(chave, dados)
+            if self.backend is not None:
+                self.backend.set(chave, dados, timeout=self.timeout)
+
+    def estatisticas(self):
+        total = self.local.hits + self.local.misses
+        return {
+            'hits': self.local.hits,
+            'misses': self.local.misses,
+            'evictions': self.local.evictions,
+            'hit_ratio': round(self.local.hits / total, 4) if total else None,
+            'itens': len(self.local.itens),
+            'max_itens': self.local.max_itens,
+            'hits_compartilhado': self.hits_compartilhado,
+            'invalidacoes': self.invalidacoes,
+            'backend_compartilhado': getattr(settings, 'CATALOGO_CACHE_BACKEND', None),
+            'ativo': self.ativo,
+        }
+
+
+catalogo = CacheCatalogo(
+    max_itens=getattr(settings, 'CATALOGO_CACHE_MAX_ITENS', 1000),
+    backend=getattr(settings, 'CATALOGO_CACHE_BACKEND', None),
+    timeout=getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 300),
+    timeout_local=getattr(settings, 'CATALOGO_CACHE_TIMEOUT_LOCAL', 30),
+    processos=getattr(settings, 'WEB_CONCURRENCY', 1),
+)
+
+
+def invalidar_pecas(peca_ids, using='default'):
+    # agora (leituras na mesma transação) e depois do commit, para que uma
+    # leitura concorrente antes do commit não deixe dado velho na versão nova
+    peca_ids = list(peca_ids)
+    catalogo.invalidar(peca_ids)
+
+    def invalidar_depois_do_commit():
+        catalogo.invalidar(peca_ids)
+
+    invalidar_depois_do_commit.catalogo = True
+    transaction.on_commit(invalidar_depois_do_commit, using=using)
+
+
+def invalidacao_pendente(using='default'):
+    # esta conexão escreveu peças numa transação ainda aberta: o que ela lê não
+    # foi commitado e pode sofrer rollback, que não sobe versão nenhuma, então
+    # não vai para o cache. O rollback descarta run_on_commit e libera de novo
+    return any(getattr(funcao, 'catalogo', False) for _, funcao, _ in connections[using].run_on_commit)
+
+
+@receiver(post_save, sender=Peca)
+@receiver(post_delete, sender=Peca)
+def invalidar_peca_salva(sender, instance, using, **kwargs):
+    invalidar_pecas([instance.pk], using=using)
+
+
+@receiver(estoque_alterado, sender=Peca)
+def invalidar_estoque_alterado(sender, deltas, **kwargs):
+    invalidar_pecas(deltas)
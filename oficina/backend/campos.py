@@ -0,0 +1,233 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import exceptions, fields, serializers
+
+from .instrumentacao import medir_serializacao
+
+# Projeção de campos nas leituras: ?fields=placa,modelo devolve só essas
+# chaves, ?exclude=observacoes tira chaves, e ?expand=cliente troca o id de
+# uma relação pelo objeto serializado (relações listadas em
+# viewset.expansoes). O serializer perde os campos não pedidos e o queryset
+# ganha only() com as colunas que os campos restantes leem, e deixa de fazer
+# select_related/prefetch de relações que nenhum deles usa.
+
+
+def ler_lista(params, nome):
+    valor = params.get(nome)
+    if valor is None:
+        return None
+    return [item.strip() for item in valor.split(',') if item.strip()]
+
+
+class Selecao:
+    """Campos pedidos para um serializer; expandir é {campo: serializer da relação}."""
+
+    def __init__(self, campos=None, excluir=(), expandir=None):
+        self.expandir = dict(expandir or {})
+        self.campos = None if campos is None else frozenset(campos) | frozenset(self.expandir)
+        self.excluir = frozenset(excluir)
+
+    def mantem(self, nome):
+        return (self.campos is None or nome in self.campos) and nome not in self.excluir
+
+    def chave(self):
+        return self.campos, self.excluir, tuple(sorted(self.expandir.items(), key=lambda item: item[0]))
+
+    def __eq__(self, outra):
+        return isinstance(outra, Selecao) and self.chave() == outra.chave()
+
+    def __hash__(self):
+        return hash(self.chave())
+
+
+class CamposDinamicosMixin:
+    """Serializer que aceita selecao= e mantém só os campos pedidos."""
+
+    def __init__(self, *args, selecao=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selecao = selecao
+        if selecao is None:
+            return
+        for nome, serializer_class in selecao.expandir.items():
+            self.fields[nome] = serializer_class(read_only=True)
+        for nome in list(self.fields):
+            if not selecao.mantem(nome):
+                self.fields.pop(nome)
+
+    def pedido(self, chave):
+        """Para chaves acrescentadas no to_representation (rapido_extras)."""
+        return self.selecao is None or self.selecao.mantem(chave)
+
+    def to_representation(self, instance):
+        return medir_serializacao(super().to_representation, instance)
+
+
+_disponiveis = {}
+
+
+def campos_disponiveis(serializer_class):
+    if serializer_class not in _disponiveis:
+        nomes = [campo.field_name for campo in serializer_class()._readable_fields]
+        _disponiveis[serializer_class] = nomes + list(getattr(serializer_class, 'rapido_extras', {}))
+    return _disponiveis[serializer_class]
+
+
+def caminho(model, partes):
+    """
+    (caminho para only(), relação cujo objeto o campo usa ou None, objeto inteiro?)
+
+    'cliente.username' -> ('cliente__username', 'cliente', False); 'cliente' (id)
+    -> ('cliente', None, False); 'veiculo.__str__' -> ('veiculo', 'veiculo', True).
+    Caminho vazio: o campo lê um atributo que não é coluna do próprio model.
+    """
+    nomes = []
+    for indice, parte in enumerate(partes):
+        try:
+            campo = model._meta.get_field(parte)
+        except FieldDoesNotExist:
+            relacao = '__'.join(nomes) or None
+            return relacao or '', relacao, True
+        nomes.append(parte)
+        if not campo.is_relation:
+            break
+        if indice < len(partes) - 1:
+            model = campo.related_model
+    relacao = '__'.join(nomes[:-1]) or None
+    return '__'.join(nomes), relacao, False
+
+
+def projecao(serializer, ordenacao):
+    """Colunas para only() e relações usadas; None se algum campo precisar do objeto inteiro."""
+    model = serializer.Meta.model
+    calculados = getattr(serializer, 'rapido_calculados', {})
+    colunas, parciais, inteiras = {model._meta.pk.name}, set(), set()
+
+    def usar(partes):
+        coluna, relacao, inteira = caminho(model, partes)
+        if not coluna:
+            return False
+        colunas.add(coluna)
+        if relacao:
+            (inteiras if inteira else parciais).add(relacao)
+        return True
+
+    for campo in serializer._readable_fields:
+        if campo.field_name in calculados:
+            for coluna in calculados[campo.field_name][0]:
+                usar(coluna.split('__'))
+        elif isinstance(campo, serializers.ListSerializer) and campo.source_attrs:
+            # relação reversa (itens_pecas): vem do prefetch, não de colunas
+            continue
+        elif isinstance(campo, serializers.BaseSerializer) and len(campo.source_attrs) == 1:
+            # relação expandida: o objeto relacionado inteiro, e as relações
+            # que o serializer dela lê vêm no mesmo join
+            colunas.add(campo.source)
+            inteiras.add(campo.source)
+            aninhada = projecao(campo, ())
+            if aninhada is not None:
+                inteiras.update(f'{campo.source}__{relacao}' for relacao in aninhada[1] | aninhada[2])
+        elif isinstance(campo, fields.SerializerMethodField) or campo.source == '*' or not usar(campo.source_attrs):
+            return None
+
+    for chave, (caminhos, _) in getattr(serializer, 'rapido_extras', {}).items():
+        if serializer.pedido(chave):
+            for coluna in caminhos:
+                usar(coluna.split('__'))
+
+    for campo in ordenacao:
+        if isinstance(campo, str):
+            usar([model._meta.pk.name if parte == 'pk' else parte for parte in campo.lstrip('-').split('__')])
+
+    # relação inteira: colunas dela não entram no only(), senão restringiriam o objeto
+    colunas = {
+        coluna for coluna in colunas
+        if not any(coluna.startswith(f'{inteira}__') for inteira in inteiras)
+    }
+    return colunas, parciais, inteiras
+
+
+def podar_select_related(arvore, parciais, inteiras, prefixo=''):
+    """Caminhos do select_related original que ainda servem a algum campo."""
+    mantidos = []
+    for nome, filhos in arvore.items():
+        atual = f'{prefixo}{nome}'
+        if any(atual == inteira or atual.startswith(f'{inteira}__') for inteira in inteiras):
+            mantidos.append(atual)
+        elif atual in parciais or any(relacao.startswith(f'{atual}__') for relacao in parciais | inteiras):
+            mantidos.append(atual)
+        if filhos:
+            mantidos.extend(podar_select_related(filhos, parciais, inteiras, f'{atual}__'))
+    return mantidos
+
+
+class CamposMixin:
+    """?fields=, ?exclude= e ?expand= em list/retrieve do viewset."""
+
+    # campo -> serializer usado por ?expand=; só relações que quem vê o
+    # objeto também pode ver pelo endpoint da relação
+    expansoes = {}
+
+    def leitura_projetavel(self):
+        return self.request is not None and self.request.method == 'GET' and self.action in ('list', 'retrieve')
+
+    def get_selecao(self):
+        if hasattr(self, '_selecao'):
+            return self._selecao
+        self._selecao = None
+        if not self.leitura_projetavel():
+            return None
+
+        params = self.request.query_params
+        campos = ler_lista(params, 'fields')
+        excluir = ler_lista(params, 'exclude') or []
+        expandir = ler_lista(params, 'expand') or []
+        if campos is None and not excluir and not expandir:
+            return None
+
+        disponiveis = campos_disponiveis(self.get_serializer_class())
+        desconhecidos = [nome for nome in (campos or []) + excluir if nome not in disponiveis]
+        if desconhecidos:
+            raise exceptions.ValidationError({
+                'erro': f'Campos desconhecidos: {", ".join(desconhecidos)}. Disponíveis: {", ".join(disponiveis)}'
+            })
+        sem_expansao = [nome for nome in expandir if nome not in self.expansoes]
+        if sem_expansao:
+            raise exceptions.ValidationError({
+                'erro': f'Não é possível expandir: {", ".join(sem_expansao)}. '
+                        f'Expansíveis: {", ".join(self.expansoes) or "nenhum"}'
+            })
+
+        self._selecao = Selecao(campos, excluir, {nome: self.expansoes[nome] for nome in expandir})
+        return self._selecao
+
+    def campo_pedido(self, nome):
+        selecao = self.get_selecao()
+        return selecao is None or selecao.mantem(nome)
+
+    def get_serializer(self, *args, **kwargs):
+        selecao = self.get_selecao()
+        if selecao is not None:
+            kwargs.setdefault('selecao', selecao)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        selecao = self.get_selecao()
+        if selecao is None:
+            return queryset
+
+        ordenacao = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        projetado = projecao(self.get_serializer(), ordenacao)
+        if projetado is None:
+            return queryset
+        colunas, parciais, inteiras = projetado
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            queryset = queryset.select_related(None)
+            mantidos = podar_select_related(select_related, parciais, inteiras)
+            if mantidos:
+                queryset = queryset.select_related(*mantidos)
+        expandidas = [relacao for relacao in inteiras if relacao.split('__')[0] in selecao.expandir]
+        if expandidas:
+            queryset = queryset.select_related(*expandidas)
+        return queryset.only(*colunas)
@@ -0,0 +1,204 @@
+import logging
+import queue
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrdemServico, TarefaConclusao, EstoqueInsuficiente
+
+logger = logging.getLogger(__name__)
+
+# Conclusão de ordem de serviço, síncrona (no request) ou enfileirada.
+# A fila é a tabela TarefaConclusao: o endpoint grava a tarefa e responde 202,
+# e um pool de threads (no próprio processo ou em manage.py processar_conclusoes)
+# reivindica tarefas com UPDATE condicional e roda a mesma concluir_ordem().
+
+
+def concluir_ordem(ordem_id):
+    """Conclui a ordem e devolve (status HTTP, corpo) como o endpoint concluir."""
+    # conclusão e baixa de estoque (signal) numa transação só; a trava
+    # na linha da ordem impede que duas conclusões da mesma OS rodem juntas
+    try:
+        with transaction.atomic():
+            ordem = OrdemServico.objects.select_for_update().get(pk=ordem_id)
+            if ordem.status != 'em_andamento':
+                return 400, {
+                    'erro': f'Apenas ordens em andamento podem ser concluídas. Status atual: {ordem.get_status_display()}'
+                }
+            ordem.status = 'concluido'
+            ordem.data_conclusao = timezone.now()
+            ordem.save()
+    except EstoqueInsuficiente as e:
+        return 400, {
+            'erro': 'Estoque insuficiente para concluir ordem de serviço',
+            'pecas_com_problema': e.pecas
+        }
+    except ValidationError as e:
+        return 409, {'erro': ' '.join(e.messages)}
+
+    return 200, {
+        'mensagem': 'Ordem de serviço concluída com sucesso',
+        'ordem_servico_id': ordem.id,
+        'data_conclusao': ordem.data_conclusao,
+        'pecas_utilizadas': [
+            {
+                'codigo': item.peca.codigo,
+                'nome': item.peca.nome,
+                'quantidade_utilizada': item.quantidade,
+                'estoque_atual': item.peca.quantidade_estoque
+            }
+            for item in ordem.itens_pecas.select_related('peca')
+        ]
+    }
+
+
+def enfileirar(ordem, solicitante):
+    """Cria a tarefa de conclusão (ou devolve a que já está ativa para a ordem) e acorda o pool local."""
+    try:
+        with transaction.atomic():
+            tarefa = TarefaConclusao.objects.create(ordem_servico=ordem, solicitante=solicitante)
+    except IntegrityError:
+        tarefa = TarefaConclusao.objects.filter(
+            ordem_servico=ordem, status__in=['pendente', 'processando']
+        ).first()
+        if tarefa is None:
+            raise
+        return tarefa, False
+
+    if getattr(settings, 'CONCLUSAO_POOL_LOCAL', True):
+        transaction.on_commit(lambda: get_pool().avisar())
+    return tarefa, True
+
+
+def reservar_proxima():
+    # a pendente mais antiga; o UPDATE condicional garante que só um worker a pega
+    while True:
+        tarefa_id = (
+            TarefaConclusao.objects.filter(status='pendente')
+            .order_by('criada_em').values_list('pk', flat=True).first()
+        )
+        if tarefa_id is None:
+            return None
+        reservada = TarefaConclusao.objects.filter(pk=tarefa_id, status='pendente').update(
+            status='processando', iniciada_em=timezone.now(), tentativas=F('tentativas') + 1
+        )
+        if reservada:
+            return TarefaConclusao.objects.get(pk=tarefa_id)
+
+
+def executar(tarefa):
+    try:
+        codigo, corpo = concluir_ordem(tarefa.ordem_servico_id)
+    except OperationalError as e:
+        # banco ocupado/travado: volta para a fila até o limite de tentativas
+        if tarefa.tentativas < getattr(settings, 'CONCLUSAO_MAX_TENTATIVAS', 3):
+            TarefaConclusao.objects.filter(pk=tarefa.pk).update(status='pendente')
+            return
+        codigo, corpo = 500, {'erro': f'Erro: {e}'}
+    except Exception as e:
+        logger.exception('Falha ao concluir a ordem de serviço %s', tarefa.ordem_servico_id)
+        codigo, corpo = 500, {'erro': f'Erro: {e}'}
+
+    TarefaConclusao.objects.filter(pk=tarefa.pk).update(
+        status='concluida' if codigo == 200 else 'falhou',
+        codigo_http=codigo, resultado=corpo, finalizada_em=timezone.now()
+    )
+
+
+def processar_pendentes(limite=None):
+    """Executa tarefas pendentes na thread atual até esvaziar a fila (ou até limite); devolve quantas."""
+    total = 0
+    while limite is None or total < limite:
+        tarefa = reservar_proxima()
+        if tarefa is None:
+            break
+        executar(tarefa)
+        total += 1
+    return total
+
+
+def recuperar_abandonadas(timeout):
+    """Devolve à fila tarefas em processamento há mais de timeout segundos (worker que morreu)."""
+    return TarefaConclusao.objects.filter(
+        status='processando', iniciada_em__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status='pendente')
+
+
+class PoolConclusao:
+    """Threads que esvaziam a fila; avisar() acorda uma delas, e sem aviso elas olham a tabela a cada intervalo."""
+
+    def __init__(self, workers, intervalo=5.0, timeout_abandonadas=None):
+        self.workers = workers
+        self.intervalo = intervalo
+        # com timeout, tarefas presas em processando (processo que morreu no
+        # meio) voltam para a fila na partida e a cada intervalo sem aviso
+        self.timeout_abandonadas = timeout_abandonadas
+        self.avisos = queue.Queue()
+        self.parar_evento = threading.Event()
+        self.threads = []
+
+    def recuperar(self):
+        if self.timeout_abandonadas is None:
+            return 0
+        recuperadas = recuperar_abandonadas(self.timeout_abandonadas)
+        if recuperadas:
+            logger.warning('%s tarefas de conclusão abandonadas de volta à fila', recuperadas)
+        return recuperadas
+
+    def iniciar(self):
+        self.recuperar()
+        for numero in range(self.workers):
+            thread = threading.Thread(target=self.trabalhar, name=f'conclusao-{numero}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def avisar(self):
+        self.avisos.put(None)
+
+    def parar(self):
+        self.parar_evento.set()
+        for _ in self.threads:
+            self.avisar()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def trabalhar(self):
+        while not self.parar_evento.is_set():
+            ocioso = False
+            try:
+                self.avisos.get(timeout=self.intervalo)
+            except queue.Empty:
+                ocioso = True
+            if self.parar_evento.is_set():
+                break
+            try:
+                if ocioso:
+                    self.recuperar()
+                processar_pendentes()
+            except Exception:
+                logger.exception('Erro no worker de conclusão')
+            finally:
+                close_old_connections()
+
+
+_pool = None
+_pool_trava = threading.Lock()
+
+
+def get_pool():
+    # iniciado na primeira tarefa enfileirada pelo processo
+    global _pool
+    with _pool_trava:
+        if _pool is None:
+            _pool = PoolConclusao(
+                getattr(settings, 'CONCLUSAO_WORKERS', 4),
+                timeout_abandonadas=getattr(settings, 'CONCLUSAO_TIMEOUT_ABANDONADA', 300),
+            ).iniciar()
+        return _pool
@@ -0,0 +1,155 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.http import http_date, quote_etag
+
+# Leituras condicionais: list/retrieve respondem 304 a If-None-Match (e, no
+# detalhe, If-Modified-Since) antes de serializar qualquer coisa. O token de
+# mudança só é calculado quando o request traz um desses cabeçalhos, com uma
+# query só sobre as linhas da resposta (a página da listagem, pelo mesmo
+# filtro, escopo e cursor, ou o objeto do detalhe): o id de cada uma e o maior
+# atualizado_em dela e das relações que o serializer mostra
+# (viewset.versao_campos), para que uma linha que entra ou sai da página
+# também mude o ETag. Um GET sem cabeçalho condicional não consulta nada a
+# mais: o ETag dele é o hash do corpo. Quem o devolve em If-None-Match
+# recebe 304 depois de a resposta ser montada (a página e o token mudaram ou
+# não, o corpo diz), já com o token, e dali em diante o 304 sai antes de
+# serializar.
+
+
+def chave_da_linha(linha):
+    pk, *datas = linha
+    return ':'.join([str(pk), *(data.isoformat() if data is not None else '' for data in datas)])
+
+
+class CondicionalMixin:
+
+    # caminhos de atualizado_em que mudam a resposta: o do próprio model e
+    # os das relações serializadas (inclusive as de ?expand=)
+    versao_campos = ['atualizado_em']
+
+    def leitura_condicional(self):
+        return self.request.method in ('GET', 'HEAD') and self.action in ('list', 'retrieve')
+
+    def pedido_condicional(self):
+        cabecalhos = self.request.headers
+        return self.leitura_condicional() and ('If-None-Match' in cabecalhos or 'If-Modified-Since' in cabecalhos)
+
+    def queryset_da_versao(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        elif self.paginator is not None and hasattr(self.paginator, 'preparar'):
+            # a mesma página (e a linha a mais do has_next) que a listagem vai ler
+            pagina = self.paginator.preparar(queryset, self.request).values('pk')
+            queryset = queryset.model._default_manager.filter(pk__in=pagina)
+        return queryset.order_by()
+
+    def queryset_da_versao_ou_none(self):
+        try:
+            return self.queryset_da_versao()
+        except (TypeError, ValueError, ValidationError):
+            # pk inválida na URL: o retrieve devolve o 404 dele
+            return None
+
+    def linhas_da_versao(self, queryset):
+        # (pk, maior atualizado_em de cada caminho) por linha; GROUP BY pk junta
+        # as linhas repetidas pelas relações reversas (itens da ordem)
+        return queryset.values_list('pk').annotate(
+            *(Max(caminho) for caminho in self.versao_campos)
+        ).order_by('pk')
+
+    def montar_versao(self, linhas):
+        """(ETag, Last-Modified ou None) a partir das linhas de linhas_da_versao."""
+        if self.action == 'retrieve' and not linhas:
+            # inexistente ou fora do escopo: segue para o 404 normal
+            return None
+        datas = [data for linha in linhas for data in linha[1:] if data is not None]
+        partes = [
+            self.request.get_full_path(), str(self.request.user.pk), self.request.accepted_media_type,
+            *map(chave_da_linha, linhas),
+        ]
+        etag = '"%s"' % hashlib.md5('|'.join(partes).encode(), usedforsecurity=False).hexdigest()
+        # If-Modified-Since só no detalhe: na listagem uma remoção não muda a maior data
+        ultima = max(datas) if datas and self.action == 'retrieve' else None
+        return etag, ultima
+
+    def get_versao(self):
+        if not hasattr(self, '_versao'):
+            self._versao = None
+            if self.pedido_condicional():
+                queryset = self.queryset_da_versao_ou_none()
+                if queryset is not None:
+                    self._versao = self.montar_versao(list(self.linhas_da_versao(queryset)))
+        return self._versao
+
+    async def aget_versao(self):
+        if not hasattr(self, '_versao'):
+            self._versao = None
+            if self.pedido_condicional():
+                queryset = self.queryset_da_versao_ou_none()
+                if queryset is not None:
+                    self._versao = self.montar_versao([linha async for linha in self.linhas_da_versao(queryset)])
+        return self._versao
+
+    def responder_nao_modificado(self, request, versao):
+        if versao is None:
+            return None
+        etag, ultima = versao
+        return get_conditional_response(
+            request._request, etag=etag, last_modified=int(ultima.timestamp()) if ultima else None
+        )
+
+    def nao_modificado(self, request):
+        """HttpResponseNotModified se o cliente já tem esta versão, senão None."""
+        return self.responder_nao_modificado(request, self.get_versao())
+
+    async def anao_modificado(self, request):
+        return self.responder_nao_modificado(request, await self.aget_versao())
+
+    def list(self, request, *args, **kwargs):
+        return self.nao_modificado(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.nao_modificado(request) or super().retrieve(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.anao_modificado(request) or await super().alist(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.anao_modificado(request) or await super().aretrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not self.leitura_condicional() or response.status_code not in (200, 304):
+            return response
+        versao = getattr(self, '_versao', None)
+        if versao is not None:
+            self.marcar_versao(response, versao)
+            if response.status_code == 200:
+                # If-None-Match com o ETag de um GET simples (hash do corpo)
+                response.add_post_render_callback(lambda response: self.nao_modificado_pelo_corpo(response, versao))
+        elif response.status_code == 200 and not self.pedido_condicional():
+            # GET simples: sem query do token, o ETag é o hash do corpo renderizado
+            response.add_post_render_callback(set_response_etag)
+        # o token inclui o usuário: o navegador revalida, proxies não guardam
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def marcar_versao(self, response, versao):
+        etag, ultima = versao
+        response['ETag'] = etag
+        if ultima is not None:
+            response['Last-Modified'] = http_date(ultima.timestamp())
+
+    def nao_modificado_pelo_corpo(self, response, versao):
+        corpo = quote_etag(hashlib.md5(response.content, usedforsecurity=False).hexdigest())
+        nao_modificado = get_conditional_response(self.request._request, etag=corpo)
+        if nao_modificado is not None:
+            # o 304 já leva o token, e a próxima revalidação não precisa do corpo
+            self.marcar_versao(nao_modificado, versao)
+            patch_cache_control(nao_modificado, private=True, no_cache=True)
+        return nao_modificado
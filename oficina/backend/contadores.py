@@ -0,0 +1,280 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from .cache import catalogo
+from .instrumentacao import Histograma, metricas
+from .models import Orcamento, OrdemServico, Peca
+from .signals import estoque_alterado, estoque_insuficiente, status_alterado
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Métricas no formato de texto do Prometheus em GET /metrics, para alertas
+# de ruptura de estoque, tempo de aprovação e vazão de conclusões sem
+# listagens caras no banco.
+#
+# Os contadores de negócio vivem na memória do processo e sobem nos
+# receivers de status_alterado (aprovar, rejeitar, gerar_ordem_servico,
+# concluir) e de estoque_alterado (reduzir/adicionar/reservar estoque),
+# depois do commit: uma transação desfeita não conta. As baixas recusadas
+# (estoque_insuficiente) contam na hora. A latência por endpoint vem dos
+# histogramas da instrumentação (backend/instrumentacao.py).
+#
+# Ler /metrics nunca toca o banco, nem para autenticar: com METRICAS_TOKEN o
+# scraper manda Authorization: Bearer <token>. Cada processo expõe só os seus
+# números: com vários workers, cada um precisa ser um alvo do Prometheus.
+
+_trava = threading.Lock()
+_inicio = time.time()
+
+MINUTO, HORA, DIA = 60, 3600, 86400
+LIMITES_DECISAO = (MINUTO, 5 * MINUTO, 15 * MINUTO, 30 * MINUTO, HORA, 4 * HORA, 8 * HORA,
+                   DIA, 2 * DIA, 7 * DIA, 30 * DIA)
+LIMITES_EXECUCAO = (30 * MINUTO, HORA, 4 * HORA, 8 * HORA, DIA, 2 * DIA, 5 * DIA, 7 * DIA, 14 * DIA, 30 * DIA)
+
+
+def formatar_valor(valor):
+    if isinstance(valor, float) and not valor.is_integer():
+        return repr(valor)
+    return str(int(valor))
+
+
+def formatar_rotulos(rotulos):
+    if not rotulos:
+        return ''
+    partes = []
+    for nome, valor in rotulos:
+        valor = str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        partes.append(f'{nome}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def cabecalho(nome, ajuda, tipo):
+    return [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+
+
+def linhas_histograma(nome, rotulos, histograma, escala=1):
+    """Buckets cumulativos, _sum e _count; escala converte a unidade dos limites (ms -> s)."""
+    linhas = []
+    acumulado = 0
+    limites = [formatar_valor(limite * escala) for limite in histograma.limites] + ['+Inf']
+    for limite, contagem in zip(limites, histograma.contagens):
+        acumulado += contagem
+        linhas.append(f'{nome}_bucket{formatar_rotulos(list(rotulos) + [("le", limite)])} {acumulado}')
+    linhas.append(f'{nome}_sum{formatar_rotulos(rotulos)} {formatar_valor(histograma.soma * escala)}')
+    linhas.append(f'{nome}_count{formatar_rotulos(rotulos)} {acumulado}')
+    return linhas
+
+
+class Familia:
+    """Uma métrica com rótulos; cada combinação de valores é uma série."""
+
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.series = {}
+
+    def chave(self, rotulos):
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def linhas(self):
+        linhas = cabecalho(self.nome, self.ajuda, self.tipo)
+        for chave, valor in sorted(self.series.items()):
+            linhas.extend(self.linhas_da_serie(list(zip(self.rotulos, chave)), valor))
+        return linhas
+
+
+class Contador(Familia):
+
+    tipo = 'counter'
+
+    def incrementar(self, valor=1, **rotulos):
+        chave = self.chave(rotulos)
+        with _trava:
+            self.series[chave] = self.series.get(chave, 0) + valor
+
+    def linhas_da_serie(self, rotulos, valor):
+        return [f'{self.nome}{formatar_rotulos(rotulos)} {formatar_valor(valor)}']
+
+
+class HistogramaRotulado(Familia):
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, limites, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = limites
+
+    def observar(self, valor, **rotulos):
+        chave = self.chave(rotulos)
+        with _trava:
+            histograma = self.series.get(chave)
+            if histograma is None:
+                histograma = self.series[chave] = Histograma(self.limites)
+            histograma.observar(valor)
+
+    def linhas_da_serie(self, rotulos, histograma):
+        return linhas_histograma(self.nome, rotulos, histograma)
+
+
+orcamentos_status = Contador(
+    'oficina_orcamento_status_total', 'Orçamentos que entraram em cada status (criação conta como pendente)',
+    ['status'],
+)
+orcamento_decisao = HistogramaRotulado(
+    'oficina_orcamento_decisao_segundos', 'Tempo entre a criação do orçamento e a aprovação ou rejeição',
+    LIMITES_DECISAO, ['status'],
+)
+ordens_status = Contador(
+    'oficina_ordem_servico_status_total', 'Ordens de serviço que entraram em cada status (criação incluída)',
+    ['status'],
+)
+ordem_execucao = HistogramaRotulado(
+    'oficina_ordem_servico_execucao_segundos', 'Tempo entre o início e a conclusão das ordens de serviço concluídas',
+    LIMITES_EXECUCAO,
+)
+estoque_movimentacoes = Contador(
+    'oficina_estoque_movimentacoes_total', 'Movimentações de estoque por peça (uso, estorno, reposicao)',
+    ['motivo'],
+)
+estoque_unidades = Contador(
+    'oficina_estoque_unidades_total', 'Unidades movimentadas no estoque, em valor absoluto',
+    ['motivo'],
+)
+estoque_recusas = Contador(
+    'oficina_estoque_insuficiente_total', 'Baixas de estoque recusadas por falta de estoque',
+)
+estoque_pecas_em_falta = Contador(
+    'oficina_estoque_insuficiente_pecas_total', 'Peças pedidas nas baixas recusadas por falta de estoque',
+)
+
+NEGOCIO = [
+    orcamentos_status, orcamento_decisao, ordens_status, ordem_execucao,
+    estoque_movimentacoes, estoque_unidades, estoque_recusas, estoque_pecas_em_falta,
+]
+
+
+def segundos_entre(inicio, fim):
+    if inicio is None or fim is None:
+        return None
+    return max((fim - inicio).total_seconds(), 0)
+
+
+@receiver(status_alterado, sender=Orcamento)
+def contar_orcamento(sender, instance, anterior, novo, **kwargs):
+    decisao = None
+    if anterior == 'pendente' and novo in ('aprovado', 'rejeitado'):
+        # __dict__: com only()/defer() a data fica de fora em vez de custar uma query
+        decisao = segundos_entre(instance.__dict__.get('data_criacao'), timezone.now())
+
+    def contar():
+        orcamentos_status.incrementar(status=novo)
+        if decisao is not None:
+            orcamento_decisao.observar(decisao, status=novo)
+
+    transaction.on_commit(contar)
+
+
+@receiver(status_alterado, sender=OrdemServico)
+def contar_ordem(sender, instance, anterior, novo, **kwargs):
+    execucao = None
+    if novo == 'concluido':
+        execucao = segundos_entre(instance.__dict__.get('data_inicio'), instance.__dict__.get('data_conclusao'))
+
+    def contar():
+        ordens_status.incrementar(status=novo)
+        if execucao is not None:
+            ordem_execucao.observar(execucao)
+
+    transaction.on_commit(contar)
+
+
+@receiver(estoque_alterado, sender=Peca)
+def contar_movimentacao(sender, deltas, motivo, **kwargs):
+    pecas = len(deltas)
+    unidades = sum(abs(delta) for delta in deltas.values())
+
+    def contar():
+        estoque_movimentacoes.incrementar(pecas, motivo=motivo)
+        estoque_unidades.incrementar(unidades, motivo=motivo)
+
+    transaction.on_commit(contar)
+
+
+@receiver(estoque_insuficiente, sender=Peca)
+def contar_recusa(sender, demanda, **kwargs):
+    estoque_recusas.incrementar()
+    estoque_pecas_em_falta.incrementar(len(demanda))
+
+
+def linhas_processo():
+    linhas = cabecalho('oficina_processo_inicio_segundos', 'Início do processo (epoch)', 'gauge')
+    linhas.append(f'oficina_processo_inicio_segundos {formatar_valor(_inicio)}')
+    linhas += cabecalho('oficina_processo_cpu_segundos_total', 'Tempo de CPU do processo', 'counter')
+    linhas.append(f'oficina_processo_cpu_segundos_total {formatar_valor(time.process_time())}')
+    linhas += cabecalho('oficina_processo_threads', 'Threads vivas no processo', 'gauge')
+    linhas.append(f'oficina_processo_threads {threading.active_count()}')
+    if resource is not None:
+        # ru_maxrss vem em KiB no Linux
+        linhas += cabecalho('oficina_processo_memoria_maxima_bytes', 'Pico de memória residente', 'gauge')
+        linhas.append(f'oficina_processo_memoria_maxima_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}')
+    return linhas
+
+
+def linhas_cache():
+    estatisticas = catalogo.estatisticas()
+    linhas = cabecalho('oficina_catalogo_cache_total', 'Leituras do cache local do catálogo de peças', 'counter')
+    for resultado in ('hits', 'misses'):
+        linhas.append(f'oficina_catalogo_cache_total{formatar_rotulos([("resultado", resultado)])} {estatisticas[resultado]}')
+    linhas += cabecalho('oficina_catalogo_cache_evictions_total', 'Entradas tiradas do cache local pelo LRU', 'counter')
+    linhas.append(f'oficina_catalogo_cache_evictions_total {estatisticas["evictions"]}')
+    linhas += cabecalho('oficina_catalogo_cache_itens', 'Entradas no cache local do catálogo', 'gauge')
+    linhas.append(f'oficina_catalogo_cache_itens {estatisticas["itens"]}')
+    return linhas
+
+
+def linhas_http():
+    por_view = sorted(metricas.copia().items())
+    linhas = cabecalho('oficina_http_requisicao_segundos', 'Duração das requisições por view e ação', 'histogram')
+    for rotulo, view in por_view:
+        linhas += linhas_histograma('oficina_http_requisicao_segundos', [('view', rotulo)], view.tempo_ms, 0.001)
+    linhas += cabecalho('oficina_http_banco_segundos', 'Tempo de banco das requisições por view e ação', 'histogram')
+    for rotulo, view in por_view:
+        linhas += linhas_histograma('oficina_http_banco_segundos', [('view', rotulo)], view.banco_ms, 0.001)
+    linhas += cabecalho('oficina_http_respostas_total', 'Respostas por view, ação e classe de status', 'counter')
+    for rotulo, view in por_view:
+        for classe, quantidade in sorted(view.status.items()):
+            linhas.append(f'oficina_http_respostas_total{formatar_rotulos([("view", rotulo), ("status", classe)])} {quantidade}')
+    return linhas
+
+
+def exposicao():
+    with _trava:
+        linhas = [linha for familia in NEGOCIO for linha in familia.linhas()]
+    linhas += linhas_http() + linhas_cache() + linhas_processo()
+    return '\n'.join(linhas) + '\n'
+
+
+@require_GET
+def metrics(request):
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        response = HttpResponse('Token inválido ou ausente\n', status=401, content_type='text/plain; charset=utf-8')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    response = HttpResponse(exposicao(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,87 @@
+from django.db.models import Q
+
+# Escopo por linha: o que cada tipo de usuário enxerga em cada model.
+# As regras são compiladas uma vez, no import, em um predicado por
+# (model, tipo); na requisição só entra o id do usuário. O filtro vai para o
+# banco em get_queryset, então listagem, detalhe, ações e exportação de todos
+# os viewsets com EscopoMixin só leem linhas visíveis para o usuário.
+
+TODOS = object()
+
+# regras do orçamento, relativas ao próprio orçamento
+REGRAS_ORCAMENTO = {
+    'cliente': lambda caminho, usuario: Q(**{f'{caminho}veiculo__cliente': usuario}),
+    'mecanico': lambda caminho, usuario: Q(**{f'{caminho}mecanico_responsavel': usuario}),
+    'gerente': TODOS,
+}
+
+REGRAS = {
+    'usuario': {
+        'cliente': lambda caminho, usuario: Q(pk=usuario),
+        # mecânico atende clientes: vê a si mesmo e os clientes
+        'mecanico': lambda caminho, usuario: Q(pk=usuario) | Q(tipo='cliente'),
+        'gerente': TODOS,
+    },
+    'veiculo': {
+        'cliente': lambda caminho, usuario: Q(cliente=usuario),
+        'mecanico': TODOS,
+        'gerente': TODOS,
+    },
+    'tarefaconclusao': {
+        'mecanico': lambda caminho, usuario: Q(solicitante=usuario),
+        'gerente': TODOS,
+    },
+    # feed de eventos (backend/eventos.py): as mesmas pessoas que veem o orçamento
+    'eventostatus': {
+        'cliente': lambda caminho, usuario: Q(cliente=usuario),
+        'mecanico': lambda caminho, usuario: Q(mecanico=usuario),
+        'gerente': TODOS,
+    },
+}
+# Peca não tem regra: o catálogo é público e a resposta é cacheada por URL
+
+# ordem de serviço e item de peça herdam o escopo do orçamento pelo caminho até ele
+CAMINHOS_ORCAMENTO = {
+    'orcamento': '',
+    'ordemservico': 'orcamento__',
+    'itempeca': 'ordem_servico__orcamento__',
+}
+
+
+def compilar(regra, caminho=''):
+    if regra is TODOS:
+        return None
+    return lambda usuario: regra(caminho, usuario.pk)
+
+
+def compilar_escopos():
+    escopos = {
+        model: {tipo: compilar(regra) for tipo, regra in regras.items()}
+        for model, regras in REGRAS.items()
+    }
+    for model, caminho in CAMINHOS_ORCAMENTO.items():
+        escopos[model] = {tipo: compilar(regra, caminho) for tipo, regra in REGRAS_ORCAMENTO.items()}
+    return escopos
+
+
+ESCOPOS = compilar_escopos()
+
+
+def escopar(queryset, usuario):
+    """Restringe o queryset às linhas que o usuário pode ver; tipo desconhecido não vê nada."""
+    regras = ESCOPOS.get(queryset.model._meta.model_name)
+    if regras is None:
+        return queryset
+
+    tipo = getattr(usuario, 'tipo', None) if usuario.is_authenticated else None
+    if tipo not in regras:
+        return queryset.none()
+    predicado = regras[tipo]
+    return queryset if predicado is None else queryset.filter(predicado(usuario))
+
+
+class EscopoMixin:
+    """Aplica escopar() ao get_queryset do viewset."""
+
+    def get_queryset(self):
+        return escopar(super().get_queryset(), self.request.user)
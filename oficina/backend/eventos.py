@@ -0,0 +1,233 @@
+import asyncio
+import json
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
+from django.dispatch import receiver
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .escopo import escopar
+from .models import EventoStatus, Orcamento, OrdemServico
+from .signals import status_alterado
+
+# Feed de transições de status por server-sent events (GET /api/eventos/).
+#
+# Escrita: um receiver de status_alterado grava EventoStatus (o outbox) na
+# mesma transação do save; aprovar, rejeitar, gerar_ordem_servico e concluir
+# salvam dentro de transaction.atomic(), então status e evento entram juntos
+# ou nenhum dos dois.
+#
+# Leitura: por processo (event loop) um Difusor consulta o outbox a cada
+# EVENTOS_INTERVALO segundos, uma query para todas as conexões, e entrega
+# cada evento nas filas dos assinantes que podem vê-lo. Quem reconecta com
+# Last-Event-ID recebe antes o que perdeu, direto do banco.
+
+
+@receiver(status_alterado, sender=Orcamento)
+@receiver(status_alterado, sender=OrdemServico)
+def registrar_evento(sender, instance, anterior, novo, **kwargs):
+    if sender is Orcamento:
+        orcamento_id = instance.pk
+        mecanico_id = instance.mecanico_responsavel_id
+        cliente_id = instance.veiculo.cliente_id
+    else:
+        orcamento_id = instance.orcamento_id
+        cliente_id, mecanico_id = (
+            Orcamento.objects.filter(pk=orcamento_id)
+            .values_list('veiculo__cliente_id', 'mecanico_responsavel_id').get()
+        )
+    EventoStatus.objects.create(
+        tipo='orcamento' if sender is Orcamento else 'ordem_servico', objeto_id=instance.pk,
+        orcamento_id=orcamento_id, cliente_id=cliente_id, mecanico_id=mecanico_id,
+        status_anterior=anterior, status_novo=novo,
+    )
+
+
+def visivel_para(usuario):
+    """Predicado evento -> bool com as regras de escopo de EventoStatus (backend/escopo.py); None se não vê nada."""
+    tipo = getattr(usuario, 'tipo', None) if usuario.is_authenticated else None
+    if tipo == 'gerente':
+        return lambda evento: True
+    if tipo == 'cliente':
+        return lambda evento: evento.cliente_id == usuario.pk
+    if tipo == 'mecanico':
+        return lambda evento: evento.mecanico_id == usuario.pk
+    return None
+
+
+def formatar(evento):
+    dados = {
+        'id': evento.pk,
+        'tipo': evento.tipo,
+        'objeto_id': evento.objeto_id,
+        'orcamento_id': evento.orcamento_id,
+        'status_anterior': evento.status_anterior,
+        'status': evento.status_novo,
+        'criado_em': evento.criado_em.isoformat(),
+    }
+    return f'id: {evento.pk}\nevent: {evento.tipo}\ndata: {json.dumps(dados)}\n\n'
+
+
+class Difusor:
+    """Uma consulta ao outbox por intervalo, compartilhada pelas conexões do event loop."""
+
+    # Ids vêm de sequência: uma transação mais lenta pode gravar um id menor
+    # depois de um maior já entregue (no SQLite as escritas são serializadas,
+    # no PostgreSQL não). Por isso cada consulta relê os ids vistos nos
+    # últimos EVENTOS_JANELA segundos, e o piso só passa deles quando saem da
+    # janela.
+
+    lote = 1000
+
+    def __init__(self):
+        self.filas = {}
+        self.piso = None
+        self.recentes = {}
+        self.tarefa = None
+        self.trava = asyncio.Lock()
+
+    async def assinar(self, visivel):
+        async with self.trava:
+            if self.tarefa is None or self.tarefa.done():
+                # sem assinantes a tarefa termina; a próxima começa do fim do
+                # outbox, lido antes de o assinante receber qualquer coisa
+                self.piso = (await EventoStatus.objects.aaggregate(ultimo=Max('pk')))['ultimo'] or 0
+                self.recentes = {}
+                self.tarefa = asyncio.create_task(self.rodar())
+            fila = asyncio.Queue(maxsize=getattr(settings, 'EVENTOS_FILA_MAXIMA', 1000))
+            self.filas[fila] = visivel
+        return fila
+
+    def cancelar(self, fila):
+        self.filas.pop(fila, None)
+
+    def entregar(self, evento):
+        for fila, visivel in list(self.filas.items()):
+            if not visivel(evento):
+                continue
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # conexão que não lê: fecha, e o cliente reconecta com Last-Event-ID
+                self.cancelar(fila)
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(None)
+
+    async def rodar(self):
+        while self.filas:
+            await asyncio.sleep(getattr(settings, 'EVENTOS_INTERVALO', 1.0))
+            await self.consultar()
+
+    async def consultar(self):
+        # em blocos até o fim do outbox: os ids ainda na janela são relidos a
+        # cada consulta, e um bloco só com eles não pode parar a entrega
+        agora = time.monotonic()
+        desde = self.piso
+        while True:
+            eventos = [evento async for evento in EventoStatus.objects.filter(pk__gt=desde).order_by('pk')[:self.lote]]
+            for evento in eventos:
+                if evento.pk not in self.recentes:
+                    self.recentes[evento.pk] = agora
+                    self.entregar(evento)
+            if len(eventos) < self.lote:
+                break
+            desde = eventos[-1].pk
+
+        janela = getattr(settings, 'EVENTOS_JANELA', 5.0)
+        expirados = [pk for pk, visto_em in self.recentes.items() if agora - visto_em > janela]
+        if expirados:
+            self.piso = max(self.piso, max(expirados))
+            self.recentes = {pk: visto_em for pk, visto_em in self.recentes.items() if pk > self.piso}
+
+
+_difusores = weakref.WeakKeyDictionary()
+
+
+def get_difusor():
+    loop = asyncio.get_running_loop()
+    if loop not in _difusores:
+        _difusores[loop] = Difusor()
+    return _difusores[loop]
+
+
+async def autenticar(request):
+    # EventSource do navegador manda o cookie da sessão; Basic e afins passam
+    # pelos autenticadores do DRF numa thread
+    if 'HTTP_AUTHORIZATION' not in request.META:
+        return await request.auser()
+    drf_request = Request(request, authenticators=[classe() for classe in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return await sync_to_async(lambda: drf_request.user)()
+    except AuthenticationFailed:
+        return None
+
+
+def ler_ultimo_id(request):
+    valor = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    try:
+        return max(int(valor), 0) if valor is not None else None
+    except ValueError:
+        return None
+
+
+async def feed(request):
+    """GET /api/eventos/: transições de status dos orçamentos e ordens que o usuário vê."""
+    if request.method != 'GET':
+        return JsonResponse({'erro': 'Método não permitido'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        # sob WSGI a resposta infinita prenderia um worker inteiro
+        return JsonResponse({'erro': 'O feed de eventos só está disponível pelo servidor ASGI'}, status=501)
+
+    usuario = await autenticar(request)
+    if usuario is None or not usuario.is_authenticated:
+        return JsonResponse({'erro': 'Autenticação necessária'}, status=401)
+    visivel = visivel_para(usuario)
+    if visivel is None:
+        return JsonResponse({'erro': 'Sem acesso ao feed de eventos'}, status=403)
+
+    response = StreamingHttpResponse(transmitir(usuario, visivel, ler_ultimo_id(request)),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def transmitir(usuario, visivel, ultimo_id):
+    difusor = get_difusor()
+    # assina antes de ler o atraso: o que chegar no meio vem pelas duas vias e sai uma vez só
+    fila = await difusor.assinar(visivel)
+    enviados = set()
+    try:
+        yield f'retry: {int(getattr(settings, "EVENTOS_RETRY", 3.0) * 1000)}\n\n'
+        while ultimo_id is not None:
+            # atraso em blocos, até alcançar o fim do outbox
+            atrasados = escopar(EventoStatus.objects.filter(pk__gt=ultimo_id), usuario).order_by('pk')[:500]
+            bloco = [evento async for evento in atrasados]
+            for evento in bloco:
+                enviados.add(evento.pk)
+                yield formatar(evento)
+            ultimo_id = bloco[-1].pk if len(bloco) == 500 else None
+
+        fim = time.monotonic() + getattr(settings, 'EVENTOS_DURACAO', 300)
+        heartbeat = getattr(settings, 'EVENTOS_HEARTBEAT', 15.0)
+        while (restante := fim - time.monotonic()) > 0:
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=min(heartbeat, restante))
+            except TimeoutError:
+                # comentário SSE: mantém proxies e o navegador com a conexão aberta
+                yield ': ping\n\n'
+                continue
+            if evento is None:
+                break
+            if evento.pk not in enviados:
+                yield formatar(evento)
+    finally:
+        difusor.cancelar(fila)
@@ -0,0 +1,165 @@
+import csv
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+# Exportação em streaming (CSV ou JSON lines). As linhas saem de
+# values_list().iterator(chunk_size), então nem o queryset nem a resposta
+# ficam inteiros em memória: exportar um ano custa o mesmo que exportar um dia.
+# O queryset é o mesmo da listagem (get_queryset + filtros do viewset), com o
+# mesmo escopo por tipo de usuário e os mesmos parâmetros de filtro.
+# Sob ASGI a resposta leva um iterador assíncrono (ver em_thread): com um
+# síncrono o Django junta o corpo inteiro em memória antes de enviar.
+
+COLUNAS = {
+    'veiculo': [
+        'id', 'placa', 'marca', 'modelo', 'ano', 'cor', 'cliente_id', 'cliente__username',
+        'observacoes', 'data_cadastro',
+    ],
+    'peca': [
+        'id', 'codigo', 'nome', 'descricao', 'fabricante', 'quantidade_estoque', 'preco_unitario',
+        'estoque_minimo', 'status', 'abaixo_minimo', 'data_cadastro',
+    ],
+    'orcamento': [
+        'id', 'veiculo_id', 'veiculo__placa', 'veiculo__cliente_id', 'veiculo__cliente__username',
+        'mecanico_responsavel_id', 'mecanico_responsavel__username', 'data_criacao', 'data_validade',
+        'descricao_problema', 'valor_mao_obra', 'valor_pecas', 'desconto_aplicado', 'valor_total',
+        'status', 'observacoes',
+    ],
+    'ordemservico': [
+        'id', 'orcamento_id', 'orcamento__veiculo__placa', 'orcamento__mecanico_responsavel_id',
+        'orcamento__valor_total', 'data_inicio', 'data_previsao', 'data_conclusao', 'status',
+        'km_entrada',
+    ],
+    'itempeca': [
+        'id', 'ordem_servico_id', 'peca_id', 'peca__codigo', 'peca__nome', 'quantidade',
+        'preco_unitario_cobrado', 'estoque_reduzido',
+    ],
+}
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def get_colunas(model):
+    return COLUNAS[model._meta.model_name]
+
+
+def data_iso(valor):
+    # mesma representação do DRF: ISO 8601 no fuso ativo, UTC como "Z"
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        valor = valor.isoformat()
+        return valor[:-6] + 'Z' if valor.endswith('+00:00') else valor
+    return valor.isoformat()
+
+
+def texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, date):
+        return data_iso(valor)
+    return str(valor)
+
+
+class Eco:
+    """Arquivo falso para o csv.writer: write devolve a linha em vez de guardar."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas(queryset, colunas, chunk_size):
+    return queryset.values_list(*colunas).iterator(chunk_size=chunk_size)
+
+
+def gerar_csv(queryset, colunas, chunk_size):
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(colunas)
+    bloco = []
+    for linha in linhas(queryset, colunas, chunk_size):
+        bloco.append(escritor.writerow([texto(valor) for valor in linha]))
+        if len(bloco) >= chunk_size:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+def gerar_ndjson(queryset, colunas, chunk_size):
+    codificador = DjangoJSONEncoder(ensure_ascii=False)
+    bloco = []
+    for linha in linhas(queryset, colunas, chunk_size):
+        registro = {
+            coluna: data_iso(valor) if isinstance(valor, date) else valor
+            for coluna, valor in zip(colunas, linha)
+        }
+        bloco.append(codificador.encode(registro) + '\n')
+        if len(bloco) >= chunk_size:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+GERADORES = {'csv': gerar_csv, 'ndjson': gerar_ndjson}
+
+
+def exportar(queryset, formato, chunk_size=None):
+    """Gerador de blocos de texto com as linhas do queryset no formato pedido."""
+    chunk_size = chunk_size or getattr(settings, 'EXPORTACAO_CHUNK_SIZE', 2000)
+    return GERADORES[formato](queryset, get_colunas(queryset.model), chunk_size)
+
+
+async def em_thread(blocos):
+    """
+    Consome um gerador síncrono de blocos numa thread, um bloco por vez, como o
+    aiterator() do ORM faz (o de values_list roda a query no event loop e
+    levanta SynchronousOnlyOperation, ver pagination.py). thread_sensitive:
+    todas as chamadas usam a mesma thread e a mesma conexão do banco.
+    """
+    proximo = sync_to_async(next)
+    while (bloco := await proximo(blocos, None)) is not None:
+        yield bloco
+
+
+def resposta_streaming(request, blocos, content_type):
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        blocos = em_thread(blocos)
+    return StreamingHttpResponse(blocos, content_type=content_type)
+
+
+def resposta_exportacao(request, queryset, formato, nome):
+    content_type, extensao = FORMATOS[formato]
+    response = resposta_streaming(request, exportar(queryset, formato), content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nome}.{extensao}"'
+    return response
+
+
+class ExportacaoMixin:
+    """Adiciona GET .../exportar/?formato=csv|ndjson com os filtros da listagem."""
+
+    # ?format= é reservado pelo DRF para escolher o renderer
+    formato_query_param = 'formato'
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        formato = request.query_params.get(self.formato_query_param, 'csv')
+        if formato not in FORMATOS:
+            return Response(
+                {'erro': f'Formato inválido. Use: {", ".join(FORMATOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        return resposta_exportacao(request, queryset, formato, self.basename)
@@ -0,0 +1,23 @@
+from django.db import models
+from django.db.models import Lookup
+
+
+class DocumentoBusca(models.TextField):
+    # coluna "documento" das tabelas do índice textual (backend/busca.py):
+    # FTS5 no SQLite e tsvector no PostgreSQL
+    configuracao_postgres = 'portuguese'
+
+
+@DocumentoBusca.register_lookup
+class CasaBusca(Lookup):
+    lookup_name = 'casa'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        if connection.vendor == 'postgresql':
+            return (
+                f'{lhs} @@ to_tsquery(%s, {rhs})',
+                (*lhs_params, DocumentoBusca.configuracao_postgres, *rhs_params)
+            )
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
@@ -0,0 +1,339 @@
+import contextvars
+import copy
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+# Instrumentação por requisição: quantas queries, quanto tempo de banco e de
+# serialização, queries repetidas e tamanho da resposta, por view e ação.
+#
+# Cada conexão ganha um execute_wrapper ao ser aberta (connection_created)
+# que soma na Medicao da requisição corrente, guardada numa ContextVar: vale
+# para views síncronas e async (o sync_to_async copia o contexto). A
+# serialização é o to_representation dos serializers (CamposDinamicosMixin) e
+# da lista rápida mais o render() da Response, sem o tempo de banco de dentro.
+#
+# Saída: cabeçalhos Server-Timing/X-Consultas na resposta e histogramas em
+# memória por processo, lidos em GET /api/metricas/. Respostas em streaming
+# são registradas quando o corpo termina, sem cabeçalhos.
+
+_medicao = contextvars.ContextVar('medicao', default=None)
+
+LIMITES_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LIMITES_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LIMITES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Medicao:
+
+    __slots__ = ('rotulo', 'inicio', 'consultas', 'tempo_banco', 'sql', 'tempo_serializacao', 'serializando', 'bytes')
+
+    def __init__(self):
+        self.rotulo = 'sem_view'
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        # sql (com os placeholders, sem os parâmetros) -> vezes executado
+        self.sql = {}
+        self.tempo_serializacao = 0.0
+        self.serializando = False
+        self.bytes = 0
+
+    def repetidas(self):
+        """Queries que repetem o SQL de uma anterior da mesma requisição (o padrão do N+1)."""
+        return self.consultas - len(self.sql)
+
+
+def cronometrar_consulta(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_banco += time.perf_counter() - inicio
+        medicao.consultas += 1
+        medicao.sql[sql] = medicao.sql.get(sql, 0) + 1
+
+
+@receiver(connection_created)
+def instrumentar_conexao(sender, connection, **kwargs):
+    # a lista de wrappers sobrevive a reconexões (CONN_MAX_AGE)
+    if cronometrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(cronometrar_consulta)
+
+
+def medir_serializacao(funcao, *args):
+    """funcao(*args) contando como serialização da requisição corrente, fora o tempo de banco."""
+    medicao = _medicao.get()
+    if medicao is None or medicao.serializando:
+        # aninhado (relação expandida, item da ordem): o de fora já conta
+        return funcao(*args)
+    medicao.serializando = True
+    inicio, banco = time.perf_counter(), medicao.tempo_banco
+    try:
+        return funcao(*args)
+    finally:
+        medicao.serializando = False
+        medicao.tempo_serializacao += time.perf_counter() - inicio - (medicao.tempo_banco - banco)
+
+
+class Histograma:
+    """Buckets cumulativos como os do Prometheus: contagens[i] é de valores <= limites[i], o último é +Inf."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.maximo = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, fracao):
+        """Limite superior do bucket em que cai o percentil (o máximo, se for o +Inf)."""
+        alvo = fracao * sum(self.contagens)
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def como_dict(self):
+        contagem = sum(self.contagens)
+        acumulado = 0
+        buckets = {}
+        for limite, quantidade in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += quantidade
+            buckets[str(limite)] = acumulado
+        return {
+            'contagem': contagem,
+            'soma': round(self.soma, 3),
+            'media': round(self.soma / contagem, 3) if contagem else None,
+            'maximo': round(self.maximo, 3),
+            'p50': round(self.percentil(0.5), 3) if contagem else None,
+            'p95': round(self.percentil(0.95), 3) if contagem else None,
+            'p99': round(self.percentil(0.99), 3) if contagem else None,
+            'buckets': buckets,
+        }
+
+
+class MetricasView:
+
+    def __init__(self):
+        self.tempo_ms = Histograma(LIMITES_MS)
+        self.banco_ms = Histograma(LIMITES_MS)
+        self.serializacao_ms = Histograma(LIMITES_MS)
+        self.consultas = Histograma(LIMITES_CONSULTAS)
+        self.bytes = Histograma(LIMITES_BYTES)
+        self.status = {}
+        self.requisicoes_com_repeticao = 0
+        # sql -> {'vezes_max': ..., 'requisicoes': ...}
+        self.repetidas = {}
+
+    def registrar(self, medicao, duracao, status, max_repetidas):
+        self.tempo_ms.observar(duracao * 1000)
+        self.banco_ms.observar(medicao.tempo_banco * 1000)
+        self.serializacao_ms.observar(medicao.tempo_serializacao * 1000)
+        self.consultas.observar(medicao.consultas)
+        self.bytes.observar(medicao.bytes)
+        classe = f'{status // 100}xx'
+        self.status[classe] = self.status.get(classe, 0) + 1
+        if not medicao.repetidas():
+            return
+        self.requisicoes_com_repeticao += 1
+        for sql, vezes in medicao.sql.items():
+            if vezes < 2:
+                continue
+            registro = self.repetidas.get(sql)
+            if registro is None:
+                if len(self.repetidas) >= max_repetidas:
+                    continue
+                registro = self.repetidas[sql] = {'vezes_max': 0, 'requisicoes': 0}
+            registro['vezes_max'] = max(registro['vezes_max'], vezes)
+            registro['requisicoes'] += 1
+
+    def como_dict(self):
+        return {
+            'requisicoes': sum(self.tempo_ms.contagens),
+            'status': dict(self.status),
+            'tempo_ms': self.tempo_ms.como_dict(),
+            'banco_ms': self.banco_ms.como_dict(),
+            'serializacao_ms': self.serializacao_ms.como_dict(),
+            'consultas': self.consultas.como_dict(),
+            'bytes': self.bytes.como_dict(),
+            'requisicoes_com_repeticao': self.requisicoes_com_repeticao,
+            'consultas_repetidas': sorted((
+                {
+                    'impressao': hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()[:12],
+                    'sql': sql[:500], **registro,
+                }
+                for sql, registro in self.repetidas.items()
+            ), key=lambda item: (-item['requisicoes'], -item['vezes_max'])),
+        }
+
+
+class Metricas:
+    """Histogramas por rótulo de view ('PecaViewSet.list'), do processo atual."""
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self.trava:
+            self.views = {}
+            self.desde = timezone.now()
+
+    def registrar(self, medicao, duracao, status):
+        max_repetidas = getattr(settings, 'INSTRUMENTACAO_MAX_REPETIDAS', 20)
+        with self.trava:
+            por_view = self.views.get(medicao.rotulo)
+            if por_view is None:
+                por_view = self.views[medicao.rotulo] = MetricasView()
+            por_view.registrar(medicao, duracao, status, max_repetidas)
+
+    def copia(self):
+        """{rótulo: MetricasView} copiados sob a trava, para exportar sem segurar as requisições."""
+        with self.trava:
+            return copy.deepcopy(self.views)
+
+    def como_dict(self):
+        with self.trava:
+            return {
+                'processo': os.getpid(),
+                'desde': self.desde,
+                'views': {rotulo: por_view.como_dict() for rotulo, por_view in sorted(self.views.items())},
+            }
+
+
+metricas = Metricas()
+
+
+def rotulo_da_view(request, view_func):
+    # as views do router (e as async de assincrono.py) trazem cls e actions
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    metodo = request.method.lower()
+    acoes = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{acoes.get(metodo, metodo)}'
+
+
+class InstrumentacaoMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.concluir(response, medicao)
+
+    async def __acall__(self, request):
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self.concluir(response, medicao)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicao = _medicao.get()
+        if medicao is not None:
+            medicao.rotulo = rotulo_da_view(request, view_func)
+
+    def process_template_response(self, request, response):
+        # chamado logo antes do render() da Response do DRF
+        medicao = _medicao.get()
+        if medicao is not None:
+            inicio, banco = time.perf_counter(), medicao.tempo_banco
+
+            def fim_do_render(response):
+                medicao.tempo_serializacao += time.perf_counter() - inicio - (medicao.tempo_banco - banco)
+
+            response.add_post_render_callback(fim_do_render)
+        return response
+
+    def concluir(self, response, medicao):
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.acompanhar_async(response.streaming_content, medicao, response)
+            else:
+                response.streaming_content = self.acompanhar(response.streaming_content, medicao, response)
+            return response
+
+        duracao = time.perf_counter() - medicao.inicio
+        medicao.bytes = len(response.content)
+        if getattr(settings, 'INSTRUMENTACAO_CABECALHOS', True):
+            response['Server-Timing'] = (
+                f'banco;dur={medicao.tempo_banco * 1000:.2f}, '
+                f'serializacao;dur={medicao.tempo_serializacao * 1000:.2f}, '
+                f'total;dur={duracao * 1000:.2f}'
+            )
+            response['X-Consultas'] = str(medicao.consultas)
+            response['X-Consultas-Repetidas'] = str(medicao.repetidas())
+        metricas.registrar(medicao, duracao, response.status_code)
+        return response
+
+    def acompanhar(self, conteudo, medicao, response):
+        # as queries do streaming (exportar/, alteracoes/) rodam fora do
+        # get_response, enquanto o servidor pede cada bloco
+        conteudo = iter(conteudo)
+        try:
+            while True:
+                token = _medicao.set(medicao)
+                try:
+                    parte = next(conteudo)
+                except StopIteration:
+                    break
+                finally:
+                    _medicao.reset(token)
+                medicao.bytes += len(parte)
+                yield parte
+        finally:
+            metricas.registrar(medicao, time.perf_counter() - medicao.inicio, response.status_code)
+
+    async def acompanhar_async(self, conteudo, medicao, response):
+        # exportar/ e alteracoes/ sob ASGI e o feed SSE: o tempo é o da conexão
+        # inteira; as consultas do difusor do SSE são do processo, não desta requisição
+        conteudo = aiter(conteudo)
+        try:
+            while True:
+                token = _medicao.set(medicao)
+                try:
+                    parte = await anext(conteudo)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _medicao.reset(token)
+                medicao.bytes += len(parte)
+                yield parte
+        finally:
+            metricas.registrar(medicao, time.perf_counter() - medicao.inicio, response.status_code)
@@ -0,0 +1,376 @@
+import fnmatch
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca, TarefaConclusao, Alteracao
+from oficina.urls import router
+
+from .bench_conclusao import percentil
+
+
+class Caso:
+    """
+    Uma rota medida: caminho e corpo podem ser funções do alvo (a pk da vez);
+    alvos é uma função chamada quando o caso começa, para casos que dependem do
+    que os anteriores criaram; depois(alvo, response) guarda o que foi criado.
+    """
+
+    def __init__(self, nome, metodo, rota, usuario, caminho, corpo=None, alvos=None, esperado=200, depois=None):
+        self.nome = nome
+        self.metodo = metodo
+        self.rota = rota
+        self.usuario = usuario
+        self.caminho = caminho
+        self.corpo = corpo
+        self.alvos = alvos
+        self.esperado = esperado
+        self.depois = depois
+
+    def resolver(self, valor, alvo):
+        return valor(alvo) if callable(valor) else valor
+
+
+def rotas_do_router():
+    return sorted({
+        url.name for url in router.urls
+        if url.name != 'api-root' and 'format' not in url.pattern.regex.groupindex
+    })
+
+
+def versao_do_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def host_permitido():
+    # com DEBUG e ALLOWED_HOSTS vazio o Django aceita localhost; senão o primeiro host concreto da lista
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Passa por todas as rotas do router (leituras, escritas e as ações aprovar, rejeitar, gerar_ordem_servico, '
+        'adicionar_peca, adicionar_pecas e concluir) sobre os dados do banco atual (ex.: gerados por semear) e '
+        'mede vazão, p50/p95/p99 e queries por requisição. Tudo roda numa transação desfeita no fim, então o '
+        'banco volta igual e a medição é repetível. Resultado em JSON (--saida) para comparar versões (--comparar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=50, help='Requisições por caso')
+        parser.add_argument('--aquecimento', type=int, default=3, help='Requisições descartadas antes de cada leitura')
+        parser.add_argument('--casos', nargs='+', metavar='PADRAO',
+                            help="Só os casos que casam com o padrão, ex.: 'pecas.*' (as ações encadeadas "
+                                 "precisam dos casos anteriores da cadeia)")
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--saida', help='Arquivo JSON com o resultado')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] <= 0:
+            raise CommandError('--repeticoes deve ser positivo')
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+
+        self.aleatorio = random.Random(options['semente'])
+        self.repeticoes = options['repeticoes']
+        self.estado = {}
+        self.client = APIClient(HTTP_HOST=host_permitido())
+        # erro 500 vira resultado, não exceção
+        self.client.raise_request_exception = False
+
+        linhas = {model._meta.model_name: model.objects.count()
+                  for model in (Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca)}
+        resultados = {}
+        with transaction.atomic():
+            casos = self.montar_casos()
+            selecionados = [
+                caso for caso in casos
+                if not options['casos'] or any(fnmatch.fnmatch(caso.nome, padrao) for padrao in options['casos'])
+            ]
+            for caso in selecionados:
+                resultados[caso.nome] = self.medir(caso, options['aquecimento'])
+                self.stdout.write(self.linha(caso.nome, resultados[caso.nome], anterior))
+            transaction.set_rollback(True)
+
+        cobertas = {caso.rota for caso in casos}
+        sem_caso = [rota for rota in rotas_do_router() if rota not in cobertas]
+        if sem_caso:
+            self.stderr.write(f'rotas do router sem caso: {", ".join(sem_caso)}')
+
+        relatorio = {
+            'versao_formato': 1,
+            'gerado_em': timezone.now().isoformat(),
+            'codigo': versao_do_codigo(),
+            'ambiente': {
+                'banco': connection.vendor, 'python': platform.python_version(), 'django': django.get_version(),
+            },
+            'linhas': linhas,
+            'repeticoes': self.repeticoes,
+            'rotas_sem_caso': sem_caso,
+            'casos': resultados,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+                arquivo.write('\n')
+
+    def linha(self, nome, resultado, anterior):
+        texto = (
+            f'{nome:<34} {resultado["requisicoes"]:>4} req {resultado["vazao_rps"]:9.1f} req/s '
+            f'p50={resultado["p50_ms"]:8.2f}ms p95={resultado["p95_ms"]:8.2f}ms p99={resultado["p99_ms"]:8.2f}ms '
+            f'queries={resultado["consultas_p50"]:g} erros={resultado["erros"]}'
+        )
+        base = (anterior or {}).get('casos', {}).get(nome)
+        if base and base['p50_ms'] and resultado['requisicoes']:
+            texto += (
+                f' | p50 {resultado["p50_ms"] / base["p50_ms"]:.2f}x, '
+                f'queries {base["consultas_p50"]:g}->{resultado["consultas_p50"]:g}'
+            )
+        return texto
+
+    def medir(self, caso, aquecimento):
+        alvos = caso.alvos()[:self.repeticoes] if caso.alvos else [None] * self.repeticoes
+        if caso.metodo == 'GET' and alvos:
+            for _ in range(aquecimento):
+                self.requisitar(caso, alvos[0])
+
+        latencias, consultas, erros, exemplo_erro = [], [], 0, None
+        for alvo in alvos:
+            response, conteudo, duracao, quantidade = self.requisitar(caso, alvo)
+            latencias.append(duracao * 1000)
+            consultas.append(quantidade)
+            if response.status_code != caso.esperado:
+                erros += 1
+                if exemplo_erro is None:
+                    exemplo_erro = {'status': response.status_code, 'corpo': conteudo[:500].decode('utf-8', 'replace')}
+            elif caso.depois:
+                caso.depois(alvo, response)
+
+        total = sum(latencias) / 1000
+        resultado = {
+            'metodo': caso.metodo,
+            'rota': caso.rota,
+            'requisicoes': len(latencias),
+            'erros': erros,
+            'vazao_rps': round(len(latencias) / total, 1) if total else 0.0,
+            'media_ms': round(statistics.fmean(latencias), 3) if latencias else 0.0,
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'consultas_p50': statistics.median(consultas) if consultas else 0,
+            'consultas_max': max(consultas, default=0),
+        }
+        if exemplo_erro:
+            resultado['exemplo_erro'] = exemplo_erro
+        return resultado
+
+    def requisitar(self, caso, alvo):
+        """(response, corpo lido, segundos, queries) de uma requisição, isolada num savepoint."""
+        self.client.force_authenticate(caso.resolver(caso.usuario, alvo))
+        caminho = caso.resolver(caso.caminho, alvo)
+        corpo = caso.resolver(caso.corpo, alvo)
+        metodo = getattr(self.client, caso.metodo.lower())
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                if caso.metodo == 'GET':
+                    response = metodo(caminho)
+                else:
+                    response = metodo(caminho, corpo, format='json')
+                conteudo = b''.join(response.streaming_content) if response.streaming else response.content
+                duracao = time.perf_counter() - inicio
+        return response, conteudo, duracao, len(consultas)
+
+    def sortear(self, queryset, quantidade):
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+        return self.aleatorio.sample(pks, min(quantidade, len(pks)))
+
+    def guardar(self, chave):
+        def depois(alvo, response):
+            self.estado.setdefault(chave, []).append(response.data['id'])
+        return depois
+
+    def criados(self, chave):
+        return lambda: list(self.estado.get(chave, []))
+
+    def montar_casos(self):
+        n = self.repeticoes
+        hoje = timezone.localdate()
+        gerente = Usuario.objects.filter(tipo='gerente').order_by('pk').first()
+        if gerente is None:
+            raise CommandError('O banco não tem gerente: gere os dados com manage.py semear')
+        primeiro = Orcamento.objects.select_related('veiculo__cliente', 'mecanico_responsavel').order_by('pk').first()
+        if primeiro is None:
+            raise CommandError('O banco não tem orçamentos: gere os dados com manage.py semear')
+        cliente, mecanico = primeiro.veiculo.cliente, primeiro.mecanico_responsavel
+
+        usuarios = self.sortear(Usuario.objects.all(), n)
+        veiculos = self.sortear(Veiculo.objects.all(), n)
+        pecas = self.sortear(Peca.objects.all(), n)
+        orcamentos = self.sortear(Orcamento.objects.all(), n)
+        ordens = self.sortear(OrdemServico.objects.all(), n)
+        itens = self.sortear(ItemPeca.objects.all(), n)
+        codigos = list(Peca.objects.filter(pk__in=pecas).values_list('codigo', flat=True))
+
+        # pendentes na validade, metade para aprovar e metade para rejeitar, cada um pelo seu cliente
+        pendentes = self.sortear(Orcamento.objects.filter(status='pendente', data_validade__gte=hoje), 2 * n)
+        donos = dict(Orcamento.objects.filter(pk__in=pendentes).values_list('pk', 'veiculo__cliente_id'))
+        clientes = Usuario.objects.in_bulk(set(donos.values()))
+        sem_ordem = self.sortear(Orcamento.objects.filter(status='aprovado', ordem_servico__isnull=True), n)
+        # peças com estoque para as ordens da cadeia (cada ordem usa 5 peças distintas)
+        estoque = self.sortear(Peca.objects.filter(status='disponivel', quantidade_estoque__gte=20), 200)
+        if len(estoque) < 5:
+            raise CommandError('Menos de 5 peças disponíveis com estoque >= 20')
+        tarefa = TarefaConclusao.objects.create(
+            ordem_servico_id=ordens[0], solicitante=gerente, status='concluida', codigo_http=200,
+        )
+        desde = max((Alteracao.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) - 500, 0)
+
+        def peca_da_ordem(alvo, deslocamento):
+            indice, _ = alvo
+            return estoque[(indice * 5 + deslocamento) % len(estoque)]
+
+        dono = lambda pk: clientes[donos[pk]]
+        return [
+            # leituras
+            Caso('usuarios.list', 'GET', 'usuario-list', gerente, '/api/usuarios/'),
+            Caso('usuarios.retrieve', 'GET', 'usuario-detail', gerente, lambda pk: f'/api/usuarios/{pk}/',
+                 alvos=lambda: usuarios),
+            Caso('veiculos.list', 'GET', 'veiculo-list', gerente, '/api/veiculos/'),
+            Caso('veiculos.list_cliente', 'GET', 'veiculo-list', cliente, '/api/veiculos/'),
+            Caso('veiculos.busca', 'GET', 'veiculo-list', gerente, '/api/veiculos/?search=civic prata'),
+            Caso('veiculos.retrieve', 'GET', 'veiculo-detail', gerente, lambda pk: f'/api/veiculos/{pk}/',
+                 alvos=lambda: veiculos),
+            Caso('veiculos.exportar', 'GET', 'veiculo-exportar', cliente, '/api/veiculos/exportar/?formato=ndjson'),
+            Caso('pecas.list', 'GET', 'peca-list', gerente, '/api/pecas/'),
+            Caso('pecas.busca', 'GET', 'peca-list', gerente, '/api/pecas/?search=pastilha freio'),
+            Caso('pecas.retrieve', 'GET', 'peca-detail', gerente, lambda pk: f'/api/pecas/{pk}/', alvos=lambda: pecas),
+            Caso('pecas.verificar_estoque', 'GET', 'peca-verificar-estoque', gerente,
+                 lambda pk: f'/api/pecas/{pk}/verificar_estoque/?quantidade_desejada=2', alvos=lambda: pecas),
+            Caso('pecas.reposicao', 'GET', 'peca-reposicao', gerente, '/api/pecas/reposicao/'),
+            Caso('pecas.estatisticas_cache', 'GET', 'peca-estatisticas-cache', gerente, '/api/pecas/estatisticas_cache/'),
+            Caso('pecas.exportar', 'GET', 'peca-exportar', gerente, '/api/pecas/exportar/?formato=ndjson&status=esgotado'),
+            Caso('orcamentos.list', 'GET', 'orcamento-list', gerente, '/api/orcamentos/'),
+            Caso('orcamentos.list_mecanico', 'GET', 'orcamento-list', mecanico, '/api/orcamentos/'),
+            Caso('orcamentos.retrieve', 'GET', 'orcamento-detail', gerente, lambda pk: f'/api/orcamentos/{pk}/',
+                 alvos=lambda: orcamentos),
+            Caso('orcamentos.exportar', 'GET', 'orcamento-exportar', cliente, '/api/orcamentos/exportar/?formato=ndjson'),
+            Caso('ordens.list', 'GET', 'ordemservico-list', gerente, '/api/ordens-servico/'),
+            Caso('ordens.list_cliente', 'GET', 'ordemservico-list', cliente, '/api/ordens-servico/'),
+            Caso('ordens.retrieve', 'GET', 'ordemservico-detail', gerente, lambda pk: f'/api/ordens-servico/{pk}/',
+                 alvos=lambda: ordens),
+            Caso('ordens.exportar', 'GET', 'ordemservico-exportar', cliente, '/api/ordens-servico/exportar/?formato=ndjson'),
+            Caso('itens.list', 'GET', 'itempeca-list', gerente, '/api/itens-peca/'),
+            Caso('itens.retrieve', 'GET', 'itempeca-detail', gerente, lambda pk: f'/api/itens-peca/{pk}/',
+                 alvos=lambda: itens),
+            Caso('itens.exportar', 'GET', 'itempeca-exportar', cliente, '/api/itens-peca/exportar/?formato=ndjson'),
+            Caso('tarefas.list', 'GET', 'tarefaconclusao-list', gerente, '/api/tarefas-conclusao/'),
+            Caso('tarefas.retrieve', 'GET', 'tarefaconclusao-detail', gerente, f'/api/tarefas-conclusao/{tarefa.pk}/'),
+            Caso('relatorios.list', 'GET', 'relatorio-list', gerente, '/api/relatorios/'),
+            Caso('relatorios.receita_diaria', 'GET', 'relatorio-receita-diaria', gerente, '/api/relatorios/receita_diaria/'),
+            Caso('alteracoes.list', 'GET', 'alteracao-list', gerente, f'/api/alteracoes/?desde={desde}&limite=500'),
+            Caso('metricas.list', 'GET', 'metrica-list', gerente, '/api/metricas/'),
+            Caso('metricas.zerar', 'POST', 'metrica-zerar', gerente, '/api/metricas/zerar/', esperado=204),
+
+            # criações
+            Caso('usuarios.create', 'POST', 'usuario-list', gerente, '/api/usuarios/', esperado=201,
+                 corpo=lambda i: {'username': f'bench_api{i}', 'password': 'senha123', 'tipo': 'cliente',
+                                  'cpf': f'bench{i}', 'telefone': '(11) 90000-0000'},
+                 alvos=lambda: list(range(n)), depois=self.guardar('usuarios')),
+            Caso('veiculos.create', 'POST', 'veiculo-list', gerente, '/api/veiculos/', esperado=201,
+                 corpo=lambda i: {'placa': f'BENCH{i:05d}', 'marca': 'Fiat', 'modelo': 'Argo', 'ano': 2022,
+                                  'cor': 'Branco', 'cliente': cliente.pk},
+                 alvos=lambda: list(range(n)), depois=self.guardar('veiculos')),
+            Caso('pecas.create', 'POST', 'peca-list', gerente, '/api/pecas/', esperado=201,
+                 corpo=lambda i: {'codigo': f'BENCH-{i:06d}', 'nome': f'Peça do bench {i}', 'descricao': 'bench_api',
+                                  'fabricante': 'Bench', 'quantidade_estoque': 10, 'preco_unitario': '19.90'},
+                 alvos=lambda: list(range(n)), depois=self.guardar('pecas')),
+            Caso('orcamentos.create', 'POST', 'orcamento-list', gerente, '/api/orcamentos/', esperado=201,
+                 corpo=lambda pk: {'veiculo': pk, 'data_validade': str(hoje + timedelta(days=15)),
+                                   'descricao_problema': 'Revisão periódica com troca de filtros', 'valor_mao_obra': '150.00'},
+                 alvos=lambda: veiculos, depois=self.guardar('orcamentos')),
+            Caso('ordens.create', 'POST', 'ordemservico-list', gerente, '/api/ordens-servico/', esperado=201,
+                 corpo=lambda pk: {'orcamento': pk, 'data_inicio': timezone.now().isoformat(),
+                                   'data_previsao': str(hoje + timedelta(days=7)), 'km_entrada': 50000,
+                                   'status': 'aguardando'},
+                 alvos=lambda: sem_ordem, depois=self.guardar('ordens_criadas')),
+
+            # atualizações parciais (PATCH; o PUT passa pelo mesmo update do DRF)
+            Caso('usuarios.partial_update', 'PATCH', 'usuario-detail', gerente, lambda pk: f'/api/usuarios/{pk}/',
+                 corpo={'telefone': '(11) 91111-1111'}, alvos=lambda: usuarios),
+            Caso('veiculos.partial_update', 'PATCH', 'veiculo-detail', gerente, lambda pk: f'/api/veiculos/{pk}/',
+                 corpo={'cor': 'Grafite'}, alvos=lambda: veiculos),
+            Caso('pecas.partial_update', 'PATCH', 'peca-detail', gerente, lambda pk: f'/api/pecas/{pk}/',
+                 corpo={'preco_unitario': '99.90'}, alvos=lambda: pecas),
+            Caso('orcamentos.partial_update', 'PATCH', 'orcamento-detail', gerente, lambda pk: f'/api/orcamentos/{pk}/',
+                 corpo={'observacoes': 'Cliente pediu retorno por telefone'}, alvos=lambda: orcamentos),
+            Caso('ordens.partial_update', 'PATCH', 'ordemservico-detail', gerente, lambda pk: f'/api/ordens-servico/{pk}/',
+                 corpo={'km_entrada': 123456}, alvos=lambda: ordens),
+            Caso('pecas.lote', 'POST', 'peca-lote', gerente, '/api/pecas/lote/',
+                 corpo=lambda i: [{'codigo': codigo, 'preco_unitario': f'{10 + i}.00'} for codigo in codigos],
+                 alvos=lambda: list(range(n))),
+
+            # fluxo do orçamento à conclusão, cada passo sobre o que o anterior produziu
+            Caso('orcamentos.aprovar', 'POST', 'orcamento-aprovar', dono, lambda pk: f'/api/orcamentos/{pk}/aprovar/',
+                 alvos=lambda: pendentes[:n], depois=lambda pk, response: self.estado.setdefault('aprovados', []).append(pk)),
+            Caso('orcamentos.rejeitar', 'POST', 'orcamento-rejeitar', dono, lambda pk: f'/api/orcamentos/{pk}/rejeitar/',
+                 corpo={'motivo': 'Preço acima do esperado'}, alvos=lambda: pendentes[n:]),
+            Caso('orcamentos.gerar_ordem_servico', 'POST', 'orcamento-gerar-ordem-servico', gerente,
+                 lambda pk: f'/api/orcamentos/{pk}/gerar_ordem_servico/', corpo={'km_entrada': 42000}, esperado=201,
+                 alvos=self.criados('aprovados'), depois=self.guardar('ordens')),
+            Caso('ordens.adicionar_peca', 'POST', 'ordemservico-adicionar-peca', gerente,
+                 lambda alvo: f'/api/ordens-servico/{alvo[1]}/adicionar_peca/', esperado=201,
+                 corpo=lambda alvo: {'peca_id': peca_da_ordem(alvo, 0), 'quantidade': 1, 'preco_unitario_cobrado': 50},
+                 alvos=lambda: list(enumerate(self.estado.get('ordens', [])))),
+            Caso('ordens.adicionar_pecas', 'POST', 'ordemservico-adicionar-pecas', gerente,
+                 lambda alvo: f'/api/ordens-servico/{alvo[1]}/adicionar_pecas/', esperado=201,
+                 corpo=lambda alvo: [
+                     {'peca_id': peca_da_ordem(alvo, deslocamento), 'quantidade': 1, 'preco_unitario_cobrado': '50.00'}
+                     for deslocamento in (1, 2, 3)
+                 ],
+                 alvos=lambda: list(enumerate(self.estado.get('ordens', [])))),
+            Caso('itens.create', 'POST', 'itempeca-list', gerente, '/api/itens-peca/', esperado=201,
+                 corpo=lambda alvo: {'ordem_servico': alvo[1], 'peca': peca_da_ordem(alvo, 4), 'quantidade': 1,
+                                     'preco_unitario_cobrado': '50.00'},
+                 alvos=lambda: list(enumerate(self.estado.get('ordens', []))), depois=self.guardar('itens')),
+            Caso('itens.partial_update', 'PATCH', 'itempeca-detail', gerente, lambda pk: f'/api/itens-peca/{pk}/',
+                 corpo={'quantidade': 2}, alvos=self.criados('itens')),
+            Caso('ordens.concluir', 'POST', 'ordemservico-concluir', gerente,
+                 lambda pk: f'/api/ordens-servico/{pk}/concluir/', alvos=self.criados('ordens')),
+
+            # remoções do que foi criado acima
+            Caso('itens.destroy', 'DELETE', 'itempeca-detail', gerente, lambda pk: f'/api/itens-peca/{pk}/',
+                 esperado=204, alvos=self.criados('itens')),
+            Caso('ordens.destroy', 'DELETE', 'ordemservico-detail', gerente, lambda pk: f'/api/ordens-servico/{pk}/',
+                 esperado=204, alvos=self.criados('ordens_criadas')),
+            Caso('orcamentos.destroy', 'DELETE', 'orcamento-detail', gerente, lambda pk: f'/api/orcamentos/{pk}/',
+                 esperado=204, alvos=self.criados('orcamentos')),
+            Caso('pecas.destroy', 'DELETE', 'peca-detail', gerente, lambda pk: f'/api/pecas/{pk}/',
+                 esperado=204, alvos=self.criados('pecas')),
+            Caso('veiculos.destroy', 'DELETE', 'veiculo-detail', gerente, lambda pk: f'/api/veiculos/{pk}/',
+                 esperado=204, alvos=self.criados('veiculos')),
+            Caso('usuarios.destroy', 'DELETE', 'usuario-detail', gerente, lambda pk: f'/api/usuarios/{pk}/',
+                 esperado=204, alvos=self.criados('usuarios')),
+        ]
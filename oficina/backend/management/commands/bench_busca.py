@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import and_, or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from backend import busca
+from backend.models import Peca, Veiculo, Orcamento
+from backend.views import PecaViewSet, VeiculoViewSet, OrcamentoViewSet
+
+VIEWSETS = {'peca': (Peca, PecaViewSet), 'veiculo': (Veiculo, VeiculoViewSet), 'orcamento': (Orcamento, OrcamentoViewSet)}
+
+NOMES = ['Pastilha de Freio', 'Disco de Freio', 'Filtro de Óleo', 'Filtro de Ar', 'Vela de Ignição',
+         'Correia Dentada', 'Amortecedor', 'Bomba d\'Água', 'Embreagem', 'Radiador']
+FABRICANTES = ['Bosch', 'Mann', 'Fras-le', 'NGK', 'Gates', 'Cofap', 'Valeo', 'Magneti Marelli']
+
+
+class Command(BaseCommand):
+    help = 'Compara a busca textual indexada com o SearchFilter (icontains) nos mesmos termos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=list(VIEWSETS), default='peca')
+        parser.add_argument('--termos', nargs='+', default=['freio', 'filtro oleo', 'bosch', 'vela'])
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--semear', type=int, default=0,
+                            help='Cria N peças sintéticas numa transação desfeita ao final')
+
+    def handle(self, *args, **options):
+        backend = busca.get_backend(connection)
+        if backend is None:
+            raise CommandError(f'Sem backend de busca para o banco {connection.vendor}')
+
+        with transaction.atomic():
+            if options['semear']:
+                self.semear(options['semear'])
+            model, viewset = VIEWSETS[options['model']]
+            self.stdout.write(f'{model.__name__}: {model.objects.count()} linhas, banco {connection.vendor}')
+            for termo in options['termos']:
+                antigo = self.medir(lambda: self.icontains(model, viewset.search_fields, termo), options['repeticoes'])
+                novo = self.medir(lambda: self.indexada(model, backend, termo), options['repeticoes'])
+                self.stdout.write(
+                    f'termo={termo!r} icontains: p50={antigo[0]:.2f}ms p95={antigo[1]:.2f}ms '
+                    f'({antigo[2]} linhas) | indice: p50={novo[0]:.2f}ms p95={novo[1]:.2f}ms ({novo[2]} linhas)'
+                )
+            transaction.set_rollback(True)
+
+    def icontains(self, model, campos, termo):
+        # o que o SearchFilter monta: AND entre palavras, OR entre campos
+        filtros = [reduce(or_, [Q(**{f'{campo}__icontains': palavra}) for campo in campos]) for palavra in termo.split()]
+        return model.objects.filter(reduce(and_, filtros))
+
+    def indexada(self, model, backend, termo):
+        consulta = backend.consulta(busca.termos(termo))
+        return (
+            model.objects.filter(busca__documento__casa=consulta)
+            .annotate(rank_busca=busca.RankBusca(consulta))
+            .order_by('rank_busca', 'pk')
+        )
+
+    def medir(self, montar, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            linhas = len(list(montar()[:50]))
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1 if len(tempos) > 1 else 0], linhas
+
+    def semear(self, quantidade):
+        aleatorio = random.Random(42)
+        pecas = [
+            Peca(
+                codigo=f'BB{i:08d}',
+                nome=f'{aleatorio.choice(NOMES)} {aleatorio.randint(1, 999)}',
+                descricao='Peça sintética do bench_busca',
+                fabricante=aleatorio.choice(FABRICANTES),
+                quantidade_estoque=aleatorio.randint(0, 50),
+                preco_unitario=aleatorio.randint(10, 500),
+            )
+            for i in range(quantidade)
+        ]
+        criadas = Peca.objects.bulk_create(pecas, batch_size=2000)
+        # bulk_create não dispara post_save: indexa em lote
+        busca.indexar(Peca, criadas)
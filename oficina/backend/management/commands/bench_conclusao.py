@@ -0,0 +1,146 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend import conclusao
+from backend.models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca, TarefaConclusao
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+class Command(BaseCommand):
+    help = 'Mede vazão e latência p50/p99 do concluir síncrono e do assíncrono num banco de teste descartável'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ordens', type=int, default=200)
+        parser.add_argument('--itens', type=int, default=20, help='Itens de peça por ordem')
+        parser.add_argument('--clientes', type=int, default=4, help='Requisições simultâneas')
+        parser.add_argument('--workers', type=int, default=4, help='Threads do pool no modo assíncrono')
+        parser.add_argument('--modos', nargs='+', choices=['sincrono', 'assincrono'], default=['sincrono', 'assincrono'])
+
+    def handle(self, *args, **options):
+        # banco de teste criado e destruído aqui; no SQLite em arquivo, para que
+        # as threads de clientes e workers concorram como em produção
+        teste = connection.settings_dict['TEST']
+        nome_teste = teste.get('NAME')
+        arquivo = None
+        if connection.vendor == 'sqlite':
+            arquivo = os.path.join(tempfile.mkdtemp(), 'bench_conclusao.sqlite3')
+            teste['NAME'] = arquivo
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(
+                f'{options["ordens"]} ordens x {options["itens"]} itens, {options["clientes"]} clientes, '
+                f'banco {connection.vendor}'
+            )
+            for modo in options['modos']:
+                mecanico, ordens = self.semear(modo, options['ordens'], options['itens'])
+                medir = self.medir_sincrono if modo == 'sincrono' else self.medir_assincrono
+                self.relatar(modo, medir(mecanico, ordens, options))
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teste['NAME'] = nome_teste
+            if arquivo and os.path.exists(arquivo):
+                os.remove(arquivo)
+
+    def semear(self, prefixo, quantidade, itens):
+        mecanico = Usuario.objects.create(username=f'{prefixo}_mecanico', tipo='mecanico', cpf=f'{prefixo}m', telefone='0')
+        cliente = Usuario.objects.create(username=f'{prefixo}_cliente', tipo='cliente', cpf=f'{prefixo}c', telefone='0')
+        veiculo = Veiculo.objects.create(
+            placa=f'{prefixo[:3].upper()}0000', marca='Honda', modelo='Civic', ano=2020, cor='Prata', cliente=cliente
+        )
+        pecas = Peca.objects.bulk_create([
+            Peca(codigo=f'{prefixo}{i}', nome=f'Peça {i}', descricao='bench', fabricante='Bench',
+                 quantidade_estoque=10 ** 9, preco_unitario=10)
+            for i in range(itens)
+        ])
+        orcamentos = Orcamento.objects.bulk_create([
+            Orcamento(veiculo=veiculo, mecanico_responsavel=mecanico, data_validade=timezone.localdate() + timedelta(days=10),
+                      descricao_problema='Orçamento do bench_conclusao', valor_mao_obra=100, valor_total=100,
+                      status='aprovado')
+            for _ in range(quantidade)
+        ])
+        ordens = OrdemServico.objects.bulk_create([
+            OrdemServico(orcamento=orcamento, data_inicio=timezone.now(), data_previsao=timezone.localdate(),
+                         km_entrada=0, status='em_andamento')
+            for orcamento in orcamentos
+        ])
+        ItemPeca.objects.bulk_create([
+            ItemPeca(ordem_servico=ordem, peca=peca, quantidade=1, preco_unitario_cobrado=10)
+            for ordem in ordens for peca in pecas
+        ], batch_size=5000)
+        return mecanico, [ordem.pk for ordem in ordens]
+
+    def disparar(self, mecanico, ordens, clientes, sufixo=''):
+        def concluir(ordem_id):
+            cliente = APIClient(HTTP_HOST='localhost')
+            cliente.force_authenticate(mecanico)
+            inicio = time.perf_counter()
+            response = cliente.post(f'/api/ordens-servico/{ordem_id}/concluir/{sufixo}')
+            return (time.perf_counter() - inicio) * 1000, response.status_code
+
+        with ThreadPoolExecutor(clientes) as executor:
+            return list(executor.map(concluir, ordens))
+
+    def medir_sincrono(self, mecanico, ordens, options):
+        inicio = time.perf_counter()
+        respostas = self.disparar(mecanico, ordens, options['clientes'])
+        total = time.perf_counter() - inicio
+        latencias = [ms for ms, _ in respostas]
+        return {
+            'vazao': len(ordens) / total,
+            'requisicao_p50': statistics.median(latencias),
+            'requisicao_p99': percentil(latencias, 99),
+            'erros': sum(1 for _, codigo in respostas if codigo != 200),
+        }
+
+    def medir_assincrono(self, mecanico, ordens, options):
+        settings.CONCLUSAO_WORKERS = options['workers']
+        pool = conclusao.get_pool()
+        try:
+            inicio = time.perf_counter()
+            respostas = self.disparar(mecanico, ordens, options['clientes'], sufixo='?assincrono=true')
+            while TarefaConclusao.objects.filter(status__in=['pendente', 'processando']).exists():
+                time.sleep(0.02)
+            total = time.perf_counter() - inicio
+        finally:
+            pool.parar()
+
+        tarefas = TarefaConclusao.objects.filter(ordem_servico_id__in=ordens)
+        ponta_a_ponta = [
+            (tarefa.finalizada_em - tarefa.criada_em).total_seconds() * 1000
+            for tarefa in tarefas if tarefa.finalizada_em
+        ]
+        latencias = [ms for ms, _ in respostas]
+        return {
+            'vazao': len(ordens) / total,
+            'requisicao_p50': statistics.median(latencias),
+            'requisicao_p99': percentil(latencias, 99),
+            'conclusao_p50': statistics.median(ponta_a_ponta) if ponta_a_ponta else 0.0,
+            'conclusao_p99': percentil(ponta_a_ponta, 99),
+            'erros': sum(1 for _, codigo in respostas if codigo != 202)
+                     + tarefas.exclude(status='concluida').count(),
+        }
+
+    def relatar(self, modo, resultado):
+        linha = (
+            f'{modo}: {resultado["vazao"]:.1f} ordens/s | resposta p50={resultado["requisicao_p50"]:.1f}ms '
+            f'p99={resultado["requisicao_p99"]:.1f}ms'
+        )
+        if 'conclusao_p50' in resultado:
+            linha += f' | até concluir p50={resultado["conclusao_p50"]:.1f}ms p99={resultado["conclusao_p99"]:.1f}ms'
+        self.stdout.write(f'{linha} | erros={resultado["erros"]}')
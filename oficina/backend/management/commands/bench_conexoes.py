@@ -0,0 +1,117 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .bench_conclusao import percentil
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo de conexão por request no banco configurado: conexão nova a cada request '
+        '(CONN_MAX_AGE=0), conexão persistente com health check e, no PostgreSQL, o pool do psycopg. '
+        'Cada request é um request_started, uma consulta e um request_finished, como no Django.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=1, help='Requests simultâneos (uma conexão por thread)')
+        parser.add_argument('--consulta', default='SELECT 1')
+
+    def handle(self, *args, **options):
+        if options['requisicoes'] <= 0 or options['threads'] <= 0:
+            raise CommandError('--requisicoes e --threads devem ser positivos')
+        base = connections['default'].settings_dict
+        self.stdout.write(f'{base["ENGINE"]} {base.get("HOST") or base["NAME"]}, '
+                          f'{options["requisicoes"]} requests, {options["threads"]} thread(s)')
+
+        self.conexoes = {}
+        self.trava = threading.Lock()
+        connection_created.connect(self.contar_conexao, dispatch_uid='bench_conexoes')
+        try:
+            resultados = {}
+            for nome, ajustes in self.perfis(base, options['threads']).items():
+                resultados[nome] = self.medir(nome, {**base, **ajustes}, options)
+        finally:
+            connection_created.disconnect(dispatch_uid='bench_conexoes')
+
+        referencia = resultados['nova']['p50']
+        for nome, resultado in resultados.items():
+            self.stdout.write(
+                f'{nome:12} {resultado["vazao"]:9,.0f} req/s  p50={resultado["p50"] * 1000:7.3f}ms  '
+                f'p99={resultado["p99"] * 1000:7.3f}ms  conexões abertas={resultado["conexoes"]:5}  '
+                f'p50 {referencia / resultado["p50"]:.1f}x o da conexão nova'
+            )
+
+    def perfis(self, base, threads):
+        opcoes = {chave: valor for chave, valor in base.get('OPTIONS', {}).items() if chave != 'pool'}
+        perfis = {
+            'nova': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': opcoes},
+            'persistente': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': opcoes},
+        }
+        if base['ENGINE'] == 'django.db.backends.postgresql':
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                self.stderr.write('psycopg_pool não instalado: perfil pool fora da medição')
+            else:
+                pool = base.get('OPTIONS', {}).get('pool')
+                if not isinstance(pool, dict):
+                    pool = {'min_size': threads, 'max_size': threads}
+                perfis['pool'] = {'CONN_MAX_AGE': 0, 'OPTIONS': {**opcoes, 'pool': pool}}
+        return perfis
+
+    def contar_conexao(self, sender, connection, **kwargs):
+        with self.trava:
+            self.conexoes[connection.alias] = self.conexoes.get(connection.alias, 0) + 1
+
+    def medir(self, nome, configuracao, options):
+        alias = f'bench_conexoes_{nome}'
+        connections.settings[alias] = configuracao
+        consulta = options['consulta']
+        por_thread = options['requisicoes'] // options['threads']
+
+        def rodar():
+            duracoes = []
+            conexao = connections[alias]
+            try:
+                for _ in range(por_thread):
+                    inicio = time.perf_counter()
+                    # close_old_connections no começo e no fim, conforme CONN_MAX_AGE / pool
+                    request_started.send(sender=self.__class__)
+                    with conexao.cursor() as cursor:
+                        cursor.execute(consulta)
+                        cursor.fetchall()
+                    request_finished.send(sender=self.__class__)
+                    duracoes.append(time.perf_counter() - inicio)
+            finally:
+                conexao.close()
+            return duracoes
+
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                futuros = [executor.submit(rodar) for _ in range(options['threads'])]
+                duracoes = [duracao for futuro in futuros for duracao in futuro.result()]
+            total = time.perf_counter() - inicio
+            conexoes = self.conexoes.get(alias, 0)
+            if 'pool' in configuracao['OPTIONS']:
+                # o connect() do Django pega do pool; o que importa é quantas o pool abriu no servidor
+                conexoes = connections[alias].pool.get_stats().get('connections_num', conexoes)
+                connections[alias].close_pool()
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            connections.settings.pop(alias)
+
+        return {
+            'vazao': len(duracoes) / total,
+            'p50': statistics.median(duracoes),
+            'p99': percentil(duracoes, 99),
+            'conexoes': conexoes,
+        }
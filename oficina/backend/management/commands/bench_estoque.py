@@ -0,0 +1,86 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from backend.models import Peca
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de contenção da baixa de estoque com N workers em paralelo na mesma peça'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--operacoes', type=int, default=200, help='Baixas por worker')
+        parser.add_argument('--estoque', type=int, default=None, help='Estoque inicial (padrão: metade das baixas)')
+        parser.add_argument('--modo', choices=['atomico', 'legado'], default='atomico')
+
+    def handle(self, *args, **options):
+        for workers in options['workers']:
+            total = workers * options['operacoes']
+            estoque_inicial = options['estoque'] if options['estoque'] is not None else total // 2
+            peca = Peca.objects.create(
+                codigo=f'BENCH-{uuid.uuid4().hex[:12]}',
+                nome='Peça de benchmark',
+                descricao='Criada pelo bench_estoque',
+                fabricante='bench',
+                quantidade_estoque=estoque_inicial,
+                preco_unitario=1,
+            )
+            try:
+                resultado = self.rodar(peca.pk, workers, options['operacoes'], options['modo'])
+                peca.refresh_from_db()
+            finally:
+                Peca.objects.filter(pk=peca.pk).delete()
+
+            baixadas = estoque_inicial - peca.quantidade_estoque
+            self.stdout.write(
+                f"modo={options['modo']} workers={workers} ops={total} "
+                f"tempo={resultado['tempo']:.3f}s ops/s={total / resultado['tempo']:.0f} "
+                f"sucessos={resultado['sucessos']} recusas={resultado['recusas']} erros={resultado['erros']} "
+                f"estoque_final={peca.quantidade_estoque} status_final={peca.status} "
+                f"baixas_perdidas={resultado['sucessos'] - baixadas}"
+            )
+
+    def rodar(self, peca_id, workers, operacoes, modo):
+        contadores = {'sucessos': 0, 'recusas': 0, 'erros': 0}
+        trava = threading.Lock()
+        largada = threading.Barrier(workers)
+
+        def worker():
+            locais = {'sucessos': 0, 'recusas': 0, 'erros': 0}
+            try:
+                largada.wait()
+                for _ in range(operacoes):
+                    try:
+                        if modo == 'atomico':
+                            ok = Peca.objects.reduzir_estoque(peca_id, 1)
+                        else:
+                            # ler, alterar em Python e salvar tudo: o caminho antigo
+                            peca = Peca.objects.get(pk=peca_id)
+                            ok = peca.quantidade_estoque >= 1
+                            if ok:
+                                peca.quantidade_estoque -= 1
+                                if peca.quantidade_estoque == 0:
+                                    peca.status = 'esgotado'
+                                peca.save()
+                    except OperationalError:
+                        locais['erros'] += 1
+                        continue
+                    locais['sucessos' if ok else 'recusas'] += 1
+            finally:
+                connection.close()
+                with trava:
+                    for chave, valor in locais.items():
+                        contadores[chave] += valor
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        contadores['tempo'] = time.perf_counter() - inicio
+        return contadores
@@ -0,0 +1,163 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.models import Usuario, Veiculo, Orcamento, OrdemServico
+from backend.periodo import filtrar_periodo, periodo_relativo
+
+# índices de 0007_indices, removidos temporariamente para o "antes"
+INDICES = {
+    Orcamento: ['orcamento_data_idx', 'orcamento_mecanico_data_idx', 'orcamento_status_data_idx',
+                'orcamento_status_validade_idx'],
+    OrdemServico: ['ordem_data_inicio_idx', 'ordem_status_data_idx', 'ordem_data_conclusao_idx'],
+    Veiculo: ['veiculo_ordem_idx', 'veiculo_data_cadastro_idx'],
+}
+
+STATUS_ORCAMENTO = ['pendente', 'aprovado', 'rejeitado', 'expirado']
+STATUS_ORDEM = ['aguardando', 'em_andamento', 'aguardando_pecas', 'concluido', 'cancelado']
+
+
+class Command(BaseCommand):
+    help = 'Semeia orçamentos e compara planos (EXPLAIN) e tempos das consultas dos viewsets com e sem os índices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000, help='Orçamentos semeados')
+        parser.add_argument('--mecanicos', type=int, default=50)
+        parser.add_argument('--veiculos', type=int, default=20_000)
+        parser.add_argument('--repeticoes', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # tudo numa transação desfeita ao final: sementes e remoção dos índices
+        with transaction.atomic():
+            inicio = time.perf_counter()
+            mecanico = self.semear(options['linhas'], options['mecanicos'], options['veiculos'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(
+                f'{options["linhas"]} orçamentos semeados em {time.perf_counter() - inicio:.1f}s '
+                f'(banco {connection.vendor})'
+            )
+
+            consultas = self.consultas(mecanico)
+            depois = {nome: self.medir(montar, options['repeticoes']) for nome, montar in consultas.items()}
+            self.remover_indices()
+            antes = {nome: self.medir(montar, options['repeticoes']) for nome, montar in consultas.items()}
+
+            for nome in consultas:
+                self.stdout.write(f'\n== {nome}: antes p50={antes[nome][0]:.2f}ms | depois p50={depois[nome][0]:.2f}ms')
+                self.stdout.write(f'-- plano antes:\n{antes[nome][1]}')
+                self.stdout.write(f'-- plano depois:\n{depois[nome][1]}')
+            transaction.set_rollback(True)
+
+    def consultas(self, mecanico):
+        # as mesmas formas de acesso dos viewsets, com a ordenação da paginação por cursor
+        hoje = timezone.localdate()
+        semana = periodo_relativo('last_7d', hoje)
+        mes_passado = periodo_relativo('last_month', hoje)
+        return {
+            'orcamentos (gerente)': lambda: Orcamento.objects.order_by('-data_criacao', '-id')[:50],
+            'orcamentos (mecanico)': lambda: (
+                Orcamento.objects.filter(mecanico_responsavel=mecanico).order_by('-data_criacao', '-id')[:50]
+            ),
+            'orcamentos ?status=': lambda: (
+                Orcamento.objects.filter(status='pendente').order_by('-data_criacao', '-id')[:50]
+            ),
+            'orcamentos pendentes vencidos': lambda: (
+                Orcamento.objects.filter(status='pendente', data_validade__lt=hoje).order_by()[:500]
+            ),
+            'orcamentos ?periodo=last_7d': lambda: (
+                filtrar_periodo(Orcamento.objects.all(), 'data_criacao', *semana).order_by('-data_criacao', '-id')
+            ),
+            'orcamentos data_criacao__date (antigo)': lambda: (
+                Orcamento.objects.filter(
+                    data_criacao__date__gte=semana[0], data_criacao__date__lte=semana[1]
+                ).order_by('-data_criacao', '-id')
+            ),
+            'ordens ?periodo=last_month&periodo_campo=data_conclusao': lambda: (
+                filtrar_periodo(OrdemServico.objects.all(), 'data_conclusao', *mes_passado).order_by()
+            ),
+            'ordens ?status=': lambda: (
+                OrdemServico.objects.filter(status='em_andamento').order_by('-data_inicio', '-id')[:50]
+            ),
+            'veiculos': lambda: Veiculo.objects.order_by('marca', 'modelo', 'ano', 'id')[:50],
+        }
+
+    def medir(self, montar, repeticoes):
+        plano = montar().explain()
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            list(montar().values_list('pk', flat=True))
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tempos), plano
+
+    def remover_indices(self):
+        # DROP INDEX direto: o schema editor do SQLite não roda dentro de transaction.atomic()
+        with connection.cursor() as cursor:
+            for nomes in INDICES.values():
+                for nome in nomes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(nome)}')
+            cursor.execute('ANALYZE')
+
+    def semear(self, linhas, mecanicos, veiculos):
+        aleatorio = random.Random(42)
+        agora = timezone.now()
+
+        mecanicos = Usuario.objects.bulk_create([
+            Usuario(username=f'bi_mecanico{i}', tipo='mecanico', cpf=f'bim{i}', telefone='0')
+            for i in range(mecanicos)
+        ])
+        clientes = Usuario.objects.bulk_create([
+            Usuario(username=f'bi_cliente{i}', tipo='cliente', cpf=f'bic{i}', telefone='0')
+            for i in range(veiculos // 2)
+        ])
+        veiculos = Veiculo.objects.bulk_create([
+            Veiculo(
+                placa=f'BI{i:06d}', marca=aleatorio.choice(['Fiat', 'Ford', 'Honda', 'Toyota', 'VW']),
+                modelo=f'Modelo {aleatorio.randint(1, 40)}', ano=aleatorio.randint(1995, 2025), cor='Prata',
+                cliente=aleatorio.choice(clientes),
+            )
+            for i in range(veiculos)
+        ], batch_size=5000)
+
+        # data_criacao é auto_now_add: desligado só durante a semeadura para espalhar as datas
+        campo = Orcamento._meta.get_field('data_criacao')
+        campo.auto_now_add = False
+        try:
+            for lote in range(0, linhas, 10_000):
+                Orcamento.objects.bulk_create([
+                    Orcamento(
+                        veiculo=aleatorio.choice(veiculos), mecanico_responsavel=aleatorio.choice(mecanicos),
+                        data_criacao=agora - timedelta(minutes=aleatorio.randint(0, 2 * 365 * 24 * 60)),
+                        data_validade=(agora + timedelta(days=aleatorio.randint(-700, 30))).date(),
+                        descricao_problema='Orçamento sintético do bench_indices',
+                        valor_mao_obra=100, valor_total=100, status=aleatorio.choice(STATUS_ORCAMENTO),
+                    )
+                    for _ in range(lote, min(lote + 10_000, linhas))
+                ])
+        finally:
+            campo.auto_now_add = True
+
+        # uma ordem de serviço para cada quarto orçamento
+        ids = Orcamento.objects.filter(descricao_problema='Orçamento sintético do bench_indices').values_list('pk', flat=True)
+        ordens = []
+        for i, orcamento_id in enumerate(ids.iterator(chunk_size=10_000)):
+            if i % 4:
+                continue
+            data_inicio = agora - timedelta(minutes=aleatorio.randint(0, 2 * 365 * 24 * 60))
+            status = aleatorio.choice(STATUS_ORDEM)
+            ordens.append(OrdemServico(
+                orcamento_id=orcamento_id, data_inicio=data_inicio,
+                data_previsao=agora.date(), km_entrada=aleatorio.randint(0, 200_000), status=status,
+                data_conclusao=data_inicio + timedelta(days=aleatorio.randint(0, 10)) if status == 'concluido' else None,
+            ))
+            if len(ordens) >= 10_000:
+                OrdemServico.objects.bulk_create(ordens)
+                ordens = []
+        OrdemServico.objects.bulk_create(ordens)
+        return mecanicos[0]
@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import Usuario, Veiculo, Peca
+from backend.rapido import lista_rapida
+from backend.serializers import VeiculoSerializer, PecaSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara linhas/s das listagens de veículos e peças pelo serializer e pelo caminho rápido (values_list)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=20000)
+        parser.add_argument('--repeticoes', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # sementes numa transação desfeita no fim
+        with transaction.atomic():
+            self.semear(options['linhas'])
+            consultas = {
+                'veiculos': (Veiculo.objects.select_related('cliente').order_by('marca', 'modelo', 'id'), VeiculoSerializer),
+                'pecas': (Peca.objects.order_by('nome', 'id'), PecaSerializer),
+            }
+            renderer = JSONRenderer()
+            for nome, (queryset, serializer_class) in consultas.items():
+                lista = lista_rapida(serializer_class)
+
+                def pelo_serializer():
+                    objetos = list(queryset.all())
+                    inicio = time.perf_counter()
+                    dados = serializer_class(objetos, many=True).data
+                    return dados, time.perf_counter() - inicio
+
+                def pelo_caminho_rapido():
+                    linhas = list(lista.preparar(queryset))
+                    inicio = time.perf_counter()
+                    dados = lista.serializar(linhas)
+                    return dados, time.perf_counter() - inicio
+
+                antes = self.medir(pelo_serializer, renderer, options['repeticoes'])
+                depois = self.medir(pelo_caminho_rapido, renderer, options['repeticoes'])
+                linhas = options['linhas']
+                self.stdout.write(
+                    f'{nome}: serializer {linhas / antes[0]:,.0f} linhas/s '
+                    f'(só serialização {linhas / antes[1]:,.0f}) | '
+                    f'rápido {linhas / depois[0]:,.0f} linhas/s (só serialização {linhas / depois[1]:,.0f}) | '
+                    f'{antes[0] / depois[0]:.1f}x | JSON idêntico: {"sim" if antes[2] == depois[2] else "NÃO"}'
+                )
+            transaction.set_rollback(True)
+
+    def medir(self, montar, renderer, repeticoes):
+        """Medianas de (consulta + serialização + JSON, só serialização) em segundos, e o JSON gerado."""
+        totais, serializacoes = [], []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            dados, serializacao = montar()
+            conteudo = renderer.render(dados)
+            totais.append(time.perf_counter() - inicio)
+            serializacoes.append(serializacao)
+        return statistics.median(totais), statistics.median(serializacoes), conteudo
+
+    def semear(self, linhas):
+        clientes = Usuario.objects.bulk_create([
+            Usuario(username=f'bser_cliente{i}', first_name='Cliente', last_name=str(i), tipo='cliente',
+                    cpf=f'bser{i}', telefone='0')
+            for i in range(linhas)
+        ], batch_size=5000)
+        Veiculo.objects.bulk_create([
+            Veiculo(placa=f'BSR{i:05d}', marca='Honda', modelo=f'Modelo {i % 40}', ano=2000 + i % 25, cor='Prata',
+                    cliente=cliente)
+            for i, cliente in enumerate(clientes)
+        ], batch_size=5000)
+        Peca.objects.bulk_create([
+            Peca(codigo=f'BSR{i}', nome=f'Peça {i}', descricao='Peça sintética do bench_serializacao',
+                 fabricante='Bench', quantidade_estoque=i % 20, preco_unitario=f'{i % 500}.{i % 100:02d}')
+            for i in range(linhas)
+        ], batch_size=5000)
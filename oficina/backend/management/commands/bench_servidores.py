@@ -0,0 +1,207 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from backend.models import Usuario, Veiculo, Peca, Orcamento
+
+from .bench_conclusao import percentil
+
+# cada servidor roda num subprocesso apontando (SQLITE_PATH) para o mesmo banco de teste
+SERVIDORES = {
+    'wsgi': lambda opcoes, porta: [
+        'gunicorn', 'oficina.wsgi:application', '--bind', f'127.0.0.1:{porta}',
+        '--workers', str(opcoes['workers']), '--worker-class', 'gthread', '--threads', str(opcoes['threads']),
+        '--log-level', 'warning',
+    ],
+    'asgi': lambda opcoes, porta: [
+        'uvicorn', 'oficina.asgi:application', '--host', '127.0.0.1', '--port', str(porta),
+        '--workers', str(opcoes['workers']), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+async def requisitar(leitor, escritor, requisicao):
+    """Envia um GET e lê a resposta inteira; devolve (status, conexão fechada pelo servidor)."""
+    escritor.write(requisicao)
+    await escritor.drain()
+    linhas = (await leitor.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(linhas[0].split()[1])
+    cabecalhos = {}
+    for linha in linhas[1:]:
+        nome, _, valor = linha.partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip().lower()
+
+    if 'content-length' in cabecalhos:
+        await leitor.readexactly(int(cabecalhos['content-length']))
+    elif cabecalhos.get('transfer-encoding') == 'chunked':
+        while True:
+            tamanho = int((await leitor.readuntil(b'\r\n')).split(b';')[0], 16)
+            await leitor.readexactly(tamanho + 2)
+            if tamanho == 0:
+                break
+    else:
+        await leitor.read()
+        return status, True
+    return status, cabecalhos.get('connection') == 'close'
+
+
+async def carga(porta, caminho, cookie, clientes, duracao):
+    """clientes conexões keep-alive pedindo caminho sem pausa por duracao segundos."""
+    requisicao = (
+        f'GET {caminho} HTTP/1.1\r\nHost: localhost:{porta}\r\nAccept: application/json\r\n'
+        f'Cookie: sessionid={cookie}\r\n\r\n'
+    ).encode('latin-1')
+    latencias = []
+    erros = 0
+    fim = time.perf_counter() + duracao
+
+    async def cliente():
+        nonlocal erros
+        conexao = None
+        while time.perf_counter() < fim:
+            try:
+                if conexao is None:
+                    conexao = await asyncio.open_connection('127.0.0.1', porta)
+                inicio = time.perf_counter()
+                status, fechada = await requisitar(*conexao, requisicao)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if status != 200:
+                    erros += 1
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                erros += 1
+                fechada = True
+            if fechada and conexao is not None:
+                conexao[1].close()
+                conexao = None
+        if conexao is not None:
+            conexao[1].close()
+
+    await asyncio.gather(*(cliente() for _ in range(clientes)))
+    return latencias, erros
+
+
+class Command(BaseCommand):
+    help = (
+        'Sobe o projeto em WSGI (gunicorn gthread) e em ASGI (uvicorn) sobre o mesmo banco de teste e compara '
+        'req/s e p50/p99 das leituras de peças, veículos e orçamentos com N clientes simultâneos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=200)
+        parser.add_argument('--duracao', type=float, default=15, help='Segundos de carga por endpoint')
+        parser.add_argument('--aquecimento', type=float, default=2)
+        parser.add_argument('--workers', type=int, default=2, help='Processos de cada servidor')
+        parser.add_argument('--threads', type=int, default=8, help='Threads por processo no gunicorn')
+        parser.add_argument('--linhas', type=int, default=5000, help='Peças, veículos e orçamentos semeados')
+        parser.add_argument('--servidores', nargs='+', choices=list(SERVIDORES), default=list(SERVIDORES))
+        parser.add_argument('--porta', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_servidores usa um banco de teste SQLite em arquivo')
+        for servidor in options['servidores']:
+            if shutil.which(SERVIDORES[servidor](options, 0)[0]) is None:
+                raise CommandError(f'{SERVIDORES[servidor](options, 0)[0]} não está instalado')
+
+        teste = connection.settings_dict['TEST']
+        nome_teste = teste.get('NAME')
+        arquivo = os.path.join(tempfile.mkdtemp(), 'bench_servidores.sqlite3')
+        teste['NAME'] = arquivo
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cookie, caminhos = self.semear(options['linhas'])
+            connection.close()
+            self.stdout.write(
+                f'{options["clientes"]} clientes, {options["duracao"]:.0f}s por endpoint, '
+                f'{options["workers"]} processos (gunicorn com {options["threads"]} threads cada)'
+            )
+            for servidor in options['servidores']:
+                self.medir_servidor(servidor, arquivo, cookie, caminhos, options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teste['NAME'] = nome_teste
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+
+    def semear(self, linhas):
+        gerente = Usuario.objects.create(username='bs_gerente', tipo='gerente', cpf='bsg', telefone='0')
+        mecanico = Usuario.objects.create(username='bs_mecanico', tipo='mecanico', cpf='bsm', telefone='0')
+        clientes = Usuario.objects.bulk_create([
+            Usuario(username=f'bs_cliente{i}', tipo='cliente', cpf=f'bsc{i}', telefone='0')
+            for i in range(linhas)
+        ], batch_size=5000)
+        Peca.objects.bulk_create([
+            Peca(codigo=f'BS{i}', nome=f'Peça {i}', descricao='bench', fabricante='Bench',
+                 quantidade_estoque=100, preco_unitario=10)
+            for i in range(linhas)
+        ], batch_size=5000)
+        veiculos = Veiculo.objects.bulk_create([
+            Veiculo(placa=f'BS{i:05d}', marca='Honda', modelo='Civic', ano=2020, cor='Prata', cliente=cliente)
+            for i, cliente in enumerate(clientes)
+        ], batch_size=5000)
+        orcamentos = Orcamento.objects.bulk_create([
+            Orcamento(veiculo=veiculo, mecanico_responsavel=mecanico,
+                      data_validade=timezone.localdate() + timedelta(days=10),
+                      descricao_problema='Orçamento do bench_servidores', valor_mao_obra=100, valor_total=100)
+            for veiculo in veiculos
+        ], batch_size=5000)
+
+        # sessão do gerente, como depois de um login
+        sessao = SessionStore()
+        sessao[SESSION_KEY] = str(gerente.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = gerente.get_session_auth_hash()
+        sessao.create()
+
+        meio = orcamentos[len(orcamentos) // 2].pk
+        return sessao.session_key, {
+            'pecas': '/api/pecas/?page_size=50',
+            'veiculos': '/api/veiculos/?page_size=50',
+            'orcamentos': '/api/orcamentos/?page_size=50',
+            'orcamento': f'/api/orcamentos/{meio}/',
+        }
+
+    def medir_servidor(self, servidor, arquivo, cookie, caminhos, options):
+        porta = options['porta']
+        ambiente = dict(os.environ, SQLITE_PATH=arquivo, WEB_CONCURRENCY=str(options['workers']))
+        processo = subprocess.Popen(
+            SERVIDORES[servidor](options, porta), cwd=settings.BASE_DIR, env=ambiente,
+            stdout=subprocess.DEVNULL, stderr=sys.stderr,
+        )
+        try:
+            self.aguardar(porta, processo)
+            for nome, caminho in caminhos.items():
+                asyncio.run(carga(porta, caminho, cookie, min(options['clientes'], 20), options['aquecimento']))
+                latencias, erros = asyncio.run(carga(porta, caminho, cookie, options['clientes'], options['duracao']))
+                self.stdout.write(
+                    f'{servidor} {nome:<11} {len(latencias) / options["duracao"]:8.1f} req/s | '
+                    f'p50={percentil(latencias, 50):7.1f}ms p99={percentil(latencias, 99):7.1f}ms | erros={erros}'
+                )
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+
+    def aguardar(self, porta, processo, limite=30):
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim:
+            if processo.poll() is not None:
+                raise CommandError(f'o servidor terminou com código {processo.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'o servidor não abriu a porta {porta} em {limite}s')
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from backend.alteracoes import compactar
+from backend.models import Alteracao
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta o change log: até o offset escolhido fica só a entrada mais recente de cada objeto. '
+        'Consumidores que já passaram desse offset não percebem; os que estão atrás perdem os passos '
+        'intermediários (e os deltas de estoque), mas chegam ao mesmo estado final.'
+    )
+
+    def add_arguments(self, parser):
+        limite = parser.add_mutually_exclusive_group()
+        limite.add_argument('--ate', type=int, help='Último offset compactado (padrão: o fim do log)')
+        limite.add_argument('--dias', type=int,
+                            help='Compacta só as entradas com mais de N dias')
+        parser.add_argument('--remover-exclusoes', action='store_true',
+                            help='Apaga também as remoções até o offset (quem sincronizar do zero não as verá)')
+        parser.add_argument('--lote', type=int, default=10000, help='Offsets por DELETE')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None:
+            corte = timezone.now() - timedelta(days=options['dias'])
+            ate = Alteracao.objects.filter(criado_em__lt=corte).aggregate(ultimo=Max('pk'))['ultimo']
+        elif options['ate'] is not None:
+            ate = options['ate']
+        else:
+            ate = Alteracao.objects.aggregate(ultimo=Max('pk'))['ultimo']
+        if options['lote'] <= 0:
+            raise CommandError('--lote deve ser positivo')
+        if ate is None:
+            self.stdout.write('Nada a compactar')
+            return
+
+        apagadas = compactar(ate, remover_exclusoes=options['remover_exclusoes'], lote=options['lote'])
+        self.stdout.write(f'{apagadas} entradas apagadas até o offset {ate}')
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request
+
+from backend.exportacao import FORMATOS, exportar
+from backend.models import Usuario
+from backend.views import VeiculoViewSet, PecaViewSet, OrcamentoViewSet, OrdemServicoViewSet, ItemPecaViewSet
+
+VIEWSETS = {
+    'veiculos': VeiculoViewSet,
+    'pecas': PecaViewSet,
+    'orcamentos': OrcamentoViewSet,
+    'ordens-servico': OrdemServicoViewSet,
+    'itens-peca': ItemPecaViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = 'Exporta uma entidade em CSV ou JSON lines com os mesmos filtros e escopo da API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entidade', choices=list(VIEWSETS))
+        parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: stdout)')
+        parser.add_argument('--usuario', required=True,
+                            help='username cujo escopo é aplicado (cliente, mecânico ou gerente)')
+        parser.add_argument('--filtro', action='append', default=[], metavar='PARAM=VALOR',
+                            help='Parâmetro de query da listagem, ex.: --filtro data_inicio=2025-01-01')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'Usuário {options["usuario"]} não encontrado')
+
+        params = QueryDict(mutable=True)
+        for filtro in options['filtro']:
+            if '=' not in filtro:
+                raise CommandError(f'Filtro inválido: {filtro} (use PARAM=VALOR)')
+            chave, valor = filtro.split('=', 1)
+            params.appendlist(chave, valor)
+
+        queryset = self.get_queryset(VIEWSETS[options['entidade']], usuario, params)
+
+        blocos = exportar(queryset, options['formato'], chunk_size=options['chunk_size'])
+        if not options['saida']:
+            for bloco in blocos:
+                self.stdout.write(bloco, ending='')
+            return
+
+        inicio = time.perf_counter()
+        with open(options['saida'], 'w', encoding='utf-8', newline='') as saida:
+            for bloco in blocos:
+                saida.write(bloco)
+        self.stderr.write(f'{options["entidade"]} exportado em {time.perf_counter() - inicio:.2f}s')
+
+    def get_queryset(self, viewset, usuario, params):
+        # monta a mesma view da listagem para reaproveitar get_queryset e filter_backends
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = params
+        request = Request(http_request)
+        request.user = usuario
+
+        view = viewset(request=request, action='exportar', format_kwarg=None, args=(), kwargs={})
+        return view.filter_queryset(view.get_queryset())
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend import conclusao
+
+
+class Command(BaseCommand):
+    help = 'Worker das conclusões de ordem de serviço enfileiradas (concluir?assincrono=true)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos entre consultas à fila quando não há aviso')
+        parser.add_argument('--uma-vez', action='store_true',
+                            help='Processa o que estiver pendente e sai')
+        parser.add_argument('--timeout', type=int, default=300,
+                            help='Tarefas em processamento há mais que isso (s) voltam para a fila')
+
+    def handle(self, *args, **options):
+        if options['uma_vez']:
+            recuperadas = conclusao.recuperar_abandonadas(options['timeout'])
+            if recuperadas:
+                self.stdout.write(f'{recuperadas} tarefas abandonadas de volta à fila')
+            self.stdout.write(f'{conclusao.processar_pendentes()} tarefas processadas')
+            return
+
+        # o pool devolve as abandonadas à fila na partida e quando fica ocioso
+        pool = conclusao.PoolConclusao(
+            options['workers'], intervalo=options['intervalo'], timeout_abandonadas=options['timeout'],
+        ).iniciar()
+        self.stdout.write(f'{options["workers"]} workers aguardando tarefas (Ctrl+C para sair)')
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pool.parar()
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from backend.models import (
+    Orcamento, OrdemServico, ItemPeca,
+    ResumoDiarioMecanico, ResumoStatusOrdem, ConsumoDiarioPeca,
+)
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as tabelas de resumo do painel a partir dos dados atuais.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        ResumoStatusOrdem.objects.all().delete()
+        ResumoStatusOrdem.objects.bulk_create([
+            ResumoStatusOrdem(status=linha['status'], quantidade=linha['quantidade'])
+            for linha in OrdemServico.objects.order_by().values('status').annotate(quantidade=Count('id'))
+        ])
+
+        resumos = defaultdict(lambda: {
+            'orcamentos_aprovados': 0, 'valor_aprovado': Decimal('0'),
+            'ordens_concluidas': 0, 'valor_concluido': Decimal('0'),
+        })
+        aprovados = (
+            Orcamento.objects.filter(status='aprovado', data_aprovacao__isnull=False).order_by()
+            .values(dia=TruncDate('data_aprovacao'), mecanico=F('mecanico_responsavel_id'))
+            .annotate(quantidade=Count('id'), valor=Sum('valor_total'))
+        )
+        for linha in aprovados:
+            resumo = resumos[(linha['dia'], linha['mecanico'])]
+            resumo['orcamentos_aprovados'] = linha['quantidade']
+            resumo['valor_aprovado'] = linha['valor']
+
+        concluidas = (
+            OrdemServico.objects.filter(status='concluido', data_conclusao__isnull=False).order_by()
+            .values(dia=TruncDate('data_conclusao'), mecanico=F('orcamento__mecanico_responsavel_id'))
+            .annotate(quantidade=Count('id'), valor=Sum('orcamento__valor_total'))
+        )
+        for linha in concluidas:
+            resumo = resumos[(linha['dia'], linha['mecanico'])]
+            resumo['ordens_concluidas'] = linha['quantidade']
+            resumo['valor_concluido'] = linha['valor']
+
+        ResumoDiarioMecanico.objects.all().delete()
+        ResumoDiarioMecanico.objects.bulk_create([
+            ResumoDiarioMecanico(data=dia, mecanico_id=mecanico, **valores)
+            for (dia, mecanico), valores in resumos.items()
+        ], batch_size=1000)
+
+        ConsumoDiarioPeca.objects.all().delete()
+        ConsumoDiarioPeca.objects.bulk_create([
+            ConsumoDiarioPeca(data=linha['dia'], peca_id=linha['peca_id'], quantidade=linha['quantidade'])
+            for linha in ItemPeca.objects.filter(estoque_reduzido=True, ordem_servico__data_conclusao__isnull=False)
+            .order_by()
+            .values('peca_id', dia=TruncDate('ordem_servico__data_conclusao'))
+            .annotate(quantidade=Sum('quantidade'))
+        ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{ResumoDiarioMecanico.objects.count()} resumos diários, '
+            f'{ResumoStatusOrdem.objects.count()} status, '
+            f'{ConsumoDiarioPeca.objects.count()} consumos diários recalculados'
+        ))
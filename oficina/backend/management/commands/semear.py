@@ -0,0 +1,302 @@
+import random
+import time
+import unicodedata
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend import busca
+from backend.models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca
+
+NOMES = [
+    'Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+    'Juliana', 'Lucas', 'Mariana', 'Mateus', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago',
+    'Vitória', 'Yuri', 'Beatriz', 'Carlos', 'Fernanda', 'Gustavo', 'Larissa', 'Marcelo', 'Patrícia', 'Rodrigo',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+]
+DDDS = ['11', '21', '31', '41', '47', '51', '61', '71', '81', '85']
+
+MODELOS = {
+    'Volkswagen': ['Gol', 'Polo', 'Virtus', 'T-Cross', 'Saveiro'],
+    'Fiat': ['Uno', 'Mobi', 'Argo', 'Strada', 'Toro'],
+    'Chevrolet': ['Onix', 'Prisma', 'Tracker', 'S10', 'Spin'],
+    'Toyota': ['Corolla', 'Etios', 'Yaris', 'Hilux'],
+    'Honda': ['Civic', 'Fit', 'City', 'HR-V'],
+    'Hyundai': ['HB20', 'Creta'],
+    'Renault': ['Kwid', 'Sandero', 'Logan', 'Duster'],
+    'Ford': ['Ka', 'Fiesta', 'EcoSport', 'Ranger'],
+}
+MARCAS = list(MODELOS)
+CORES = ['Prata', 'Branco', 'Preto', 'Cinza', 'Vermelho', 'Azul']
+
+# tipo de peça -> faixa de preço
+TIPOS_PECA = {
+    'Filtro de óleo': (25, 80), 'Filtro de ar': (30, 120), 'Filtro de combustível': (30, 110),
+    'Pastilha de freio': (90, 350), 'Disco de freio': (150, 600), 'Vela de ignição': (20, 90),
+    'Correia dentada': (80, 300), 'Amortecedor': (200, 900), 'Bateria 60Ah': (350, 800),
+    'Palheta do limpador': (25, 90), 'Bomba d\'água': (150, 500), 'Kit de embreagem': (450, 1800),
+    'Rolamento de roda': (80, 350), 'Óleo 5W30 1L': (35, 70), 'Lâmpada do farol': (15, 120),
+}
+FABRICANTES = ['Bosch', 'Mann', 'Fras-le', 'NGK', 'Cofap', 'Moura', 'Gates', 'SKF', 'Valeo', 'Mahle']
+
+PROBLEMAS = [
+    'Barulho ao frear', 'Revisão dos 40 mil km', 'Troca de óleo e filtros', 'Motor falhando na partida',
+    'Luz da injeção acesa', 'Vibração no volante acima de 80 km/h', 'Embreagem patinando',
+    'Suspensão batendo em lombadas', 'Bateria descarregando', 'Superaquecimento do motor',
+]
+
+# contagens na escala 1
+PADROES = {'usuarios': 100000, 'veiculos': 300000, 'pecas': 20000, 'orcamentos': 1000000, 'ordens': 500000}
+
+
+def sem_acento(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+
+
+def cpf(numero):
+    digitos = [int(c) for c in f'{numero:09d}']
+    for tamanho in (9, 10):
+        soma = sum((tamanho + 1 - i) * d for i, d in enumerate(digitos[:tamanho]))
+        digitos.append(soma * 10 % 11 % 10)
+    texto = ''.join(map(str, digitos))
+    return f'{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}'
+
+
+def placa(numero):
+    # padrão Mercosul, ABC1D23, único por número
+    letras = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    numero, finais = divmod(numero, 100)
+    numero, quinta = divmod(numero, 26)
+    numero, quarta = divmod(numero, 10)
+    prefixo = ''
+    for _ in range(3):
+        numero, indice = divmod(numero, 26)
+        prefixo = letras[indice] + prefixo
+    return f'{prefixo}{quarta}{letras[quinta]}{finais:02d}'
+
+
+@contextmanager
+def datas_livres(models):
+    # auto_now/auto_now_add sobrescreveriam as datas espalhadas no passado
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for model in models for campo in model._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos num banco vazio (use SQLITE_PATH para apontar outro arquivo): usuários, veículos, '
+        'peças, orçamentos e ordens de serviço com itens, com datas espalhadas pelos últimos --dias dias. '
+        'Na escala 1: 100 mil usuários, 300 mil veículos, 20 mil peças, 1 milhão de orçamentos e 500 mil ordens. '
+        'As linhas entram por bulk_create, então o change log (backend/alteracoes.py) começa vazio.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0, help='Multiplica todas as contagens padrão')
+        for nome, padrao in PADROES.items():
+            parser.add_argument(f'--{nome}', type=int, help=f'Padrão: {padrao:,} x escala')
+        parser.add_argument('--itens-por-ordem', type=int, default=3, help='Média de itens de peça por ordem')
+        parser.add_argument('--dias', type=int, default=730)
+        parser.add_argument('--semente', type=int, default=42, help='Mesma semente, mesmos dados')
+        parser.add_argument('--senha', default='senha123', help='Senha de todos os usuários gerados')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas por bulk_create e por transação')
+        parser.add_argument('--sem-derivados', action='store_true',
+                            help='Não reconstrói o índice de busca nem as tabelas de resumo')
+
+    def handle(self, *args, **options):
+        contagens = {
+            nome: options[nome] if options[nome] is not None else max(1, round(padrao * options['escala']))
+            for nome, padrao in PADROES.items()
+        }
+        if Usuario.objects.exists():
+            raise CommandError('O banco já tem usuários; use um banco vazio (ex.: SQLITE_PATH=/tmp/semente.sqlite3)')
+        if contagens['usuarios'] < 3:
+            raise CommandError('São necessários ao menos 3 usuários (gerente, mecânico e cliente)')
+        if contagens['ordens'] > contagens['orcamentos']:
+            raise CommandError('Cada ordem de serviço precisa de um orçamento: --ordens <= --orcamentos')
+        if options['itens_por_ordem'] * 2 - 1 > contagens['pecas']:
+            raise CommandError('Peças insuficientes para o número de itens por ordem')
+
+        self.aleatorio = random.Random(options['semente'])
+        self.lote = options['lote']
+        self.agora = timezone.now()
+        self.inicio = self.agora - timedelta(days=options['dias'])
+        self.stdout.write(', '.join(f'{nome}={valor:,}' for nome, valor in contagens.items()) + f' ({connection.vendor})')
+
+        with datas_livres([Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca]):
+            clientes, mecanicos = self.medir('usuarios', self.semear_usuarios, contagens['usuarios'], options['senha'])
+            veiculos = self.medir('veiculos', self.semear_veiculos, contagens['veiculos'], clientes)
+            pecas = self.medir('pecas', self.semear_pecas, contagens['pecas'])
+            self.medir('orcamentos e ordens', self.semear_orcamentos, contagens['orcamentos'], contagens['ordens'],
+                       veiculos, mecanicos, pecas, options['itens_por_ordem'])
+
+        if not options['sem_derivados']:
+            if busca.get_backend(connection) is not None:
+                for model in (Peca, Veiculo, Orcamento):
+                    self.medir(f'índice de busca ({model._meta.model_name})', busca.reindexar, model)
+            self.medir('tabelas de resumo', lambda: call_command('recalcular_relatorios', stdout=self.stdout))
+
+    def medir(self, nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        self.stdout.write(f'{nome}: {time.perf_counter() - inicio:.1f}s')
+        return resultado
+
+    def data(self, depois=None, antes=None):
+        depois = depois or self.inicio
+        antes = antes or self.agora
+        return depois + (antes - depois) * self.aleatorio.random()
+
+    def gravar(self, model, objetos):
+        with transaction.atomic():
+            return model.objects.bulk_create(objetos, batch_size=self.lote)
+
+    def em_lotes(self, total, montar, model):
+        """Monta e grava total objetos em blocos de self.lote; devolve as pks."""
+        pks = []
+        for inicio in range(0, total, self.lote):
+            objetos = [montar(i) for i in range(inicio, min(inicio + self.lote, total))]
+            pks.extend(obj.pk for obj in self.gravar(model, objetos))
+        return pks
+
+    def semear_usuarios(self, total, senha):
+        hash_senha = make_password(senha)
+        gerentes = max(1, total // 2000)
+        mecanicos = max(1, total // 100)
+
+        def montar(i):
+            tipo = 'gerente' if i < gerentes else 'mecanico' if i < gerentes + mecanicos else 'cliente'
+            nome, sobrenome = self.aleatorio.choice(NOMES), self.aleatorio.choice(SOBRENOMES)
+            username = f'{sem_acento(nome)}.{sem_acento(sobrenome)}{i}'
+            cadastro = self.data()
+            return Usuario(
+                username=username, password=hash_senha, first_name=nome, last_name=sobrenome,
+                email=f'{username}@exemplo.com.br', tipo=tipo, cpf=cpf(100000000 + i),
+                telefone=f'({self.aleatorio.choice(DDDS)}) 9{self.aleatorio.randint(1000, 9999)}-{i % 10000:04d}',
+                date_joined=cadastro, atualizado_em=cadastro,
+            )
+
+        pks = self.em_lotes(total, montar, Usuario)
+        return pks[gerentes + mecanicos:], pks[gerentes:gerentes + mecanicos]
+
+    def semear_veiculos(self, total, clientes):
+        def montar(i):
+            marca = self.aleatorio.choice(MARCAS)
+            cadastro = self.data()
+            return Veiculo(
+                placa=placa(i), marca=marca, modelo=self.aleatorio.choice(MODELOS[marca]),
+                ano=self.aleatorio.randint(2005, self.agora.year), cor=self.aleatorio.choice(CORES),
+                cliente_id=self.aleatorio.choice(clientes), data_cadastro=cadastro, atualizado_em=cadastro,
+            )
+
+        return self.em_lotes(total, montar, Veiculo)
+
+    def semear_pecas(self, total):
+        precos = {}
+
+        def montar(i):
+            tipo, (minimo, maximo) = self.aleatorio.choice(list(TIPOS_PECA.items()))
+            fabricante = self.aleatorio.choice(FABRICANTES)
+            marca = self.aleatorio.choice(MARCAS)
+            quantidade = 0 if self.aleatorio.random() < 0.05 else self.aleatorio.randint(1, 150)
+            estoque_minimo = self.aleatorio.randint(2, 10)
+            status = 'esgotado' if quantidade == 0 else 'descontinuado' if self.aleatorio.random() < 0.02 else 'disponivel'
+            cadastro = self.data()
+            return Peca(
+                codigo=f'{fabricante[:3].upper()}-{i:06d}', nome=f'{tipo} {marca} {self.aleatorio.choice(MODELOS[marca])}',
+                descricao=f'{tipo} {fabricante} para linha {marca}', fabricante=fabricante,
+                quantidade_estoque=quantidade, estoque_minimo=estoque_minimo, status=status,
+                abaixo_minimo=quantidade <= estoque_minimo,
+                preco_unitario=Decimal(self.aleatorio.randint(minimo * 100, maximo * 100)) / 100,
+                data_cadastro=cadastro, atualizado_em=cadastro,
+            )
+
+        for inicio in range(0, total, self.lote):
+            objetos = [montar(i) for i in range(inicio, min(inicio + self.lote, total))]
+            precos.update((peca.pk, peca.preco_unitario) for peca in self.gravar(Peca, objetos))
+        return precos
+
+    def semear_orcamentos(self, total, ordens, veiculos, mecanicos, precos, itens_por_ordem):
+        pecas = list(precos)
+        restantes = ordens
+        recente = self.agora - timedelta(days=10)
+        for inicio in range(0, total, self.lote):
+            orcamentos, planos = [], []
+            for i in range(inicio, min(inicio + self.lote, total)):
+                # amostragem sequencial: exatamente `ordens` orçamentos ganham ordem de serviço
+                com_ordem = self.aleatorio.random() * (total - i) < restantes
+                restantes -= com_ordem
+                itens = []
+                if com_ordem:
+                    status = 'aprovado'
+                    criacao = self.data()
+                    quantidade_itens = self.aleatorio.randint(1, itens_por_ordem * 2 - 1)
+                    itens = [
+                        (peca_id, self.aleatorio.randint(1, 4), precos[peca_id])
+                        for peca_id in self.aleatorio.sample(pecas, quantidade_itens)
+                    ]
+                else:
+                    status = self.aleatorio.choices(
+                        ['pendente', 'aprovado', 'rejeitado', 'expirado'], weights=[20, 10, 35, 35]
+                    )[0]
+                    # pendente ainda está na validade; expirado não
+                    criacao = self.data(depois=recente) if status == 'pendente' else self.data(antes=recente)
+                mao_obra = Decimal(self.aleatorio.randint(80, 1500))
+                valor_pecas = sum((quantidade * preco for _, quantidade, preco in itens), Decimal('0'))
+                orcamentos.append(Orcamento(
+                    veiculo_id=self.aleatorio.choice(veiculos), mecanico_responsavel_id=self.aleatorio.choice(mecanicos),
+                    data_criacao=criacao, data_validade=(criacao + timedelta(days=15)).date(),
+                    descricao_problema=self.aleatorio.choice(PROBLEMAS), valor_mao_obra=mao_obra,
+                    valor_pecas=valor_pecas, valor_total=mao_obra + valor_pecas, status=status,
+                    data_aprovacao=criacao if status == 'aprovado' else None, atualizado_em=criacao,
+                ))
+                planos.append(itens if com_ordem else None)
+
+            with transaction.atomic():
+                orcamentos = Orcamento.objects.bulk_create(orcamentos, batch_size=self.lote)
+                pares = [(orcamento, itens) for orcamento, itens in zip(orcamentos, planos) if itens is not None]
+                ordens_criadas = OrdemServico.objects.bulk_create(
+                    [self.montar_ordem(orcamento) for orcamento, _ in pares], batch_size=self.lote
+                )
+                ItemPeca.objects.bulk_create([
+                    ItemPeca(
+                        ordem_servico_id=ordem.pk, peca_id=peca_id, quantidade=quantidade,
+                        preco_unitario_cobrado=preco, estoque_reduzido=ordem.status == 'concluido',
+                        atualizado_em=ordem.atualizado_em,
+                    )
+                    for ordem, (_, itens) in zip(ordens_criadas, pares)
+                    for peca_id, quantidade, preco in itens
+                ], batch_size=self.lote)
+
+    def montar_ordem(self, orcamento):
+        inicio = min(orcamento.data_criacao + timedelta(hours=self.aleatorio.randint(1, 72)), self.agora)
+        conclusao = None
+        if inicio > self.agora - timedelta(days=10):
+            status = self.aleatorio.choices(['em_andamento', 'aguardando', 'aguardando_pecas'], weights=[60, 20, 20])[0]
+        else:
+            status = self.aleatorio.choices(['concluido', 'cancelado'], weights=[90, 10])[0]
+            if status == 'concluido':
+                conclusao = min(inicio + timedelta(hours=self.aleatorio.randint(4, 240)), self.agora)
+        return OrdemServico(
+            orcamento_id=orcamento.pk, data_inicio=inicio, data_previsao=(inicio + timedelta(days=7)).date(),
+            data_conclusao=conclusao, status=status, km_entrada=self.aleatorio.randint(1000, 250000),
+            atualizado_em=conclusao or inicio,
+        )
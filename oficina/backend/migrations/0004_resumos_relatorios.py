@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0003_delete_cliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoStatusOrdem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('aguardando', 'Aguardando'), ('em_andamento', 'Em Andamento'), ('aguardando_pecas', 'Aguardando Peças'), ('concluido', 'Concluído'), ('cancelado', 'Cancelado')], max_length=20, unique=True)),
+                ('quantidade', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumo de Ordens por Status',
+                'verbose_name_plural': 'Resumos de Ordens por Status',
+                'ordering': ['status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsumoDiarioPeca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('peca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumo_diario', to='backend.peca')),
+            ],
+            options={
+                'verbose_name': 'Consumo Diário de Peça',
+                'verbose_name_plural': 'Consumos Diários de Peças',
+                'ordering': ['data'],
+                'unique_together': {('data', 'peca')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoDiarioMecanico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('orcamentos_aprovados', models.IntegerField(default=0)),
+                ('valor_aprovado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ordens_concluidas', models.IntegerField(default=0)),
+                ('valor_concluido', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mecanico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário por Mecânico',
+                'verbose_name_plural': 'Resumos Diários por Mecânico',
+                'ordering': ['data'],
+                'unique_together': {('data', 'mecanico')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+def preencher_abaixo_minimo(apps, schema_editor):
+    Peca = apps.get_model('backend', 'Peca')
+    Peca.objects.filter(quantidade_estoque__lte=models.F('estoque_minimo')).update(abaixo_minimo=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0004_resumos_relatorios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='peca',
+            name='abaixo_minimo',
+            field=models.BooleanField(default=False, editable=False, help_text='quantidade_estoque <= estoque_minimo, mantido a cada movimentação (fila de reposição)'),
+        ),
+        migrations.RunPython(preencher_abaixo_minimo, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='peca',
+            index=models.Index(condition=models.Q(('abaixo_minimo', True)), fields=['nome', 'id'], name='peca_reposicao_idx'),
+        ),
+    ]
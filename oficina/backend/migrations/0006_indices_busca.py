@@ -0,0 +1,123 @@
+# Generated by Django 5.2 on 2026-10-18 04:14
+
+import unicodedata
+
+import backend.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Cópia do que backend/busca.py fazia quando esta migration foi escrita: a
+# migration não pode mudar junto com o código do app.
+
+TABELAS = {
+    'Peca': 'backend_busca_peca',
+    'Veiculo': 'backend_busca_veiculo',
+    'Orcamento': 'backend_busca_orcamento',
+}
+
+DOCUMENTOS = {
+    'Peca': (lambda p: [p.codigo, p.nome, p.fabricante], ()),
+    'Veiculo': (
+        lambda v: [v.placa, v.marca, v.modelo, v.cliente.username, v.cliente.first_name, v.cliente.last_name],
+        ('cliente',),
+    ),
+    'Orcamento': (
+        lambda o: [o.veiculo.placa, o.mecanico_responsavel.username, o.descricao_problema],
+        ('veiculo', 'mecanico_responsavel'),
+    ),
+}
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def criar_indices_busca(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+
+    with connection.cursor() as cursor:
+        for nome, tabela in TABELAS.items():
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela} "
+                    f"USING fts5(documento, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+                inserir = f'INSERT INTO {tabela} (rowid, documento) VALUES (%s, %s)'
+            else:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {tabela} (rowid bigint PRIMARY KEY, documento tsvector NOT NULL)'
+                )
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {tabela}_gin ON {tabela} USING gin (documento)')
+                inserir = f"INSERT INTO {tabela} (rowid, documento) VALUES (%s, to_tsvector('portuguese', %s))"
+            cursor.execute(f'DELETE FROM {tabela}')
+
+            documento, relacionados = DOCUMENTOS[nome]
+            objetos = (
+                apps.get_model('backend', nome).objects.using(connection.alias)
+                .select_related(*relacionados).order_by('pk').iterator(chunk_size=2000)
+            )
+            lote = []
+            for obj in objetos:
+                lote.append((obj.pk, normalizar(' '.join(str(parte) for parte in documento(obj) if parte))))
+                if len(lote) >= 2000:
+                    cursor.executemany(inserir, lote)
+                    lote = []
+            if lote:
+                cursor.executemany(inserir, lote)
+
+
+def remover_indices_busca(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    with connection.cursor() as cursor:
+        for tabela in TABELAS.values():
+            cursor.execute(f'DROP TABLE IF EXISTS {tabela}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0005_peca_abaixo_minimo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuscaOrcamento',
+            fields=[
+                ('orcamento', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busca', serialize=False, to='backend.orcamento')),
+                ('documento', backend.fields.DocumentoBusca()),
+            ],
+            options={
+                'db_table': 'backend_busca_orcamento',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BuscaPeca',
+            fields=[
+                ('peca', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busca', serialize=False, to='backend.peca')),
+                ('documento', backend.fields.DocumentoBusca()),
+            ],
+            options={
+                'db_table': 'backend_busca_peca',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BuscaVeiculo',
+            fields=[
+                ('veiculo', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busca', serialize=False, to='backend.veiculo')),
+                ('documento', backend.fields.DocumentoBusca()),
+            ],
+            options={
+                'db_table': 'backend_busca_veiculo',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('backend', '0007_indices_consultas'),
+        ('backend', '0008_indices_periodo'),
+    ]
+
+    dependencies = [
+        ('backend', '0006_indices_busca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['-data_criacao', '-id'], name='orcamento_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['mecanico_responsavel', '-data_criacao', '-id'], name='orcamento_mecanico_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['status', '-data_criacao', '-id'], name='orcamento_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['status', 'data_validade'], name='orcamento_status_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['-data_inicio', '-id'], name='ordem_data_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['status', '-data_inicio', '-id'], name='ordem_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['data_conclusao'], name='ordem_data_conclusao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='peca',
+            index=models.Index(fields=['nome', 'id'], name='peca_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['marca', 'modelo', 'ano', 'id'], name='veiculo_ordem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['data_cadastro'], name='veiculo_data_cadastro_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 04:32
+
+import django.core.serializers.json
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0007_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaConclusao',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=15)),
+                ('tentativas', models.IntegerField(default=0)),
+                ('codigo_http', models.IntegerField(blank=True, null=True)),
+                ('resultado', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizada_em', models.DateTimeField(blank=True, null=True)),
+                ('ordem_servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_conclusao', to='backend.ordemservico')),
+                ('solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_conclusao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Conclusão',
+                'verbose_name_plural': 'Tarefas de Conclusão',
+                'ordering': ['criada_em'],
+                'indexes': [models.Index(fields=['status', 'criada_em'], name='tarefa_fila_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pendente', 'processando'])), fields=('ordem_servico',), name='tarefa_ativa_por_ordem')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 05:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('orcamento', 'Orçamento'), ('ordem_servico', 'Ordem de Serviço')], max_length=15)),
+                ('objeto_id', models.BigIntegerField()),
+                ('status_anterior', models.CharField(blank=True, max_length=20, null=True)),
+                ('status_novo', models.CharField(max_length=20)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('mecanico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('orcamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='backend.orcamento')),
+            ],
+            options={
+                'verbose_name': 'Evento de Status',
+                'verbose_name_plural': 'Eventos de Status',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['cliente', 'id'], name='evento_cliente_idx'), models.Index(fields=['mecanico', 'id'], name='evento_mecanico_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 05:10
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_eventos_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alteracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabela', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('operacao', models.CharField(choices=[('criacao', 'Criação'), ('atualizacao', 'Atualização'), ('remocao', 'Remoção'), ('estoque', 'Movimentação de estoque')], max_length=15)),
+                ('dados', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('detalhe', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Alteração',
+                'verbose_name_plural': 'Alterações',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['tabela', 'objeto_id', 'id'], name='alteracao_objeto_idx')],
+            },
+        ),
+    ]
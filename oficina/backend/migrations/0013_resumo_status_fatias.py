@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_alteracoes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='resumostatusordem',
+            options={'ordering': ['status', 'fatia'], 'verbose_name': 'Resumo de Ordens por Status', 'verbose_name_plural': 'Resumos de Ordens por Status'},
+        ),
+        migrations.AddField(
+            model_name='resumostatusordem',
+            name='fatia',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='resumostatusordem',
+            name='status',
+            field=models.CharField(choices=[('aguardando', 'Aguardando'), ('em_andamento', 'Em Andamento'), ('aguardando_pecas', 'Aguardando Peças'), ('concluido', 'Concluído'), ('cancelado', 'Cancelado')], max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumostatusordem',
+            unique_together={('status', 'fatia')},
+        ),
+    ]
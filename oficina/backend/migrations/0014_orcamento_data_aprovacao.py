@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+def preencher_data_aprovacao(apps, schema_editor):
+    # aprovações anteriores não têm data; os resumos já as contavam pela criação
+    Orcamento = apps.get_model('backend', 'Orcamento')
+    Orcamento.objects.filter(status='aprovado').update(data_aprovacao=models.F('data_criacao'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_resumo_status_fatias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orcamento',
+            name='data_aprovacao',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(preencher_data_aprovacao, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,42 @@
-from django.db import models
+import uuid
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save, pre_save
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_init, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .fields import DocumentoBusca
+from .signals import estoque_alterado, estoque_insuficiente, status_alterado
 
 # Create your models here.
 
+class EstoqueInsuficiente(ValidationError):
+    # carrega todas as peças que faltaram, não só a primeira
+    def __init__(self, pecas):
+        self.pecas = pecas
+        super().__init__(f"Estoque insuficiente para as peças: {', '.join(p['peca'] for p in pecas)}")
+
+class ComAlteracoes(models.Model):
+    # models do change log (backend/alteracoes.py): save e delete numa
+    # transação, para que a entrada gravada pelos receivers de post_save e
+    # post_delete entre junto com a linha ou nenhuma das duas
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
 class Usuario(AbstractUser):
     TIPO_CHOICES = [
         ('cliente', 'Cliente'),
@@ -30,6 +62,9 @@ class Usuario(AbstractUser):
         null=True,
         blank=True
     )
+    # token de mudança das leituras condicionais (ETag/Last-Modified, backend/condicional.py);
+    # escritas que não passam pelo save() também atualizam
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.username} - {self.get_tipo_display()}"
@@ -73,6 +108,7 @@ class Veiculo(models.Model):
     data_cadastro = models.DateTimeField(
         auto_now_add=True
     )
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.marca} {self.modelo} - {self.placa}"
@@ -83,8 +119,142 @@ class Veiculo(models.Model):
         verbose_name = 'Veículo'
         verbose_name_plural = 'Veículos'
         ordering = ['marca', 'modelo', 'ano']
+        indexes = [
+            # ordenação padrão da listagem, com o desempate por id da paginação
+            models.Index(fields=['marca', 'modelo', 'ano', 'id'], name='veiculo_ordem_idx'),
+            models.Index(fields=['data_cadastro'], name='veiculo_data_cadastro_idx'),
+        ]
+
+def _abaixo_minimo_apos(delta, **filtro):
+    # quantidade_estoque + delta <= estoque_minimo, com a coluna ainda no valor antigo
+    return When(**filtro, quantidade_estoque__lte=F('estoque_minimo') - delta, then=Value(True))
+
+class PecaManager(models.Manager):
+    # Movimentação de estoque com UPDATE condicional: o banco trava só a linha
+    # da peça, e quantidade, status e a flag da fila de reposição mudam no
+    # mesmo statement. O UPDATE e os receivers de estoque_alterado (resumos,
+    # change log) rodam na mesma transação.
+
+    @transaction.atomic(savepoint=False)
+    def reduzir_estoque(self, peca_id, quantidade, motivo='uso'):
+        atualizadas = self.filter(pk=peca_id, quantidade_estoque__gte=quantidade).update(
+            quantidade_estoque=F('quantidade_estoque') - quantidade,
+            atualizado_em=timezone.now(),
+            # no SET as colunas ainda têm o valor antigo
+            status=Case(
+                When(quantidade_estoque=quantidade, then=Value('esgotado')),
+                When(status='esgotado', then=Value('disponivel')),
+                default=F('status'),
+            ),
+            abaixo_minimo=Case(_abaixo_minimo_apos(-quantidade), default=Value(False)),
+        )
+        if atualizadas:
+            estoque_alterado.send(sender=Peca, deltas={peca_id: -quantidade}, motivo=motivo)
+        else:
+            estoque_insuficiente.send(sender=Peca, demanda={peca_id: quantidade})
+        return atualizadas == 1
+
+    @transaction.atomic(savepoint=False)
+    def adicionar_estoque(self, peca_id, quantidade, motivo='reposicao'):
+        atualizadas = self.filter(pk=peca_id).update(
+            quantidade_estoque=F('quantidade_estoque') + quantidade,
+            atualizado_em=timezone.now(),
+            status=Case(
+                When(status='esgotado', quantidade_estoque__gt=-quantidade, then=Value('disponivel')),
+                default=F('status'),
+            ),
+            abaixo_minimo=Case(_abaixo_minimo_apos(quantidade), default=Value(False)),
+        )
+        if atualizadas:
+            estoque_alterado.send(sender=Peca, deltas={peca_id: quantidade}, motivo=motivo)
+        return atualizadas == 1
 
-class Peca(models.Model):
+    def recalcular_estoque(self, ids):
+        # para escritas em lote (bulk_create/bulk_update), que não passam pelo
+        # save(): status e flag de reposição pelas mesmas regras das movimentações
+        return self.filter(pk__in=ids).update(
+            atualizado_em=timezone.now(),
+            status=Case(
+                When(quantidade_estoque=0, then=Value('esgotado')),
+                When(status='esgotado', then=Value('disponivel')),
+                default=F('status'),
+            ),
+            abaixo_minimo=Case(
+                When(quantidade_estoque__lte=F('estoque_minimo'), then=Value(True)),
+                default=Value(False),
+            )
+        )
+
+    @transaction.atomic(savepoint=False)
+    def reservar_estoque(self, demanda):
+        """Baixa várias peças de uma vez; demanda é {peca_id: quantidade}."""
+        if not demanda:
+            return
+
+        # leitura travada em ordem de pk para duas reservas não se travarem mutuamente
+        pecas = list(
+            self.select_for_update()
+            .filter(pk__in=demanda)
+            .order_by('pk')
+            .only('pk', 'codigo', 'nome', 'quantidade_estoque', 'status')
+        )
+        faltas = self._faltas(pecas, demanda)
+        if faltas:
+            estoque_insuficiente.send(sender=Peca, demanda=demanda)
+            raise EstoqueInsuficiente(faltas)
+
+        condicao = Q(pk__in=[])
+        for peca_id, quantidade in demanda.items():
+            condicao |= Q(pk=peca_id, quantidade_estoque__gte=quantidade)
+
+        atualizadas = self.filter(condicao).update(
+            atualizado_em=timezone.now(),
+            quantidade_estoque=F('quantidade_estoque') - Case(
+                *[When(pk=peca_id, then=Value(quantidade)) for peca_id, quantidade in demanda.items()],
+                default=Value(0),
+            ),
+            status=Case(
+                *[When(pk=peca_id, quantidade_estoque=quantidade, then=Value('esgotado'))
+                  for peca_id, quantidade in demanda.items()],
+                When(status='esgotado', then=Value('disponivel')),
+                default=F('status'),
+            ),
+            abaixo_minimo=Case(
+                *[_abaixo_minimo_apos(-quantidade, pk=peca_id) for peca_id, quantidade in demanda.items()],
+                default=Value(False),
+            ),
+        )
+        if atualizadas != len(demanda):
+            # sem trava de linha (SQLite) outra baixa pode ter passado na frente
+            pecas = list(self.filter(pk__in=demanda).order_by('pk'))
+            faltas = self._faltas(pecas, demanda)
+            if not faltas:
+                # o estoque já voltou (ou a peça sumiu): nada a listar, só repetir
+                raise ValidationError('O estoque mudou durante a baixa por outra operação. Tente novamente')
+            estoque_insuficiente.send(sender=Peca, demanda=demanda)
+            raise EstoqueInsuficiente(faltas)
+
+        estoque_alterado.send(
+            sender=Peca,
+            deltas={peca_id: -quantidade for peca_id, quantidade in demanda.items()},
+            motivo='uso'
+        )
+
+    def _faltas(self, pecas, demanda):
+        faltas = []
+        for peca in pecas:
+            disponivel, mensagem = peca.verificar_disponibilidade(demanda[peca.pk])
+            if not disponivel:
+                faltas.append({
+                    'peca': peca.codigo,
+                    'nome': peca.nome,
+                    'quantidade_necessaria': demanda[peca.pk],
+                    'quantidade_disponivel': peca.quantidade_estoque,
+                    'erro': mensagem
+                })
+        return faltas
+
+class Peca(ComAlteracoes):
     STATUS_CHOICES = [
 
         ('disponivel', 'Disponível'),
@@ -101,9 +271,28 @@ class Peca(models.Model):
     estoque_minimo = models.IntegerField(default=5)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='disponivel')
     data_cadastro = models.DateTimeField(auto_now_add=True)
+    abaixo_minimo = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text='quantidade_estoque <= estoque_minimo, mantido a cada movimentação (fila de reposição)'
+    )
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = PecaManager()
     
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
+
+    def save(self, *args, **kwargs):
+
+        self.abaixo_minimo = self.quantidade_estoque <= self.estoque_minimo
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'atualizado_em'}
+            if {'quantidade_estoque', 'estoque_minimo'} & update_fields:
+                update_fields.add('abaixo_minimo')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     def verificar_disponibilidade(self, quantidade_desejada):
   
@@ -116,38 +305,29 @@ class Peca(models.Model):
             
         return True, 'Peça tá disponível'
         
-    def reduzir_estoque(self, quantidade):
+    def reduzir_estoque(self, quantidade, motivo='uso'):
      
-        if self.quantidade_estoque >= quantidade:
-            self.quantidade_estoque -= quantidade
-            
-            # Atualizar status baseado no estoque
-            if self.quantidade_estoque == 0:
-                self.status = 'esgotado'
-
-            elif self.status == 'esgotado' and self.quantidade_estoque > 0:
-                self.status = 'disponivel'
-                
-            self.save()
-            return True
-        return False
+        sucesso = Peca.objects.reduzir_estoque(self.pk, quantidade, motivo=motivo)
+        if sucesso:
+            self.refresh_from_db(fields=['quantidade_estoque', 'status', 'abaixo_minimo'])
+        return sucesso
         
-    def adicionar_estoque(self, quantidade):
+    def adicionar_estoque(self, quantidade, motivo='reposicao'):
         
-        self.quantidade_estoque += quantidade
-        
-        # marcar como disponível se o estoque aumentou
-        if self.status == 'esgotado' and self.quantidade_estoque > 0:
-            self.status = 'disponivel'
-            
-        self.save()
+        Peca.objects.adicionar_estoque(self.pk, quantidade, motivo=motivo)
+        self.refresh_from_db(fields=['quantidade_estoque', 'status', 'abaixo_minimo'])
     
     class Meta:
         verbose_name = 'Peça'
         verbose_name_plural = 'Peças'
         ordering = ['nome']
+        indexes = [
+            # índice parcial: só as peças na fila de reposição entram nele
+            models.Index(fields=['nome', 'id'], condition=Q(abaixo_minimo=True), name='peca_reposicao_idx'),
+            models.Index(fields=['nome', 'id'], name='peca_nome_idx'),
+        ]
 
-class Orcamento(models.Model):
+class Orcamento(ComAlteracoes):
     STATUS_CHOICES = [
         ('pendente', 'Pendente'),
         ('aprovado', 'Aprovado'),
@@ -164,8 +344,11 @@ class Orcamento(models.Model):
     valor_pecas = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
+    # dia em que a aprovação entrou no resumo do painel (backend/relatorios.py)
+    data_aprovacao = models.DateTimeField(null=True, blank=True)
     observacoes = models.TextField(blank=True)
     desconto_aplicado = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"Orçamento #{self.id} - {self.veiculo}"
@@ -173,6 +356,11 @@ class Orcamento(models.Model):
     def save(self, *args, **kwargs):
      
         self.valor_total = self.valor_mao_obra + self.valor_pecas
+        # vale também para status alterado por PATCH, sem passar por aprovar()
+        if self.status != 'aprovado':
+            self.data_aprovacao = None
+        elif self.data_aprovacao is None:
+            self.data_aprovacao = timezone.now()
 
         super().save(*args, **kwargs)
         
@@ -188,7 +376,9 @@ class Orcamento(models.Model):
 
             self.status = 'expirado'
 
-            self.save()
+            # status e evento do outbox (backend/eventos.py) na mesma transação
+            with transaction.atomic():
+                self.save()
             return False, 'Orçamento expirado'
             
         # Verificar se tá pendente
@@ -199,7 +389,8 @@ class Orcamento(models.Model):
         self.status = 'aprovado'
 
 
-        self.save()
+        with transaction.atomic():
+            self.save()
 
         return True, 'Aprovado com sucesso'
     
@@ -209,10 +400,19 @@ class Orcamento(models.Model):
         verbose_name = 'Orçamento'
         verbose_name_plural = 'Orçamentos'
         ordering = ['-data_criacao']
+        # um índice por forma de acesso do OrcamentoViewSet: listagem do
+        # gerente, do mecânico e por status, sempre terminando no desempate
+        # por id da paginação para que o ORDER BY saia direto do índice
+        indexes = [
+            models.Index(fields=['-data_criacao', '-id'], name='orcamento_data_idx'),
+            models.Index(fields=['mecanico_responsavel', '-data_criacao', '-id'], name='orcamento_mecanico_data_idx'),
+            models.Index(fields=['status', '-data_criacao', '-id'], name='orcamento_status_data_idx'),
+            models.Index(fields=['status', 'data_validade'], name='orcamento_status_validade_idx'),
+        ]
 
 
 
-class OrdemServico(models.Model):
+class OrdemServico(ComAlteracoes):
     STATUS_CHOICES = [
 
 
@@ -232,6 +432,7 @@ class OrdemServico(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='aguardando')
 
     km_entrada = models.IntegerField(help_text='Quilometragem na entrada')
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -250,6 +451,28 @@ class OrdemServico(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
         
+    def confirmar_uso_estoque(self):
+        """Baixa o estoque de todos os itens pendentes com um número fixo de queries"""
+        itens = list(
+            self.itens_pecas.filter(estoque_reduzido=False).order_by().values_list('pk', 'peca_id', 'quantidade')
+        )
+        if not itens:
+            return 0
+
+        demanda = defaultdict(int)
+        for _, peca_id, quantidade in itens:
+            demanda[peca_id] += quantidade
+
+        with transaction.atomic():
+            Peca.objects.reservar_estoque(demanda)
+            marcados = ItemPeca.objects.filter(
+                pk__in=[pk for pk, _, _ in itens], estoque_reduzido=False
+            ).update(estoque_reduzido=True, atualizado_em=timezone.now())
+            if marcados != len(itens):
+                raise ValidationError('O estoque desta ordem já foi baixado por outra operação')
+            registrar_alteracoes(ItemPeca, [pk for pk, _, _ in itens], 'atualizacao')
+        return marcados
+
     def concluir(self):
         """Concluir ordem de serviço"""
         from django.utils import timezone
@@ -278,13 +501,20 @@ class OrdemServico(models.Model):
         verbose_name = 'Ordem de Serviço'
         verbose_name_plural = 'Ordens de Serviço'
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['-data_inicio', '-id'], name='ordem_data_inicio_idx'),
+            models.Index(fields=['status', '-data_inicio', '-id'], name='ordem_status_data_idx'),
+            # ?periodo_campo=data_conclusao (PeriodoFilter) e relatórios por data de conclusão
+            models.Index(fields=['data_conclusao'], name='ordem_data_conclusao_idx'),
+        ]
 
-class ItemPeca(models.Model):
+class ItemPeca(ComAlteracoes):
     ordem_servico = models.ForeignKey('OrdemServico', on_delete=models.CASCADE, related_name='itens_pecas')
     peca = models.ForeignKey('Peca', on_delete=models.CASCADE, related_name='itens_utilizados')
     quantidade = models.IntegerField()
     preco_unitario_cobrado = models.DecimalField(max_digits=10, decimal_places=2)
     estoque_reduzido = models.BooleanField(default=False, help_text='Indica se o estoque já foi reduzido')
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -325,29 +555,48 @@ class ItemPeca(models.Model):
             
     def confirmar_uso_estoque(self):
       
-        if not self.estoque_reduzido:
-            sucesso = self.peca.reduzir_estoque(self.quantidade)
-            if sucesso:
+        if self.estoque_reduzido:
+            return False
+
+        with transaction.atomic():
+            # marca o item antes de mexer no estoque: de duas conclusões
+            # concorrentes só uma consegue virar a flag
+            marcado = ItemPeca.objects.filter(pk=self.pk, estoque_reduzido=False).update(
+                estoque_reduzido=True, atualizado_em=timezone.now()
+            )
+            if not marcado:
                 self.estoque_reduzido = True
-                super().save(update_fields=['estoque_reduzido'])
-                return True
-            else:
-                from django.core.exceptions import ValidationError
+                return False
+            registrar_alteracoes(ItemPeca, [self.pk], 'atualizacao')
+
+            if not self.peca.reduzir_estoque(self.quantidade):
                 raise ValidationError(f'Não foi possível reduzir estoque da peça {self.peca.codigo}')
-        return False
+
+        self.estoque_reduzido = True
+        return True
         
     def reverter_uso_estoque(self):
        
-        if self.estoque_reduzido:
-            self.peca.adicionar_estoque(self.quantidade)
-            self.estoque_reduzido = False
-            super().save(update_fields=['estoque_reduzido'])
+        if not self.estoque_reduzido:
+            return
+
+        with transaction.atomic():
+            desmarcado = ItemPeca.objects.filter(pk=self.pk, estoque_reduzido=True).update(
+                estoque_reduzido=False, atualizado_em=timezone.now()
+            )
+            if desmarcado:
+                registrar_alteracoes(ItemPeca, [self.pk], 'atualizacao')
+                self.peca.adicionar_estoque(self.quantidade, motivo='estorno')
+        self.estoque_reduzido = False
             
     def delete(self, *args, **kwargs):
       
         if self.estoque_reduzido:
             self.reverter_uso_estoque()
-        super().delete(*args, **kwargs)
+        resultado = super().delete(*args, **kwargs)
+        # item removido muda a ordem: o token dela (ETag) precisa mudar
+        OrdemServico.objects.filter(pk=self.ordem_servico_id).update(atualizado_em=timezone.now())
+        return resultado
     
     @property
     def valor_total(self):
@@ -362,6 +611,206 @@ class ItemPeca(models.Model):
         ordering = ['peca__nome']
         unique_together = ['ordem_servico', 'peca']
 
+# tabelas do índice textual, criadas e mantidas por backend/busca.py; a chave
+# se chama rowid porque no SQLite é o rowid da tabela virtual FTS5
+
+class BuscaPeca(models.Model):
+    peca = models.OneToOneField(
+        'Peca', on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='busca'
+    )
+    documento = DocumentoBusca()
+
+    class Meta:
+        managed = False
+        db_table = 'backend_busca_peca'
+
+class BuscaVeiculo(models.Model):
+    veiculo = models.OneToOneField(
+        'Veiculo', on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='busca'
+    )
+    documento = DocumentoBusca()
+
+    class Meta:
+        managed = False
+        db_table = 'backend_busca_veiculo'
+
+class BuscaOrcamento(models.Model):
+    orcamento = models.OneToOneField(
+        'Orcamento', on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='busca'
+    )
+    documento = DocumentoBusca()
+
+    class Meta:
+        managed = False
+        db_table = 'backend_busca_orcamento'
+
+# tabelas de resumo do painel do gerente, mantidas em backend/relatorios.py
+
+class ResumoDiarioMecanico(models.Model):
+    data = models.DateField()
+    mecanico = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='resumos_diarios')
+    orcamentos_aprovados = models.IntegerField(default=0)
+    valor_aprovado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ordens_concluidas = models.IntegerField(default=0)
+    valor_concluido = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.data} - {self.mecanico_id}"
+
+    class Meta:
+        verbose_name = 'Resumo Diário por Mecânico'
+        verbose_name_plural = 'Resumos Diários por Mecânico'
+        ordering = ['data']
+        unique_together = ['data', 'mecanico']
+
+class ResumoStatusOrdem(models.Model):
+    # cada status é dividido em RELATORIOS_FATIAS linhas, e cada transição soma
+    # numa delas ao acaso: conclusões simultâneas não disputam a mesma linha.
+    # A quantidade do status é a soma das fatias
+    status = models.CharField(max_length=20, choices=OrdemServico.STATUS_CHOICES)
+    fatia = models.PositiveSmallIntegerField(default=0)
+    quantidade = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_status_display()} ({self.fatia}): {self.quantidade}"
+
+    class Meta:
+        verbose_name = 'Resumo de Ordens por Status'
+        verbose_name_plural = 'Resumos de Ordens por Status'
+        ordering = ['status', 'fatia']
+        unique_together = ['status', 'fatia']
+
+class ConsumoDiarioPeca(models.Model):
+    data = models.DateField()
+    peca = models.ForeignKey('Peca', on_delete=models.CASCADE, related_name='consumo_diario')
+    quantidade = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.data} - {self.peca_id}: {self.quantidade}"
+
+    class Meta:
+        verbose_name = 'Consumo Diário de Peça'
+        verbose_name_plural = 'Consumos Diários de Peças'
+        ordering = ['data']
+        unique_together = ['data', 'peca']
+
+# conclusões de ordem de serviço enfileiradas (?assincrono=true), executadas em backend/conclusao.py
+
+class TarefaConclusao(models.Model):
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ordem_servico = models.ForeignKey('OrdemServico', on_delete=models.CASCADE, related_name='tarefas_conclusao')
+    solicitante = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='tarefas_conclusao')
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.IntegerField(default=0)
+    # status HTTP e corpo que o concluir síncrono teria devolvido
+    codigo_http = models.IntegerField(null=True, blank=True)
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    finalizada_em = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Conclusão da OS #{self.ordem_servico_id} - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = 'Tarefa de Conclusão'
+        verbose_name_plural = 'Tarefas de Conclusão'
+        ordering = ['criada_em']
+        indexes = [
+            # fila: tarefas pendentes na ordem de chegada
+            models.Index(fields=['status', 'criada_em'], name='tarefa_fila_idx'),
+        ]
+        constraints = [
+            # no máximo uma conclusão em andamento por ordem de serviço
+            models.UniqueConstraint(
+                fields=['ordem_servico'], condition=Q(status__in=['pendente', 'processando']),
+                name='tarefa_ativa_por_ordem',
+            ),
+        ]
+
+# outbox das transições de status de Orcamento e OrdemServico, gravado na
+# mesma transação da mudança e lido pelo feed SSE (backend/eventos.py); o id
+# é a posição do evento no feed (Last-Event-ID)
+
+class EventoStatus(models.Model):
+    TIPO_CHOICES = [
+        ('orcamento', 'Orçamento'),
+        ('ordem_servico', 'Ordem de Serviço'),
+    ]
+
+    tipo = models.CharField(max_length=15, choices=TIPO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    orcamento = models.ForeignKey('Orcamento', on_delete=models.CASCADE, related_name='eventos')
+    # quem recebe: o dono do veículo e o mecânico responsável (gerentes recebem tudo)
+    cliente = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='+')
+    mecanico = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='+')
+    status_anterior = models.CharField(max_length=20, null=True, blank=True)
+    status_novo = models.CharField(max_length=20)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.objeto_id}: {self.status_anterior} -> {self.status_novo}"
+
+    class Meta:
+        verbose_name = 'Evento de Status'
+        verbose_name_plural = 'Eventos de Status'
+        ordering = ['id']
+        indexes = [
+            # reconexão com Last-Event-ID: eventos do usuário depois de um id
+            models.Index(fields=['cliente', 'id'], name='evento_cliente_idx'),
+            models.Index(fields=['mecanico', 'id'], name='evento_mecanico_idx'),
+        ]
+
+# change log (backend/alteracoes.py): uma entrada por criação, atualização,
+# remoção ou movimentação de estoque de Peca, Orcamento, OrdemServico e
+# ItemPeca, gravada na mesma transação da escrita. O id é o offset que os
+# consumidores guardam para continuar de onde pararam.
+
+class Alteracao(models.Model):
+    OPERACAO_CHOICES = [
+        ('criacao', 'Criação'),
+        ('atualizacao', 'Atualização'),
+        ('remocao', 'Remoção'),
+        ('estoque', 'Movimentação de estoque'),
+    ]
+
+    # model_name: peca, orcamento, ordemservico ou itempeca
+    tabela = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    operacao = models.CharField(max_length=15, choices=OPERACAO_CHOICES)
+    # a linha inteira depois da escrita (colunas do banco); null na remoção
+    dados = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # movimentação de estoque: {'delta': variação da quantidade, 'motivo': ...}
+    detalhe = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.tabela} #{self.objeto_id}: {self.get_operacao_display()}"
+
+    class Meta:
+        verbose_name = 'Alteração'
+        verbose_name_plural = 'Alterações'
+        ordering = ['id']
+        indexes = [
+            # compactação: a entrada mais recente de cada objeto
+            models.Index(fields=['tabela', 'objeto_id', 'id'], name='alteracao_objeto_idx'),
+        ]
+
+def registrar_alteracoes(model, ids, operacao, detalhes=None):
+    # escritas que não passam pelo save() (update(), bulk_*)
+    from .alteracoes import registrar
+    registrar(model, ids, operacao, detalhes)
+
 
 #gerenciar o estoque autmaticamente
 
@@ -370,9 +819,35 @@ def gerenciar_estoque_ordem_servico(sender, instance, **kwargs):
    
     if instance.status == 'concluido':
        
-        for item in instance.itens_pecas.all():
-            item.confirmar_uso_estoque()
+        instance.confirmar_uso_estoque()
     elif instance.status == 'cancelado':
     
         for item in instance.itens_pecas.all():
-            item.reverter_uso_estoque()
\ No newline at end of file
+            item.reverter_uso_estoque()
+
+
+# transições de status para quem acompanha Orcamento/OrdemServico
+
+# data que acompanha o status: quem desfaz uma aprovação ou conclusão precisa
+# do dia em que ela foi contada, e o save já pode ter limpado o campo
+DATA_DO_STATUS = {Orcamento: 'data_aprovacao', OrdemServico: 'data_conclusao'}
+
+
+@receiver(post_init, sender=Orcamento)
+@receiver(post_init, sender=OrdemServico)
+def guardar_status_original(sender, instance, **kwargs):
+    # __dict__ para não disparar query quando status foi adiado com only()/defer()
+    instance._status_original = instance.__dict__.get('status')
+    instance._data_original = instance.__dict__.get(DATA_DO_STATUS[sender])
+
+@receiver(post_save, sender=Orcamento)
+@receiver(post_save, sender=OrdemServico)
+def notificar_status_alterado(sender, instance, created, **kwargs):
+    anterior = None if created else instance._status_original
+    if created or (anterior is not None and anterior != instance.status):
+        status_alterado.send(
+            sender=sender, instance=instance, anterior=anterior, novo=instance.status,
+            data_anterior=None if created else instance._data_original,
+        )
+    instance._status_original = instance.status
+    instance._data_original = instance.__dict__.get(DATA_DO_STATUS[sender])
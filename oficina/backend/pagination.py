@@ -0,0 +1,223 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre a ordenação do viewset.
+
+    O cursor guarda os valores da última linha da página para cada campo de
+    ordenação, com desempate estável em `id`, então a página N custa o mesmo
+    que a página 1: o banco faz um range scan em vez de OFFSET.
+    """
+
+    cursor_query_param = 'cursor'
+    # índice de cada coluna quando a página é de tuplas de values_list (backend/rapido.py)
+    colunas = None
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'PAGINACAO_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'PAGINACAO_MAX_PAGE_SIZE', 500)
+
+        valor = request.query_params.get(self.page_size_query_param)
+        if valor:
+            try:
+                page_size = int(valor)
+            except ValueError:
+                pass
+        return max(1, min(page_size, max_page_size))
+
+    def get_ordering(self, queryset):
+        # ordenação aplicada pelo OrderingFilter ou, na falta dela, a do Meta do model
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = [campo for campo in ordering if isinstance(campo, str) and campo not in ('?', '')]
+
+        campos = [campo.lstrip('-') for campo in ordering]
+        if 'id' not in campos and 'pk' not in campos:
+            # desempate estável segue a direção do primeiro campo
+            desc = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-id' if desc else 'id')
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.montar_pagina(list(self.preparar(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset para views async: a página vem do ORM assíncrono."""
+        queryset = self.preparar(queryset, request)
+        # async for no queryset e não aiterator(): o aiterator() de values_list
+        # executa a query dentro do event loop (SynchronousOnlyOperation)
+        return self.montar_pagina([obj async for obj in queryset])
+
+    def preparar(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.anulaveis = [self.anulavel(queryset.model, campo.lstrip('-')) for campo in self.ordering]
+
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            reverso, posicao = False, None
+        else:
+            reverso, posicao = cursor
+        self.cursor = reverso, posicao
+
+        queryset = queryset.order_by(*self.get_order_by(reverso))
+        if posicao is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(posicao, reverso))
+            except (TypeError, ValueError, ValidationError):
+                # valor do cursor que não converte para o tipo do campo
+                raise NotFound(self.invalid_cursor_message)
+
+        # busca uma linha a mais para saber se existe outra página
+        return queryset[:self.page_size + 1]
+
+    def montar_pagina(self, resultados):
+        reverso, posicao = self.cursor
+        tem_mais = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+
+        if reverso:
+            self.page.reverse()
+            self.has_next = posicao is not None
+            self.has_previous = tem_mais
+        else:
+            self.has_next = tem_mais
+            self.has_previous = posicao is not None
+
+        return self.page
+
+    def anulavel(self, model, caminho):
+        # campo (ou algum join do caminho) que pode ser NULL; anotações contam como anuláveis
+        for parte in caminho.split('__'):
+            try:
+                campo = model._meta.get_field('id' if parte == 'pk' else parte)
+            except FieldDoesNotExist:
+                return True
+            if campo.null:
+                return True
+            model = campo.related_model
+            if model is None:
+                return False
+        return False
+
+    def get_order_by(self, reverso):
+        # NULLs sempre no fim da ordem natural, para que o cursor tenha ordem total.
+        # Campos NOT NULL ficam com ASC/DESC simples, que casam com os índices do Meta
+        # (no PostgreSQL DESC NULLS LAST não usa um índice DESC comum)
+        order_by = []
+        for campo, anulavel in zip(self.ordering, self.anulaveis):
+            desc = campo.startswith('-')
+            nome = campo.lstrip('-')
+            if not anulavel:
+                order_by.append(F(nome).asc() if desc == reverso else F(nome).desc())
+            elif reverso:
+                order_by.append(F(nome).asc(nulls_first=True) if desc else F(nome).desc(nulls_first=True))
+            else:
+                order_by.append(F(nome).desc(nulls_last=True) if desc else F(nome).asc(nulls_last=True))
+        return order_by
+
+    def get_keyset_filter(self, posicao, reverso):
+        # (f1, f2, ..., fn) estritamente depois de (v1, v2, ..., vn) na ordem pedida
+        filtro = Q(pk__in=[])
+        prefixo = Q()
+        for campo, anulavel, valor in zip(self.ordering, self.anulaveis, posicao):
+            desc = campo.startswith('-')
+            nome = campo.lstrip('-')
+            maior = desc == reverso
+
+            if valor is None:
+                depois = Q(**{f'{nome}__isnull': False}) if reverso else None
+                igual = Q(**{f'{nome}__isnull': True})
+            else:
+                lookup = 'gt' if maior else 'lt'
+                depois = Q(**{f'{nome}__{lookup}': valor})
+                if not reverso and anulavel:
+                    depois |= Q(**{f'{nome}__isnull': True})
+                igual = Q(**{nome: valor})
+
+            if depois is not None:
+                filtro |= prefixo & depois
+            prefixo &= igual
+        return filtro
+
+    def get_posicao(self, instance):
+        posicao = []
+        for campo in self.ordering:
+            if self.colunas is not None:
+                valor = instance[self.colunas[campo.lstrip('-')]]
+                posicao.append(None if valor is None else str(valor))
+                continue
+            valor = instance
+            for parte in campo.lstrip('-').split('__'):
+                valor = getattr(valor, parte, None)
+                if valor is None:
+                    break
+            if hasattr(valor, 'pk'):
+                valor = valor.pk
+            posicao.append(None if valor is None else str(valor))
+        return posicao
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverso = bool(data['r'])
+            posicao = data['p']
+            if data['o'] != self.ordering or len(posicao) != len(self.ordering):
+                raise ValueError
+            if not all(valor is None or isinstance(valor, str) for valor in posicao):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverso, posicao
+
+    def encode_cursor(self, reverso, posicao):
+        data = {'r': int(reverso), 'p': posicao, 'o': self.ordering}
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.get_posicao(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.get_posicao(self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
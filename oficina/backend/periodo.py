@@ -0,0 +1,118 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import exceptions, filters
+
+# Filtro por período sobre colunas de data/hora sem envolver a coluna numa
+# função: ?data_inicio=2025-01-01&data_fim=2025-01-31 vira
+# campo >= 2025-01-01 00:00 e campo < 2025-02-01 00:00 no fuso ativo, o que
+# o banco resolve com um range scan no índice do campo.
+
+RELATIVO = re.compile(r'^last_(\d+)([dw])$')
+
+
+def periodo_relativo(nome, hoje):
+    """(inicio, fim) inclusivos para last_Nd, last_Nw, today, this_month, last_month e this_year."""
+    encontrado = RELATIVO.match(nome)
+    if encontrado:
+        dias = int(encontrado.group(1)) * (7 if encontrado.group(2) == 'w' else 1)
+        if dias < 1:
+            raise ValidationError(f'Período inválido: {nome}')
+        return hoje - timedelta(days=dias - 1), hoje
+    if nome == 'today':
+        return hoje, hoje
+    if nome == 'this_month':
+        return hoje.replace(day=1), hoje
+    if nome == 'last_month':
+        fim = hoje.replace(day=1) - timedelta(days=1)
+        return fim.replace(day=1), fim
+    if nome == 'this_year':
+        return hoje.replace(month=1, day=1), hoje
+    raise ValidationError(
+        f'Período inválido: {nome}. Use last_<N>d, last_<N>w, today, this_month, last_month ou this_year'
+    )
+
+
+def ler_data(valor):
+    try:
+        data = parse_date(valor)
+    except ValueError:
+        data = None
+    if data is None:
+        raise ValidationError('data_inicio e data_fim devem estar no formato AAAA-MM-DD')
+    return data
+
+
+def ler_periodo(params, padrao=None):
+    """
+    Datas (inicio, fim) inclusivas a partir de ?periodo= ou ?data_inicio=/?data_fim=.
+
+    Sem nenhum dos parâmetros devolve padrao (ou (None, None)); qualquer um
+    dos lados pode ficar em aberto com data_inicio/data_fim.
+    """
+    periodo = params.get('periodo')
+    data_inicio = params.get('data_inicio')
+    data_fim = params.get('data_fim')
+
+    if periodo:
+        if data_inicio or data_fim:
+            raise ValidationError('Use periodo ou data_inicio/data_fim, não os dois')
+        return periodo_relativo(periodo, timezone.localdate())
+
+    if not data_inicio and not data_fim:
+        return padrao or (None, None)
+
+    inicio, fim = padrao or (None, None)
+    if data_inicio:
+        inicio = ler_data(data_inicio)
+    if data_fim:
+        fim = ler_data(data_fim)
+    if inicio and fim and inicio > fim:
+        raise ValidationError('data_inicio deve ser anterior ou igual a data_fim')
+    return inicio, fim
+
+
+def limite(data):
+    # meia-noite local do dia, como datetime com fuso
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def filtrar_periodo(queryset, campo, inicio, fim):
+    """Aplica [inicio, fim + 1 dia) em campo, com datetimes no fuso ativo se o campo for DateTimeField."""
+    com_hora = isinstance(queryset.model._meta.get_field(campo), models.DateTimeField)
+    if inicio:
+        queryset = queryset.filter(**{f'{campo}__gte': limite(inicio) if com_hora else inicio})
+    if fim:
+        fim = fim + timedelta(days=1)
+        queryset = queryset.filter(**{f'{campo}__lt': limite(fim) if com_hora else fim})
+    return queryset
+
+
+class PeriodoFilter(filters.BaseFilterBackend):
+    """
+    ?data_inicio=, ?data_fim= ou ?periodo=last_30d sobre um dos campos em
+    view.periodo_campos (o primeiro por padrão; outro via ?periodo_campo=).
+    """
+
+    campo_query_param = 'periodo_campo'
+
+    def filter_queryset(self, request, queryset, view):
+        campos = getattr(view, 'periodo_campos', None)
+        if not campos:
+            return queryset
+
+        try:
+            inicio, fim = ler_periodo(request.query_params)
+        except ValidationError as e:
+            raise exceptions.ValidationError({'erro': ' '.join(e.messages)})
+        if inicio is None and fim is None:
+            return queryset
+
+        campo = request.query_params.get(self.campo_query_param) or campos[0]
+        if campo not in campos:
+            raise exceptions.ValidationError({'erro': f'periodo_campo deve ser um de: {", ".join(campos)}'})
+        return filtrar_periodo(queryset, campo, inicio, fim)
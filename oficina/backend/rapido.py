@@ -0,0 +1,202 @@
+import decimal
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations, serializers
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+
+from .instrumentacao import medir_serializacao
+
+# Caminho rápido das listagens: as linhas vêm de .values_list() e viram dicts
+# por extratores montados uma vez a partir dos campos do serializer, sem
+# instanciar models nem passar pelo to_representation do DRF campo a campo.
+# Cada linha sai com as mesmas chaves, na mesma ordem e com os mesmos
+# valores do serializer, então o JSON é idêntico.
+#
+# No serializer:
+#   rapido_calculados = {campo: (colunas, funcao)} para SerializerMethodField
+#   rapido_extras = {chave: (colunas, funcao)} para chaves que o
+#       to_representation acrescenta no fim
+# As colunas são caminhos do values_list() ('cliente__username'), e funcao
+# recebe os valores delas na ordem.
+
+# campos cujo to_representation devolve o próprio valor lido do banco
+IDENTIDADE = (
+    fields.CharField, fields.IntegerField, fields.BooleanField, fields.ChoiceField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+def rotulos(model, campo):
+    """Tabela valor -> rótulo das choices, como get_<campo>_display()."""
+    return {valor: str(rotulo) for valor, rotulo in model._meta.get_field(campo).flatchoices}
+
+
+def converter_data_hora(campo):
+    # DateTimeField em ISO 8601: fuso corrente resolvido uma vez por listagem, não por valor
+    formato = getattr(campo, 'format', api_settings.DATETIME_FORMAT)
+    if hasattr(campo, 'timezone') or not isinstance(formato, str) or formato.lower() != ISO_8601:
+        return None
+
+    def montar(fuso):
+        def converter(valor):
+            if fuso is not None:
+                valor = valor.astimezone(fuso)
+            texto = valor.isoformat()
+            return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+        return converter
+    return montar
+
+
+def converter_decimal(campo):
+    # DecimalField como string, com quantize pré-montado
+    coerce_to_string = getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or campo.localize or campo.decimal_places is None:
+        return None
+    expoente = decimal.Decimal('.1') ** campo.decimal_places
+    contexto = decimal.getcontext().copy()
+    if campo.max_digits is not None:
+        contexto.prec = campo.max_digits
+
+    def converter(valor):
+        if not isinstance(valor, decimal.Decimal):
+            valor = decimal.Decimal(str(valor).strip())
+        return '{:f}'.format(valor.quantize(expoente, rounding=campo.rounding, context=contexto))
+    return lambda fuso: converter
+
+
+def conversor(campo):
+    """fuso -> função valor -> JSON, equivalente a campo.to_representation; None para identidade."""
+    if isinstance(campo, IDENTIDADE):
+        return None
+    if isinstance(campo, fields.DateTimeField):
+        montar = converter_data_hora(campo)
+    elif isinstance(campo, fields.DecimalField):
+        montar = converter_decimal(campo)
+    else:
+        montar = None
+    return montar or (lambda fuso: campo.to_representation)
+
+
+def convertendo(indice, converter):
+    def extrair(linha):
+        valor = linha[indice]
+        return None if valor is None else converter(valor)
+    return extrair
+
+
+def calculando(indices, funcao):
+    valores = itemgetter(*indices) if len(indices) > 1 else (lambda linha: (linha[indices[0]],))
+    return lambda linha: funcao(*valores(linha))
+
+
+class ListaRapida:
+
+    def __init__(self, serializer_class, selecao=None):
+        self.serializer_class = serializer_class
+        self.colunas = []
+        # (chave, fuso -> extrator), na ordem do serializer
+        self.campos = []
+        self.extratores_por_fuso = {}
+
+        calculados = getattr(serializer_class, 'rapido_calculados', {})
+        # com ?fields=/?exclude= (backend/campos.py) só os campos pedidos viram colunas
+        serializer = serializer_class() if selecao is None else serializer_class(selecao=selecao)
+        for campo in serializer._readable_fields:
+            if campo.field_name in calculados:
+                self.calculado(campo.field_name, *calculados[campo.field_name])
+            elif isinstance(campo, (fields.SerializerMethodField, relations.ManyRelatedField, serializers.BaseSerializer)) \
+                    or campo.source == '*':
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{campo.field_name} precisa de rapido_calculados'
+                )
+            else:
+                indice = self.coluna('__'.join(campo.source_attrs))
+                montar = conversor(campo)
+                if montar is None:
+                    extrator = itemgetter(indice)
+                    self.campos.append((campo.field_name, lambda fuso, extrator=extrator: extrator))
+                else:
+                    self.campos.append((
+                        campo.field_name,
+                        lambda fuso, indice=indice, montar=montar: convertendo(indice, montar(fuso))
+                    ))
+
+        for chave, (colunas, funcao) in getattr(serializer_class, 'rapido_extras', {}).items():
+            if serializer.pedido(chave) if selecao is not None else True:
+                self.calculado(chave, colunas, funcao)
+
+    def coluna(self, caminho):
+        if caminho not in self.colunas:
+            self.colunas.append(caminho)
+        return self.colunas.index(caminho)
+
+    def calculado(self, chave, colunas, funcao):
+        extrator = calculando([self.coluna(caminho) for caminho in colunas], funcao)
+        self.campos.append((chave, lambda fuso: extrator))
+
+    def extratores(self):
+        fuso = timezone.get_current_timezone() if settings.USE_TZ else None
+        if fuso not in self.extratores_por_fuso:
+            self.extratores_por_fuso[fuso] = [(chave, montar(fuso)) for chave, montar in self.campos]
+        return self.extratores_por_fuso[fuso]
+
+    def preparar(self, queryset, paginator=None):
+        """values_list() com as colunas do serializer e as da ordenação da paginação."""
+        colunas = list(self.colunas)
+        if paginator is not None:
+            for campo in paginator.get_ordering(queryset):
+                if campo.lstrip('-') not in colunas:
+                    colunas.append(campo.lstrip('-'))
+            paginator.colunas = {nome: indice for indice, nome in enumerate(colunas)}
+        return queryset.values_list(*colunas)
+
+    def serializar(self, linhas):
+        return medir_serializacao(self.montar_dicts, linhas)
+
+    def montar_dicts(self, linhas):
+        extratores = self.extratores()
+        return [{chave: extrair(linha) for chave, extrair in extratores} for linha in linhas]
+
+
+@lru_cache(maxsize=256)
+def lista_rapida(serializer_class, selecao=None):
+    # compilada no primeiro uso (os campos do serializer dependem dos models
+    # prontos) e guardada por seleção de campos
+    return ListaRapida(serializer_class, selecao)
+
+
+class ListaRapidaMixin:
+    """list() (e alist() das views async) pelo caminho rápido quando LISTA_RAPIDA está ligado."""
+
+    def get_lista_rapida(self):
+        if not getattr(settings, 'LISTA_RAPIDA', True):
+            return None
+        selecao = self.get_selecao() if hasattr(self, 'get_selecao') else None
+        if selecao is not None and selecao.expandir:
+            # relações expandidas são serializers aninhados: caminho normal
+            return None
+        return lista_rapida(self.get_serializer_class(), selecao)
+
+    def list(self, request, *args, **kwargs):
+        lista = self.get_lista_rapida()
+        if lista is None:
+            return super().list(request, *args, **kwargs)
+        queryset = lista.preparar(self.filter_queryset(self.get_queryset()), self.paginator)
+        if self.paginator is None:
+            return Response(lista.serializar(queryset))
+        return self.get_paginated_response(lista.serializar(self.paginate_queryset(queryset)))
+
+    async def alist(self, request, *args, **kwargs):
+        lista = self.get_lista_rapida()
+        if lista is None:
+            return await super().alist(request, *args, **kwargs)
+        queryset = lista.preparar(self.filter_queryset(self.get_queryset()), self.paginator)
+        if self.paginator is None:
+            return Response(lista.serializar([linha async for linha in queryset]))
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return self.get_paginated_response(lista.serializar(page))
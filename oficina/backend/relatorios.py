@@ -0,0 +1,140 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Orcamento, OrdemServico, ItemPeca, Peca,
+    ResumoDiarioMecanico, ResumoStatusOrdem, ConsumoDiarioPeca,
+)
+from .signals import estoque_alterado, status_alterado
+
+
+def acumular(model, chave, valores, **filtros):
+    """
+    Soma deltas nas linhas de resumo, criando as que ainda não existem.
+
+    valores é {valor_da_chave: {campo: delta}}; tudo sai em no máximo três
+    statements (leitura das chaves, UPDATE com CASE e bulk_create).
+    """
+    valores = {k: v for k, v in valores.items() if any(v.values())}
+    for _ in range(3):
+        if not valores:
+            return
+
+        existentes = set(
+            model.objects.filter(**filtros, **{f'{chave}__in': list(valores)})
+            .values_list(chave, flat=True)
+        )
+        if existentes:
+            campos = {campo for k in existentes for campo in valores[k]}
+            model.objects.filter(**filtros, **{f'{chave}__in': existentes}).update(**{
+                campo: F(campo) + Case(
+                    *[When(**{chave: k}, then=Value(valores[k][campo]))
+                      for k in existentes if campo in valores[k]],
+                    default=Value(0),
+                    output_field=model._meta.get_field(campo),
+                )
+                for campo in campos
+            })
+
+        valores = {k: v for k, v in valores.items() if k not in existentes}
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([model(**filtros, **{chave: k}, **v) for k, v in valores.items()])
+            return
+        except IntegrityError:
+            # outra transação criou a linha no meio do caminho: soma de novo
+            continue
+    raise IntegrityError(f'Não foi possível atualizar o resumo {model.__name__}')
+
+
+def _data_local(valor=None):
+    return timezone.localdate(valor) if valor else timezone.localdate()
+
+
+def _acumular_aprovacao(orcamento, sinal, data):
+    # sinal -1: o orçamento deixou de estar aprovado (PATCH no status, removido),
+    # no dia em que a aprovação foi contada
+    acumular(
+        ResumoDiarioMecanico, 'mecanico_id',
+        {orcamento.mecanico_responsavel_id: {'orcamentos_aprovados': sinal, 'valor_aprovado': sinal * orcamento.valor_total}},
+        data=_data_local(data)
+    )
+
+
+@receiver(status_alterado, sender=Orcamento)
+def resumir_orcamento(sender, instance, anterior, novo, data_anterior=None, **kwargs):
+
+    if novo == 'aprovado':
+        _acumular_aprovacao(instance, 1, instance.data_aprovacao)
+    elif anterior == 'aprovado':
+        _acumular_aprovacao(instance, -1, data_anterior)
+
+
+@receiver(post_delete, sender=Orcamento)
+def remover_orcamento(sender, instance, **kwargs):
+    if instance.status == 'aprovado':
+        _acumular_aprovacao(instance, -1, instance.data_aprovacao)
+
+
+def _fatia():
+    return random.randrange(getattr(settings, 'RELATORIOS_FATIAS', 8))
+
+
+def _acumular_conclusao(ordem, sinal, data):
+    # sinal -1: a ordem deixou de estar concluída (cancelada, reaberta, removida),
+    # no dia da conclusão que tinha sido contada
+    orcamento = ordem.orcamento
+    acumular(
+        ResumoDiarioMecanico, 'mecanico_id',
+        {orcamento.mecanico_responsavel_id: {'ordens_concluidas': sinal, 'valor_concluido': sinal * orcamento.valor_total}},
+        data=_data_local(data)
+    )
+
+
+@receiver(status_alterado, sender=OrdemServico)
+def resumir_ordem_servico(sender, instance, anterior, novo, data_anterior=None, **kwargs):
+
+    deltas = {novo: {'quantidade': 1}}
+    if anterior is not None:
+        deltas[anterior] = {'quantidade': -1}
+    acumular(ResumoStatusOrdem, 'status', deltas, fatia=_fatia())
+
+    if novo == 'concluido':
+        _acumular_conclusao(instance, 1, instance.data_conclusao)
+    elif anterior == 'concluido':
+        _acumular_conclusao(instance, -1, data_anterior)
+
+
+@receiver(post_delete, sender=OrdemServico)
+def remover_ordem_servico(sender, instance, **kwargs):
+    acumular(ResumoStatusOrdem, 'status', {instance.status: {'quantidade': -1}}, fatia=_fatia())
+    if instance.status == 'concluido':
+        _acumular_conclusao(instance, -1, instance.data_conclusao)
+
+
+@receiver(estoque_alterado, sender=Peca)
+def resumir_consumo(sender, deltas, motivo, **kwargs):
+
+    # só baixas por ordem de serviço (e seus estornos) contam como consumo
+    if motivo not in ('uso', 'estorno'):
+        return
+    acumular(
+        ConsumoDiarioPeca, 'peca_id',
+        {peca_id: {'quantidade': -delta} for peca_id, delta in deltas.items()},
+        data=_data_local()
+    )
+
+
+@receiver(post_delete, sender=ItemPeca)
+def remover_consumo(sender, instance, **kwargs):
+
+    # item apagado junto com a ordem (cascade) sem estorno: sai do consumo como
+    # um estorno sairia. ItemPeca.delete() estorna antes e chega aqui sem a flag
+    if instance.estoque_reduzido:
+        acumular(ConsumoDiarioPeca, 'peca_id', {instance.peca_id: {'quantidade': -instance.quantidade}}, data=_data_local())
@@ -0,0 +1,158 @@
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+# Réplicas de leitura (REPLICAS_LEITURA no settings). Só as leituras seguras
+# vão para uma réplica: GET das ações em REPLICA_ACOES (list, retrieve,
+# exportar, relatórios) dos viewsets que não declaram replica = False. O
+# resto (escritas, ações que decidem com o estado atual, workers, comandos)
+# fica no principal.
+#
+# Ler o que acabou de escrever: a partir da primeira escrita de um request,
+# o resto dele lê do principal, e a resposta leva o cookie
+# REPLICA_FIXACAO_COOKIE, que mantém a sessão no principal por
+# REPLICA_FIXACAO_SEGUNDOS (mais que o atraso da réplica). Dentro de uma
+# transação no principal as leituras também ficam nele.
+
+_estado = contextvars.ContextVar('roteamento', default=None)
+
+
+class Estado:
+
+    __slots__ = ('replica', 'escreveu')
+
+    def __init__(self):
+        # alias sorteado para o request (uma réplica só, para list e count
+        # verem o mesmo atraso); None = principal
+        self.replica = None
+        self.escreveu = False
+
+
+class RoteadorReplica:
+
+    principal = 'default'
+    # a sessão e o usuário dela decidem quem é o usuário, se ainda está ativo e
+    # o tipo (que define o escopo): um logout, uma desativação ou uma troca de
+    # tipo ainda não replicados não podem valer. O usuário é carregado sem
+    # pressa, já dentro da view, depois de a réplica ter sido sorteada
+    sempre_no_principal = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or estado.replica is None or estado.escreveu:
+            return self.principal
+        if model._meta.app_label in self.sempre_no_principal or model._meta.label == settings.AUTH_USER_MODEL:
+            return self.principal
+        if connections[self.principal].in_atomic_block:
+            return self.principal
+        return estado.replica
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escreveu = True
+        return self.principal
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # mesmos dados em todos os bancos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # réplica SQLite é outro arquivo, não replicação do servidor: precisa do schema
+        return db == self.principal or connections[db].vendor == 'sqlite'
+
+
+def lendo_da_replica():
+    # o request atual lê de uma réplica, que pode estar atrasada
+    estado = _estado.get()
+    return estado is not None and estado.replica is not None and not estado.escreveu
+
+
+def leitura_segura(request, view_func):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    cls = getattr(view_func, 'cls', None)
+    if cls is None or not getattr(cls, 'replica', True):
+        return False
+    acao = (getattr(view_func, 'actions', None) or {}).get('get')
+    return acao in getattr(settings, 'REPLICA_ACOES', ())
+
+
+class RoteamentoMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        estado = Estado()
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.concluir(response, estado)
+
+    async def __acall__(self, request):
+        estado = Estado()
+        token = _estado.set(estado)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.concluir(response, estado)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        replicas = getattr(settings, 'REPLICAS_LEITURA', [])
+        if estado is None or not replicas or settings.REPLICA_FIXACAO_COOKIE in request.COOKIES:
+            return
+        if leitura_segura(request, view_func):
+            estado.replica = random.choice(replicas)
+
+    def concluir(self, response, estado):
+        if estado.escreveu:
+            response.set_cookie(
+                settings.REPLICA_FIXACAO_COOKIE, '1', max_age=settings.REPLICA_FIXACAO_SEGUNDOS,
+                httponly=True, samesite='Lax',
+            )
+        if estado.replica is not None and response.streaming:
+            acompanhar = self.acompanhar_async if response.is_async else self.acompanhar
+            response.streaming_content = acompanhar(response.streaming_content, estado)
+        return response
+
+    def acompanhar(self, conteudo, estado):
+        # exportar/: as queries rodam enquanto o servidor pede cada bloco
+        conteudo = iter(conteudo)
+        while True:
+            token = _estado.set(estado)
+            try:
+                parte = next(conteudo)
+            except StopIteration:
+                return
+            finally:
+                _estado.reset(token)
+            yield parte
+
+    async def acompanhar_async(self, conteudo, estado):
+        # o mesmo sob ASGI: sync_to_async leva o contexto para a thread de cada bloco
+        conteudo = aiter(conteudo)
+        while True:
+            token = _estado.set(estado)
+            try:
+                parte = await anext(conteudo)
+            except StopAsyncIteration:
+                return
+            finally:
+                _estado.reset(token)
+            yield parte
@@ -1,7 +1,13 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca
+from .models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca, TarefaConclusao
+from .campos import CamposDinamicosMixin
+from .rapido import rotulos
+
+TIPOS_USUARIO = rotulos(Usuario, 'tipo')
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
 
         model = Usuario
@@ -19,7 +25,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class VeiculoSerializer(serializers.ModelSerializer):
+class VeiculoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente_nome = serializers.CharField(source='cliente.username', read_only=True)
     
     class Meta:
@@ -28,6 +34,8 @@ class VeiculoSerializer(serializers.ModelSerializer):
         
     def to_representation(self, instance):
         representation = super().to_representation(instance)
+        if not self.pedido('cliente_info'):
+            return representation
         # Adicionar informações do cliente nas resposta
         representation['cliente_info'] = {
             'id': instance.cliente.id,
@@ -36,8 +44,21 @@ class VeiculoSerializer(serializers.ModelSerializer):
             'tipo': instance.cliente.get_tipo_display()
         }
         return representation
-        
-class PecaSerializer(serializers.ModelSerializer):
+
+    # o mesmo cliente_info no caminho rápido das listagens (backend/rapido.py)
+    rapido_extras = {
+        'cliente_info': (
+            ('cliente', 'cliente__username', 'cliente__first_name', 'cliente__last_name', 'cliente__tipo'),
+            lambda cliente_id, username, first_name, last_name, tipo: {
+                'id': cliente_id,
+                'username': username,
+                'nome_completo': f"{first_name} {last_name}".strip(),
+                'tipo': TIPOS_USUARIO.get(tipo, tipo)
+            }
+        ),
+    }
+        
+class PecaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     em_estoque = serializers.SerializerMethodField()
     
     class Meta:
@@ -47,8 +68,22 @@ class PecaSerializer(serializers.ModelSerializer):
     def get_em_estoque(self, obj):
   
         return obj.quantidade_estoque > obj.estoque_minimo
+
+    rapido_calculados = {
+        'em_estoque': (('quantidade_estoque', 'estoque_minimo'), lambda quantidade, minimo: quantidade > minimo),
+    }
         
-class ItemPecaSerializer(serializers.ModelSerializer):
+class PecaLoteSerializer(PecaSerializer):
+    # sem UniqueValidator: no lote a unicidade de codigo é resolvida com uma
+    # query só (codigo existente vira atualização)
+    codigo = serializers.CharField(max_length=20)
+
+class ItemPecaLoteSerializer(serializers.Serializer):
+    peca_id = serializers.IntegerField(min_value=1)
+    quantidade = serializers.IntegerField(min_value=1)
+    preco_unitario_cobrado = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+        
+class ItemPecaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
 
     peca_nome = serializers.CharField(source='peca.nome', read_only=True)
@@ -93,14 +128,14 @@ class ItemPecaSerializer(serializers.ModelSerializer):
             
         return super().create(validated_data)
         
-class OrcamentoSerializer(serializers.ModelSerializer):
+class OrcamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     veiculo_info = serializers.CharField(source='veiculo.__str__', read_only=True)
     mecanico_nome = serializers.CharField(source='mecanico_responsavel.get_full_name', read_only=True)
     
     class Meta:
         model = Orcamento
         fields = '__all__'
-        read_only_fields = ('mecanico_responsavel', 'valor_total', 'data_criacao')
+        read_only_fields = ('mecanico_responsavel', 'valor_total', 'data_criacao', 'data_aprovacao')
         
     def validate_data_validade(self, value):
 
@@ -171,7 +206,7 @@ class OrcamentoSerializer(serializers.ModelSerializer):
             
         return super().create(validated_data)
         
-class OrdemServicoSerializer(serializers.ModelSerializer):
+class OrdemServicoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
 
     orcamento_info = serializers.CharField(source='orcamento.__str__', read_only=True)
@@ -183,4 +218,10 @@ class OrdemServicoSerializer(serializers.ModelSerializer):
 
         
         model = OrdemServico
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+class TarefaConclusaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = TarefaConclusao
+        fields = '__all__'
@@ -0,0 +1,20 @@
+from django.dispatch import Signal
+
+# Enviado pelo PecaManager depois de cada movimentação de estoque, dentro da
+# mesma transação do UPDATE (os métodos do manager abrem uma se preciso).
+#   deltas: {peca_id: variação da quantidade} (negativa na baixa)
+#   motivo: 'uso' (baixa por ordem de serviço), 'estorno' (ordem cancelada
+#           ou item removido) ou 'reposicao' (entrada de estoque)
+estoque_alterado = Signal()
+
+# Enviado pelo PecaManager quando uma baixa é recusada por falta de estoque;
+# a transação em volta costuma ser desfeita em seguida.
+#   demanda: {peca_id: quantidade pedida}
+estoque_insuficiente = Signal()
+
+# Enviado no post_save de Orcamento e OrdemServico quando o status muda
+# (ou na criação, com anterior=None), depois da baixa de estoque da conclusão.
+#   instance, anterior, novo
+#   data_anterior: data_aprovacao (Orcamento) ou data_conclusao (OrdemServico)
+#                  de antes do save, que pode já ter sido limpa
+status_alterado = Signal()
@@ -1,3 +1,1621 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+import warnings
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import F, Max, Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import conclusao, eventos, roteamento, views
+from .cache import CacheCatalogo, catalogo
+from .management.commands import bench_indices
+from .periodo import filtrar_periodo, periodo_relativo
+from .instrumentacao import InstrumentacaoMiddleware, metricas
+from .roteamento import RoteadorReplica
+from .models import (
+    Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca, EventoStatus, Alteracao, EstoqueInsuficiente,
+    ResumoDiarioMecanico, ResumoStatusOrdem, ConsumoDiarioPeca, TarefaConclusao,
+)
 
 # Create your tests here.
+
+
+def criar_dados(linhas=5):
+    # cenário com várias linhas por model para que uma query por linha apareça na contagem
+    gerente = Usuario.objects.create(username='gerente', tipo='gerente', cpf='000', telefone='0')
+    mecanico = Usuario.objects.create(username='mecanico', tipo='mecanico', cpf='001', telefone='0')
+    pecas = [
+        Peca.objects.create(
+            codigo=f'P{i}', nome=f'Peça {i}', descricao='Peça de teste', fabricante='Fab',
+            quantidade_estoque=100, preco_unitario='10.00'
+        )
+        for i in range(linhas)
+    ]
+    for i in range(linhas):
+        cliente = Usuario.objects.create(username=f'cliente{i}', tipo='cliente', cpf=f'1{i}', telefone='0')
+        veiculo = Veiculo.objects.create(
+            placa=f'ABC{i:04d}', marca='Honda', modelo='Civic', ano=2020, cor='Prata', cliente=cliente
+        )
+        orcamento = Orcamento.objects.create(
+            veiculo=veiculo, mecanico_responsavel=mecanico,
+            data_validade=timezone.now().date() + timedelta(days=10),
+            descricao_problema='Revisão completa com troca de peças', valor_mao_obra=Decimal('50.00'),
+            status='aprovado'
+        )
+        ordem = OrdemServico.objects.create(
+            orcamento=orcamento, data_inicio=timezone.now(), data_previsao=timezone.now().date(),
+            km_entrada=1000, status='em_andamento'
+        )
+        for peca in pecas:
+            ItemPeca.objects.create(ordem_servico=ordem, peca=peca, quantidade=1, preco_unitario_cobrado='10.00')
+    return gerente
+
+
+class QueryBudgetTests(TestCase):
+    # Número máximo de queries por endpoint, independente do número de linhas.
+    # Se uma mudança em serializer criar uma query por linha, estes testes falham.
+    ORCAMENTO = {
+        '/api/usuarios/': 1,
+        '/api/veiculos/': 1,
+        '/api/pecas/': 1,
+        '/api/orcamentos/': 1,
+        '/api/ordens-servico/': 2,
+        '/api/itens-peca/': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def test_listagens_dentro_do_orcamento(self):
+        for url, maximo in self.ORCAMENTO.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(maximo):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_detalhe_ordem_servico(self):
+        ordem = OrdemServico.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/ordens-servico/{ordem.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['itens_pecas']), 5)
+
+
+class PaginacaoTests(TestCase):
+    # cursor keyset: ida e volta pelas páginas sem pular nem repetir linhas
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(7)
+        # data_conclusao anulável, com empates para o desempate por id
+        agora = timezone.now()
+        ordens = list(OrdemServico.objects.order_by('pk'))
+        for ordem, dias in zip(ordens, [2, None, 1, 2, None, 3, 1]):
+            OrdemServico.objects.filter(pk=ordem.pk).update(
+                data_conclusao=None if dias is None else agora - timedelta(days=dias)
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def obter(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def percorrer(self, url):
+        """ids página a página até o fim e, pelos links previous, de volta ao começo."""
+        ida, paginas = [], []
+        while url:
+            dados = self.obter(url)
+            paginas.append([linha['id'] for linha in dados['results']])
+            ida += paginas[-1]
+            ultima, url = dados, dados['next']
+        volta = []
+        url = ultima['previous']
+        while url:
+            dados = self.obter(url)
+            volta.insert(0, [linha['id'] for linha in dados['results']])
+            url = dados['previous']
+        self.assertEqual(volta, paginas[:-1])
+        return ida
+
+    def test_ida_e_volta(self):
+        esperado = list(OrdemServico.objects.order_by('-data_inicio', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.percorrer('/api/ordens-servico/?fields=id&page_size=2'), esperado)
+
+    def test_ordenacao_por_campo_anulavel(self):
+        # NULLs no fim nas duas direções, empates desfeitos por id
+        crescente = list(OrdemServico.objects.order_by(
+            F('data_conclusao').asc(nulls_last=True), 'id').values_list('pk', flat=True))
+        decrescente = list(OrdemServico.objects.order_by(
+            F('data_conclusao').desc(nulls_last=True), '-id').values_list('pk', flat=True))
+        for ordering, esperado in (('data_conclusao', crescente), ('-data_conclusao', decrescente)):
+            with self.subTest(ordering=ordering):
+                url = f'/api/ordens-servico/?fields=id&page_size=2&ordering={ordering}'
+                self.assertEqual(self.percorrer(url), esperado)
+
+    def test_cursor_adulterado(self):
+        proxima = self.obter('/api/ordens-servico/?page_size=2')['next']
+        cursor = parse_qs(urlsplit(proxima).query)['cursor'][0]
+        dados = json.loads(base64.urlsafe_b64decode(cursor))
+
+        def com_cursor(valor):
+            return self.client.get('/api/ordens-servico/', {'page_size': 2, 'cursor': valor}).status_code
+
+        self.assertEqual(com_cursor(cursor[:-4] + 'xxxx'), 404)
+        self.assertEqual(com_cursor('nao-e-base64!'), 404)
+        for adulterado in ({**dados, 'p': ['ontem', 'abc']}, {**dados, 'p': dados['p'][:1]}, {'p': dados['p']}):
+            with self.subTest(cursor=adulterado):
+                valor = base64.urlsafe_b64encode(json.dumps(adulterado).encode()).decode()
+                self.assertEqual(com_cursor(valor), 404)
+
+    def test_cursor_de_outra_ordenacao(self):
+        proxima = self.obter('/api/ordens-servico/?page_size=2&ordering=data_conclusao')['next']
+        cursor = parse_qs(urlsplit(proxima).query)['cursor'][0]
+        response = self.client.get('/api/ordens-servico/', {'cursor': cursor, 'ordering': '-data_inicio'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/ordens-servico/', {'cursor': cursor, 'ordering': 'data_conclusao'})
+        self.assertEqual(response.status_code, 200)
+
+
+class EstoqueTests(TestCase):
+    # baixa com UPDATE condicional: nunca abaixo de zero, status junto com a quantidade
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados(1)
+        cls.peca = Peca.objects.create(
+            codigo='EST', nome='Estoque', descricao='x', fabricante='Fab', quantidade_estoque=3,
+            estoque_minimo=1, preco_unitario='5.00'
+        )
+
+    def linha(self):
+        return Peca.objects.values('quantidade_estoque', 'status', 'abaixo_minimo', 'atualizado_em').get(pk=self.peca.pk)
+
+    def test_baixa_acima_do_estoque_nao_muda_a_linha(self):
+        antes = self.linha()
+        self.assertFalse(Peca.objects.reduzir_estoque(self.peca.pk, 4))
+        self.assertEqual(self.linha(), antes)
+        self.assertFalse(Peca.objects.reduzir_estoque(0, 1))
+
+    def test_status_esgotado_e_de_volta(self):
+        self.assertTrue(self.peca.reduzir_estoque(2))
+        self.assertEqual((self.peca.quantidade_estoque, self.peca.status, self.peca.abaixo_minimo), (1, 'disponivel', True))
+        self.assertTrue(self.peca.reduzir_estoque(1))
+        self.assertEqual((self.peca.quantidade_estoque, self.peca.status), (0, 'esgotado'))
+        self.assertFalse(self.peca.reduzir_estoque(1))
+        self.peca.adicionar_estoque(5)
+        self.assertEqual((self.peca.quantidade_estoque, self.peca.status, self.peca.abaixo_minimo), (5, 'disponivel', False))
+        # descontinuada continua descontinuada enquanto houver estoque
+        Peca.objects.filter(pk=self.peca.pk).update(status='descontinuado')
+        self.peca.reduzir_estoque(2)
+        self.peca.adicionar_estoque(1)
+        self.assertEqual((self.peca.quantidade_estoque, self.peca.status), (4, 'descontinuado'))
+
+    def test_segunda_confirmacao_do_item_nao_baixa_de_novo(self):
+        ordem = OrdemServico.objects.first()
+        item = ItemPeca.objects.create(ordem_servico=ordem, peca=self.peca, quantidade=2, preco_unitario_cobrado='5.00')
+        # outra instância do mesmo item, carregada antes da primeira baixa
+        concorrente = ItemPeca.objects.get(pk=item.pk)
+        self.assertTrue(item.confirmar_uso_estoque())
+        self.assertFalse(item.confirmar_uso_estoque())
+        self.assertFalse(concorrente.confirmar_uso_estoque())
+        self.assertTrue(concorrente.estoque_reduzido)
+        self.assertEqual(self.linha()['quantidade_estoque'], 1)
+
+
+class ReservaEstoqueTests(TestCase):
+    # conclusão da ordem: baixa de todos os itens com um número fixo de statements
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados(1)
+        cls.ordem = OrdemServico.objects.get()
+        cls.ordem.itens_pecas.all().delete()
+        cls.pecas = [
+            Peca.objects.create(
+                codigo=f'R{i}', nome=f'Reserva {i}', descricao='x', fabricante='Fab', quantidade_estoque=10,
+                preco_unitario='5.00'
+            )
+            for i in range(6)
+        ]
+
+    def adicionar_itens(self, quantidades):
+        ItemPeca.objects.bulk_create([
+            ItemPeca(ordem_servico=self.ordem, peca=peca, quantidade=quantidade, preco_unitario_cobrado='5.00')
+            for peca, quantidade in zip(self.pecas, quantidades)
+        ])
+
+    def estoques(self):
+        return list(Peca.objects.filter(codigo__startswith='R').order_by('codigo').values_list('quantidade_estoque', flat=True))
+
+    def contar_consultas(self, itens):
+        with transaction.atomic():
+            self.adicionar_itens([1] * itens)
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(self.ordem.confirmar_uso_estoque(), itens)
+            transaction.set_rollback(True)
+        return len(consultas)
+
+    def test_numero_fixo_de_consultas(self):
+        # leitura dos itens, SELECT FOR UPDATE, UPDATE das peças, marcação dos itens,
+        # change log e resumo de consumo: não cresce com o número de itens
+        consultas = self.contar_consultas(2)
+        self.assertEqual(self.contar_consultas(6), consultas)
+        self.adicionar_itens([1] * 6)
+        with self.assertNumQueries(consultas):
+            self.ordem.confirmar_uso_estoque()
+        self.assertEqual(self.estoques(), [9] * 6)
+        self.assertFalse(self.ordem.itens_pecas.filter(estoque_reduzido=False).exists())
+        # segunda chamada: nada pendente
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ordem.confirmar_uso_estoque(), 0)
+
+    def test_todas_as_faltas_no_erro(self):
+        self.adicionar_itens([11, 1, 12])
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            self.ordem.confirmar_uso_estoque()
+        self.assertEqual([(falta['peca'], falta['quantidade_necessaria'], falta['quantidade_disponivel'])
+                          for falta in erro.exception.pecas], [('R0', 11, 10), ('R2', 12, 10)])
+        self.assertEqual(self.estoques(), [10] * 6)
+        self.assertFalse(self.ordem.itens_pecas.filter(estoque_reduzido=True).exists())
+
+    def test_estoque_alterado_durante_a_baixa(self):
+        # a conferência passa, mas outra baixa leva o estoque antes do UPDATE
+        # e o devolve antes da releitura: conflito, não uma lista de faltas vazia
+        self.adicionar_itens([5, 5])
+        faltas = Peca.objects._faltas
+        chamadas = []
+
+        def concorrente(pecas, demanda):
+            if chamadas:
+                Peca.objects.filter(pk=self.pecas[1].pk).update(quantidade_estoque=10)
+                pecas = list(Peca.objects.filter(pk__in=demanda))
+            chamadas.append(faltas(pecas, demanda))
+            if len(chamadas) == 1:
+                Peca.objects.filter(pk=self.pecas[1].pk).update(quantidade_estoque=0)
+            return chamadas[-1]
+
+        with mock.patch.object(Peca.objects, '_faltas', side_effect=concorrente):
+            with self.assertRaises(ValidationError) as erro:
+                self.ordem.confirmar_uso_estoque()
+            self.assertNotIsInstance(erro.exception, EstoqueInsuficiente)
+            self.assertEqual(chamadas, [[], []])
+            self.assertEqual(self.estoques(), [10] * 6)
+
+            chamadas.clear()
+            codigo, corpo = conclusao.concluir_ordem(self.ordem.pk)
+        self.assertEqual(codigo, 409)
+        self.assertIn('Tente novamente', corpo['erro'])
+        self.assertEqual(OrdemServico.objects.get(pk=self.ordem.pk).status, 'em_andamento')
+
+
+class BuscaTests(TestCase):
+    # ?search= pelo índice textual: sem acento, por prefixo, por relevância e sempre em dia
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+        cls.mecanico = Usuario.objects.get(username='mecanico')
+
+        def peca(codigo, nome, fabricante='Fab'):
+            return Peca.objects.create(
+                codigo=codigo, nome=nome, descricao='x', fabricante=fabricante, quantidade_estoque=1,
+                preco_unitario='5.00'
+            )
+        cls.pastilha = peca('FR1', 'Pastilha de Freio')
+        cls.freio = peca('FR2', 'Freio')
+        cls.disco = peca('FR3', 'Disco do freio dianteiro com sensor de desgaste', 'Frenagem Peças')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+        catalogo.local.limpar()
+
+    def buscar(self, url, busca, campo='id', **params):
+        response = self.client.get(url, {'search': busca, 'page_size': 500, **params})
+        self.assertEqual(response.status_code, 200)
+        return [linha[campo] for linha in response.data['results']]
+
+    def test_sem_acento_e_por_prefixo(self):
+        por_peca = self.buscar('/api/pecas/', 'PECA', 'codigo')
+        self.assertIn('FR3', por_peca)
+        self.assertEqual(self.buscar('/api/pecas/', 'peça', 'codigo'), por_peca)
+        self.assertEqual(set(self.buscar('/api/pecas/', 'frei', 'codigo')), {'FR1', 'FR2', 'FR3'})
+        # todos os termos precisam casar
+        self.assertEqual(self.buscar('/api/pecas/', 'freio dianteiro', 'codigo'), ['FR3'])
+        self.assertEqual(self.buscar('/api/pecas/', 'freio nada', 'codigo'), [])
+        self.assertEqual(self.buscar('/api/veiculos/', 'honda abc0001', 'placa'), ['ABC0001'])
+
+    def test_ordenacao_por_relevancia(self):
+        # bm25/ts_rank: o documento mais curto com o termo vem antes
+        self.assertEqual(self.buscar('/api/pecas/', 'freio', 'codigo'), ['FR2', 'FR1', 'FR3'])
+        # com ?ordering= vale a ordenação pedida
+        self.assertEqual(self.buscar('/api/pecas/', 'freio', 'codigo', ordering='-nome'), ['FR1', 'FR2', 'FR3'])
+
+    def test_cursor_com_relevancia(self):
+        # muitos empates de relevância: a página seguinte não repete nem pula linhas
+        for i in range(7):
+            Peca.objects.create(codigo=f'EMP{i}', nome='Junta', descricao='x', fabricante='Fab', quantidade_estoque=1,
+                                preco_unitario='5.00')
+        Peca.objects.create(codigo='EMP9', nome='Junta da tampa', descricao='x', fabricante='Fab',
+                            quantidade_estoque=1, preco_unitario='5.00')
+        todas = self.buscar('/api/pecas/', 'junta', 'codigo')
+        self.assertEqual(len(todas), 8)
+        paginas, url = [], f'/api/pecas/?search=junta&page_size=3'
+        while url:
+            dados = self.client.get(url).data
+            paginas += [linha['codigo'] for linha in dados['results']]
+            url = dados['next']
+        self.assertEqual(paginas, todas)
+
+    def test_indice_acompanha_as_escritas(self):
+        self.freio.nome = 'Embreagem'
+        self.freio.save()
+        self.assertNotIn('FR2', self.buscar('/api/pecas/', 'freio', 'codigo'))
+        self.assertEqual(self.buscar('/api/pecas/', 'embreagem', 'codigo'), ['FR2'])
+        self.freio.delete()
+        self.assertEqual(self.buscar('/api/pecas/', 'embreagem', 'codigo'), [])
+
+        veiculo = Veiculo.objects.get(placa='ABC0000')
+        orcamento = Orcamento.objects.create(
+            veiculo=veiculo, mecanico_responsavel=self.mecanico, data_validade=timezone.localdate(),
+            descricao_problema='Barulho na suspensão traseira', valor_mao_obra=Decimal('10.00')
+        )
+        self.assertEqual(self.buscar('/api/orcamentos/', 'suspensao', 'id'), [orcamento.pk])
+        orcamento.descricao_problema = 'Troca de óleo'
+        orcamento.save()
+        self.assertEqual(self.buscar('/api/orcamentos/', 'suspensao', 'id'), [])
+        # placa faz parte do documento do orçamento
+        veiculo.placa = 'XYZ9999'
+        veiculo.save()
+        self.assertIn(orcamento.pk, self.buscar('/api/orcamentos/', 'xyz9999 oleo', 'id'))
+        orcamento.delete()
+        self.assertEqual(self.buscar('/api/orcamentos/', 'xyz9999 oleo', 'id'), [])
+
+
+class ReposicaoTests(TestCase):
+    # flag abaixo_minimo mantida nas movimentações e fila de reposição pelo consumo recente
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(1)
+        Peca.objects.update(quantidade_estoque=100)
+
+        def peca(codigo, nome, estoque, minimo, **extra):
+            return Peca.objects.create(
+                codigo=codigo, nome=nome, descricao='x', fabricante='Fab', quantidade_estoque=estoque,
+                estoque_minimo=minimo, preco_unitario='5.00', **extra
+            )
+        cls.filtro = peca('F1', 'Filtro', 2, 5)
+        cls.vela = peca('V1', 'Vela', 1, 3)
+        peca('D1', 'Descontinuada', 0, 5, status='descontinuado')
+        cls.folgada = peca('L1', 'Lâmpada', 50, 5)
+
+        hoje = timezone.localdate()
+        ConsumoDiarioPeca.objects.bulk_create([
+            ConsumoDiarioPeca(data=hoje, peca=cls.filtro, quantidade=10),
+            ConsumoDiarioPeca(data=hoje - timedelta(days=29), peca=cls.filtro, quantidade=5),
+            # fora da janela de 30 dias
+            ConsumoDiarioPeca(data=hoje - timedelta(days=30), peca=cls.filtro, quantidade=100),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def fila(self, **params):
+        response = self.client.get('/api/pecas/reposicao/', params)
+        self.assertEqual(response.status_code, 200)
+        return {peca['codigo']: peca for peca in response.data['pecas']}
+
+    def flag(self, peca):
+        return Peca.objects.values_list('abaixo_minimo', flat=True).get(pk=peca.pk)
+
+    def test_janela_e_cobertura(self):
+        fila = self.fila(dias=30, cobertura=14)
+        self.assertEqual(list(fila), ['F1', 'V1'])
+        # 15 em 30 dias: 0,5/dia, 14 dias de cobertura -> mínimo 5 + 7 - estoque 2
+        self.assertEqual((fila['F1']['consumo_periodo'], fila['F1']['consumo_medio_diario']), (15, 0.5))
+        self.assertEqual(fila['F1']['quantidade_sugerida'], 10)
+        # sem consumo: só volta ao mínimo
+        self.assertEqual(fila['V1']['quantidade_sugerida'], 2)
+
+        # 10 em 7 dias: 1,43/dia, 10 dias -> ceil(14,3) = 15, alvo 20
+        fila = self.fila(dias=7, cobertura=10)
+        self.assertEqual((fila['F1']['consumo_periodo'], fila['F1']['consumo_medio_diario']), (10, 1.43))
+        self.assertEqual(fila['F1']['quantidade_sugerida'], 18)
+        self.assertEqual(self.fila(dias=1, cobertura=0)['F1']['quantidade_sugerida'], 3)
+
+        for params in ({'dias': 0}, {'cobertura': -1}, {'dias': 'x'}):
+            self.assertEqual(self.client.get('/api/pecas/reposicao/', params).status_code, 400)
+
+    def test_flag_nas_movimentacoes(self):
+        # 50 -> 5: chega no mínimo
+        self.assertFalse(self.flag(self.folgada))
+        Peca.objects.reduzir_estoque(self.folgada.pk, 45)
+        self.assertTrue(self.flag(self.folgada))
+        Peca.objects.adicionar_estoque(self.folgada.pk, 1)
+        self.assertFalse(self.flag(self.folgada))
+        # baixa recusada não mexe na flag
+        Peca.objects.reduzir_estoque(self.filtro.pk, 3)
+        self.assertTrue(self.flag(self.filtro))
+        Peca.objects.adicionar_estoque(self.filtro.pk, 5)
+        self.assertFalse(self.flag(self.filtro))
+
+        # baixa em lote da conclusão
+        Peca.objects.reservar_estoque({self.folgada.pk: 1, self.filtro.pk: 1})
+        self.assertEqual((self.flag(self.folgada), self.flag(self.filtro)), (True, False))
+        self.assertEqual(set(self.fila()), {'L1', 'V1'})
+        self.assertEqual(list(Peca.objects.filter(abaixo_minimo=True).order_by('codigo').values_list('codigo', flat=True)),
+                         ['D1', 'L1', 'V1'])
+
+    def test_flag_no_lote(self):
+        response = self.client.post('/api/pecas/lote/', [
+            {'codigo': 'F1', 'quantidade_estoque': 40},
+            {'codigo': 'V1', 'estoque_minimo': 0},
+            {'codigo': 'L1', 'estoque_minimo': 60},
+            {'codigo': 'N1', 'nome': 'Nova', 'descricao': 'x', 'fabricante': 'Fab', 'preco_unitario': '1.00',
+             'quantidade_estoque': 1, 'estoque_minimo': 2},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(self.fila()), {'L1', 'N1'})
+
+
+class RelatoriosTests(TestCase):
+    # tabelas de resumo mantidas nas transições batem com um recálculo do zero
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(6)
+
+    def resumos(self):
+        status = dict(
+            ResumoStatusOrdem.objects.values('status').annotate(total=Sum('quantidade'))
+            .filter(total__gt=0).values_list('status', 'total')
+        )
+        # linhas zeradas pelas reversões não existem no recálculo
+        diarios = list(
+            ResumoDiarioMecanico.objects.exclude(orcamentos_aprovados=0, ordens_concluidas=0).order_by('data', 'mecanico_id')
+            .values_list('data', 'mecanico_id', 'orcamentos_aprovados', 'valor_aprovado', 'ordens_concluidas', 'valor_concluido')
+        )
+        consumo = dict(
+            ConsumoDiarioPeca.objects.values('peca_id').annotate(total=Sum('quantidade'))
+            .filter(total__gt=0).values_list('peca_id', 'total')
+        )
+        return status, diarios, consumo
+
+    def test_transicoes_batem_com_o_recalculo(self):
+        ordens = list(OrdemServico.objects.order_by('pk'))
+        for ordem in ordens[:4]:
+            self.assertEqual(conclusao.concluir_ordem(ordem.pk)[0], 200)
+        # concluída e depois cancelada: sai das conclusões e o estoque volta
+        cancelada = OrdemServico.objects.get(pk=ordens[0].pk)
+        cancelada.status = 'cancelado'
+        cancelada.save()
+        # concluída e removida
+        OrdemServico.objects.get(pk=ordens[1].pk).delete()
+        OrdemServico.objects.get(pk=ordens[4].pk).delete()
+
+        incremental = self.resumos()
+        self.assertEqual(incremental[0], {'concluido': 2, 'cancelado': 1, 'em_andamento': 1})
+        self.assertEqual(sum(linha[4] for linha in incremental[1]), 2)
+        call_command('recalcular_relatorios', stdout=mock.MagicMock())
+        self.assertEqual(self.resumos(), incremental)
+
+    def recalculado(self):
+        incremental = self.resumos()
+        call_command('recalcular_relatorios', stdout=mock.MagicMock())
+        self.assertEqual(self.resumos(), incremental)
+        return incremental[1]
+
+    def test_aprovacao_desfeita_sai_do_dia_da_aprovacao(self):
+        ontem = timezone.now() - timedelta(days=1)
+        existente = Orcamento.objects.first()
+        orcamento = Orcamento.objects.create(
+            veiculo=existente.veiculo, mecanico_responsavel=existente.mecanico_responsavel,
+            data_validade=timezone.now().date() + timedelta(days=10),
+            descricao_problema='Freio', valor_mao_obra=Decimal('80.00')
+        )
+        with mock.patch('django.utils.timezone.now', return_value=ontem):
+            self.assertTrue(orcamento.aprovar()[0])
+        self.client.force_login(self.gerente)
+        url = f'/api/orcamentos/{orcamento.pk}/'
+
+        # PATCH de volta para pendente desconta no dia da aprovação, não hoje
+        self.assertEqual(self.client.patch(url, {'status': 'pendente'}, content_type='application/json').status_code, 200)
+        self.assertNotIn(timezone.localdate(ontem), [linha[0] for linha in self.recalculado()])
+        # aprovado de novo conta uma vez só, hoje
+        self.assertEqual(self.client.patch(url, {'status': 'aprovado'}, content_type='application/json').status_code, 200)
+        aprovados = sum(linha[2] for linha in self.recalculado())
+        self.assertEqual(aprovados, 7)
+
+        Orcamento.objects.get(pk=orcamento.pk).delete()
+        self.assertEqual(sum(linha[2] for linha in self.recalculado()), 6)
+
+    def test_cancelamento_desconta_no_dia_da_conclusao(self):
+        ontem = timezone.now() - timedelta(days=1)
+        OrdemServico.objects.update(data_inicio=ontem - timedelta(hours=1))
+        ordem = OrdemServico.objects.first()
+        with mock.patch('django.utils.timezone.now', return_value=ontem):
+            self.assertTrue(ordem.concluir()[0])
+        # quem cancela limpa data_conclusao antes do save
+        ordem.status = 'cancelado'
+        ordem.data_conclusao = None
+        ordem.save()
+        self.assertEqual(sum(linha[4] for linha in self.recalculado()), 0)
+
+    def test_transicoes_espalhadas_pelas_fatias(self):
+        with override_settings(RELATORIOS_FATIAS=4):
+            for ordem in OrdemServico.objects.all():
+                conclusao.concluir_ordem(ordem.pk)
+        fatias = ResumoStatusOrdem.objects.filter(status='concluido').values_list('fatia', flat=True)
+        self.assertLessEqual(set(fatias), {0, 1, 2, 3})
+        self.client.force_login(self.gerente)
+        self.assertEqual(self.client.get('/api/relatorios/').json()['ordens_por_status'], {'concluido': 6})
+
+
+class LoteTests(TestCase):
+    # /api/pecas/lote/: criação e atualização misturadas, erros por linha e status pelo estoque
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def nova(self, codigo, **extra):
+        return {'codigo': codigo, 'nome': codigo, 'descricao': 'x', 'fabricante': 'Fab', 'preco_unitario': '1.00', **extra}
+
+    def status(self):
+        return dict(Peca.objects.values_list('codigo', 'status'))
+
+    def test_cria_atualiza_e_recalcula_status(self):
+        response = self.client.post('/api/pecas/lote/', [
+            {'codigo': 'P0', 'quantidade_estoque': 0},
+            {'codigo': 'P1', 'nome': 'Renomeada'},
+            self.nova('N0', quantidade_estoque=0),
+            self.nova('N1', quantidade_estoque=5),
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['criadas'], response.data['atualizadas']), (2, 2))
+        self.assertEqual(self.status(), {'P0': 'esgotado', 'P1': 'disponivel', 'N0': 'esgotado', 'N1': 'disponivel'})
+        self.assertEqual(Peca.objects.get(codigo='P1').nome, 'Renomeada')
+
+        # reposição pelo lote devolve a peça esgotada ao catálogo
+        response = self.client.post('/api/pecas/lote/', [{'codigo': 'P0', 'quantidade_estoque': 3}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.status()['P0'], 'disponivel')
+
+    def test_erros_por_linha_sem_gravar_nada(self):
+        response = self.client.post('/api/pecas/lote/', [
+            {'codigo': 'P0', 'preco_unitario': 'caro'},
+            {'nome': 'Sem código'},
+            {'nome': 'Outra sem código'},
+            {'codigo': 'P1', 'nome': 'Primeira'},
+            {'codigo': 'P1', 'nome': 'Repetida'},
+            'texto',
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        erros = {linha['linha']: linha['erros'] for linha in response.data['linhas']}
+        self.assertEqual(sorted(erros), [0, 1, 2, 4, 5])
+        self.assertIn('preco_unitario', erros[0])
+        # linhas sem código não se acusam como repetidas
+        self.assertEqual([str(e) for e in erros[2]['codigo']], [str(e) for e in erros[1]['codigo']])
+        self.assertIn('repetido', str(erros[4]['codigo'][0]))
+        self.assertIn('non_field_errors', erros[5])
+        self.assertEqual(set(Peca.objects.values_list('nome', flat=True)), {'Peça 0', 'Peça 1'})
+
+
+class ExportacaoTests(TestCase):
+    # exportar/ e alteracoes/ sob ASGI: iterador assíncrono, sem o Django juntar o corpo em memória
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(3)
+
+    async def ler_asgi(self, url):
+        client = AsyncClient()
+        await client.aforce_login(self.gerente)
+        response = await client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        # "StreamingHttpResponse must consume synchronous iterators" vira erro
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            return b''.join([parte async for parte in response])
+
+    def test_mesmo_corpo_que_sob_wsgi(self):
+        self.client.force_login(self.gerente)
+        for url in ['/api/orcamentos/exportar/', '/api/orcamentos/exportar/?formato=ndjson',
+                    '/api/alteracoes/?desde=0']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.is_async)
+                corpo = b''.join(response.streaming_content)
+                self.assertGreaterEqual(len(corpo.splitlines()), 3)
+                self.assertEqual(async_to_sync(self.ler_asgi)(url), corpo)
+
+
+class IndicesTests(TestCase):
+    # cada consulta das listagens usa o índice feito para ela (EXPLAIN do SQLite)
+
+    PLANOS = {
+        'orcamentos (gerente)': 'orcamento_data_idx',
+        'orcamentos (mecanico)': 'orcamento_mecanico_data_idx',
+        'orcamentos ?status=': 'orcamento_status_data_idx',
+        'orcamentos pendentes vencidos': 'orcamento_status_validade_idx',
+        'orcamentos ?periodo=last_7d': 'orcamento_data_idx',
+        'ordens ?periodo=last_month&periodo_campo=data_conclusao': 'ordem_data_conclusao_idx',
+        'ordens ?status=': 'ordem_status_data_idx',
+        'veiculos': 'veiculo_ordem_idx',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados()
+
+    def test_consultas_usam_os_indices(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('planos conferidos no formato do EXPLAIN QUERY PLAN do SQLite')
+        consultas = bench_indices.Command().consultas(Usuario.objects.get(username='mecanico'))
+        semana = periodo_relativo('last_7d', timezone.localdate())
+        consultas['veiculos ?periodo=last_7d'] = lambda: filtrar_periodo(Veiculo.objects.all(), 'data_cadastro', *semana)
+        planos = dict(self.PLANOS, **{'veiculos ?periodo=last_7d': 'veiculo_data_cadastro_idx'})
+        for nome, indice in planos.items():
+            with self.subTest(consulta=nome):
+                self.assertIn(f'USING INDEX {indice} ', consultas[nome]().explain() + ' ')
+
+
+class PeriodoTests(TestCase):
+    # ?data_inicio=/?data_fim=/?periodo= viram [meia-noite local do início, meia-noite do dia seguinte ao fim)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(4)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def ids(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(linha['id'] for linha in response.json()['results'])
+
+    @override_settings(TIME_ZONE='America/Sao_Paulo')
+    def test_limites_na_meia_noite_local(self):
+        fuso = timezone.get_current_timezone()
+        momentos = [
+            datetime(2025, 3, 9, 23, 59, 59, 999999), datetime(2025, 3, 10, 0, 0),
+            datetime(2025, 3, 10, 23, 59, 59, 999999), datetime(2025, 3, 11, 0, 0),
+        ]
+        orcamentos = list(Orcamento.objects.order_by('pk').values_list('pk', flat=True))
+        for pk, momento in zip(orcamentos, momentos):
+            Orcamento.objects.filter(pk=pk).update(data_criacao=timezone.make_aware(momento, fuso))
+
+        # 10/03 00:00 em São Paulo é 03:00 UTC: o limite é o do fuso, não o do banco
+        self.assertEqual(self.ids('/api/orcamentos/', data_inicio='2025-03-10', data_fim='2025-03-10'), orcamentos[1:3])
+        self.assertEqual(self.ids('/api/orcamentos/', data_inicio='2025-03-10'), orcamentos[1:])
+        self.assertEqual(self.ids('/api/orcamentos/', data_fim='2025-03-09'), orcamentos[:1])
+
+    def test_periodos_relativos(self):
+        hoje = date(2025, 3, 15)
+        esperados = {
+            'last_7d': (date(2025, 3, 9), hoje),
+            'last_2w': (date(2025, 3, 2), hoje),
+            'today': (hoje, hoje),
+            'this_month': (date(2025, 3, 1), hoje),
+            'last_month': (date(2025, 2, 1), date(2025, 2, 28)),
+            'this_year': (date(2025, 1, 1), hoje),
+        }
+        for nome, periodo in esperados.items():
+            with self.subTest(periodo=nome):
+                self.assertEqual(periodo_relativo(nome, hoje), periodo)
+        for nome in ('last_0d', 'last_d', 'ontem'):
+            with self.assertRaises(ValidationError):
+                periodo_relativo(nome, hoje)
+
+        agora = timezone.now()
+        OrdemServico.objects.filter(pk=OrdemServico.objects.order_by('pk').first().pk).update(data_conclusao=agora)
+        self.assertEqual(len(self.ids('/api/ordens-servico/', periodo='today', periodo_campo='data_conclusao')), 1)
+        self.assertEqual(self.ids('/api/ordens-servico/', periodo='last_month', periodo_campo='data_conclusao'), [])
+
+    def test_parametros_invalidos(self):
+        for url, params in [
+            ('/api/orcamentos/', {'data_inicio': '2025-03-10', 'data_fim': '2025-03-01'}),
+            ('/api/orcamentos/', {'data_inicio': '2025-13-01'}),
+            ('/api/orcamentos/', {'data_fim': '10/03/2025'}),
+            ('/api/orcamentos/', {'periodo': 'last_0d'}),
+            ('/api/orcamentos/', {'periodo': 'today', 'data_inicio': '2025-03-10'}),
+            ('/api/ordens-servico/', {'periodo': 'today', 'periodo_campo': 'data_previsao'}),
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('erro', response.json())
+
+
+@override_settings(CONCLUSAO_POOL_LOCAL=False)
+class ConclusaoTests(TestCase):
+    # conclusão enfileirada: os testes rodam as tarefas na thread atual, sem o pool
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+        cls.ordem = OrdemServico.objects.order_by('pk').first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def enfileirar(self):
+        return self.client.post(f'/api/ordens-servico/{self.ordem.pk}/concluir/?assincrono=true')
+
+    def test_202_e_acompanhamento(self):
+        response = self.enfileirar()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertEqual(self.client.get(response['Location']).data['status'], 'pendente')
+
+        self.assertEqual(conclusao.processar_pendentes(), 1)
+        tarefa = self.client.get(response['Location']).data
+        self.assertEqual((tarefa['status'], tarefa['codigo_http']), ('concluida', 200))
+        self.assertEqual(tarefa['resultado']['ordem_servico_id'], self.ordem.pk)
+        self.assertEqual(OrdemServico.objects.get(pk=self.ordem.pk).status, 'concluido')
+
+    def test_uma_tarefa_ativa_por_ordem(self):
+        primeira = self.enfileirar().data['tarefa_id']
+        self.assertEqual(self.enfileirar().data['tarefa_id'], primeira)
+        self.assertEqual(conclusao.enfileirar(self.ordem, self.gerente), (TarefaConclusao.objects.get(pk=primeira), False))
+        # terminada a tarefa, a restrição não vale mais para ela
+        TarefaConclusao.objects.filter(pk=primeira).update(status='falhou')
+        tarefa, criada = conclusao.enfileirar(self.ordem, self.gerente)
+        self.assertTrue(criada)
+        self.assertNotEqual(tarefa.pk, primeira)
+
+    @override_settings(CONCLUSAO_MAX_TENTATIVAS=2)
+    def test_operational_error_volta_para_a_fila(self):
+        self.enfileirar()
+        with mock.patch.object(conclusao, 'concluir_ordem', side_effect=OperationalError('database is locked')):
+            conclusao.executar(conclusao.reservar_proxima())
+            tarefa = TarefaConclusao.objects.get()
+            self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+            # na última tentativa a tarefa falha com o erro
+            conclusao.executar(conclusao.reservar_proxima())
+        tarefa = TarefaConclusao.objects.get()
+        self.assertEqual((tarefa.status, tarefa.tentativas, tarefa.codigo_http), ('falhou', 2, 500))
+        self.assertIn('database is locked', tarefa.resultado['erro'])
+        self.assertIsNone(conclusao.reservar_proxima())
+
+    def test_abandonadas_voltam_na_partida_do_pool(self):
+        outra = OrdemServico.objects.order_by('pk').last()
+        antiga = TarefaConclusao.objects.create(
+            ordem_servico=self.ordem, solicitante=self.gerente, status='processando',
+            iniciada_em=timezone.now() - timedelta(seconds=301),
+        )
+        recente = TarefaConclusao.objects.create(
+            ordem_servico=outra, solicitante=self.gerente, status='processando', iniciada_em=timezone.now(),
+        )
+        with self.assertLogs('backend.conclusao', 'WARNING'):
+            conclusao.PoolConclusao(0, timeout_abandonadas=300).iniciar()
+        status = dict(TarefaConclusao.objects.values_list('pk', 'status'))
+        self.assertEqual((status[antiga.pk], status[recente.pk]), ('pendente', 'processando'))
+        self.assertEqual(conclusao.processar_pendentes(), 1)
+        self.assertEqual(OrdemServico.objects.get(pk=self.ordem.pk).status, 'concluido')
+
+
+class ReservaAutocommitTests(TransactionTestCase):
+    # reservar_estoque chamado fora de transação: o conflito desfaz a parte já baixada
+
+    def test_conflito_desfaz_a_baixa_parcial(self):
+        pecas = [
+            Peca.objects.create(
+                codigo=f'R{i}', nome=f'Reserva {i}', descricao='x', fabricante='Fab', quantidade_estoque=10,
+                preco_unitario='5.00'
+            )
+            for i in range(2)
+        ]
+        faltas = Peca.objects._faltas
+        chamadas = []
+
+        def concorrente(lidas, demanda):
+            # outra baixa leva a segunda peça depois da conferência e a devolve antes da releitura
+            chamadas.append(None)
+            if len(chamadas) == 1:
+                Peca.objects.filter(pk=pecas[1].pk).update(quantidade_estoque=0)
+            else:
+                Peca.objects.filter(pk=pecas[1].pk).update(quantidade_estoque=10)
+                lidas = list(Peca.objects.filter(pk__in=demanda))
+            return faltas(lidas, demanda)
+
+        with mock.patch.object(Peca.objects, '_faltas', side_effect=concorrente):
+            with self.assertRaises(ValidationError):
+                Peca.objects.reservar_estoque({pecas[0].pk: 5, pecas[1].pk: 5})
+        self.assertEqual(list(Peca.objects.order_by('pk').values_list('quantidade_estoque', flat=True)), [10, 10])
+
+
+class CacheCatalogoTests(TransactionTestCase):
+    # TransactionTestCase para que commit e rollback sejam de verdade (on_commit roda)
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create(username='gerente', tipo='gerente', cpf='000', telefone='0')
+        self.peca = Peca.objects.create(
+            codigo='P0', nome='Peça 0', descricao='Peça de teste', fabricante='Fab',
+            quantidade_estoque=100, preco_unitario='10.00'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+        catalogo.local.limpar()
+
+    def obter(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        return response['X-Cache'], dados['results'][0] if 'results' in dados else dados
+
+    def test_hit_e_invalidacao_depois_de_escrita(self):
+        for url in ['/api/pecas/', f'/api/pecas/{self.peca.pk}/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.obter(url)[0], 'MISS')
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.obter(url)[0], 'HIT')
+        Peca.objects.reduzir_estoque(self.peca.pk, 30)
+        for url in ['/api/pecas/', f'/api/pecas/{self.peca.pk}/']:
+            with self.subTest(url=url):
+                origem, peca = self.obter(url)
+                self.assertEqual((origem, peca['quantidade_estoque']), ('MISS', 70))
+
+    def test_rollback_nao_deixa_dado_sujo(self):
+        url = f'/api/pecas/{self.peca.pk}/'
+        with transaction.atomic():
+            self.peca.quantidade_estoque = 1
+            self.peca.save()
+            # a leitura dentro da transação vê o valor não commitado, mas não o guarda
+            self.assertEqual(self.obter(url)[1]['quantidade_estoque'], 1)
+            transaction.set_rollback(True)
+        origem, peca = self.obter(url)
+        self.assertEqual((origem, peca['quantidade_estoque']), ('MISS', 100))
+        self.assertEqual(self.obter(url)[0], 'HIT')
+
+    def test_entrada_local_expira(self):
+        url = f'/api/pecas/{self.peca.pk}/'
+        self.obter(url)
+        agora = time.monotonic()
+        with mock.patch('backend.cache.time.monotonic', return_value=agora + 31):
+            self.assertEqual(self.obter(url)[0], 'MISS')
+
+    def test_desligado_com_varios_processos_sem_backend(self):
+        with self.assertLogs('backend.cache', 'WARNING'):
+            cache = CacheCatalogo(10, processos=2)
+        calcular = mock.MagicMock(return_value={'a': 1})
+        self.assertEqual(cache.obter('lista', '/api/pecas/', calcular), ({'a': 1}, False))
+        self.assertEqual(cache.obter('lista', '/api/pecas/', calcular), ({'a': 1}, False))
+        self.assertEqual(calcular.call_count, 2)
+
+
+class EscopoTests(TestCase):
+    # cada tipo de usuário só recebe, do banco, as linhas que pode ver
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_dados()
+        cls.cliente = Usuario.objects.get(username='cliente0')
+        cls.mecanico = Usuario.objects.get(username='mecanico')
+        cls.outro_mecanico = Usuario.objects.create(username='mecanico2', tipo='mecanico', cpf='002', telefone='0')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def contar(self, usuario, url):
+        self.client.force_authenticate(usuario)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(response.data['results'])
+
+    def test_cliente_ve_apenas_o_que_e_seu(self):
+        self.assertEqual(self.contar(self.cliente, '/api/veiculos/'), 1)
+        self.assertEqual(self.contar(self.cliente, '/api/orcamentos/'), 1)
+        self.assertEqual(self.contar(self.cliente, '/api/ordens-servico/'), 1)
+        self.assertEqual(self.contar(self.cliente, '/api/itens-peca/'), 5)
+        self.assertEqual(self.contar(self.cliente, '/api/usuarios/'), 1)
+
+    def test_mecanico_ve_apenas_suas_ordens(self):
+        self.assertEqual(self.contar(self.mecanico, '/api/ordens-servico/'), 5)
+        self.assertEqual(self.contar(self.outro_mecanico, '/api/ordens-servico/'), 0)
+        self.assertEqual(self.contar(self.outro_mecanico, '/api/itens-peca/'), 0)
+
+    def test_detalhe_fora_do_escopo_e_404(self):
+        ordem = OrdemServico.objects.exclude(orcamento__veiculo__cliente=self.cliente).first()
+        self.client.force_authenticate(self.cliente)
+        self.assertEqual(self.client.get(f'/api/ordens-servico/{ordem.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/orcamentos/{ordem.orcamento_id}/').status_code, 404)
+
+
+class LeituraAssincronaTests(TestCase):
+    # list/retrieve async respondem exatamente o mesmo que as views síncronas
+
+    VIEWSETS = {'/api/pecas/': views.PecaViewSet, '/api/veiculos/': views.VeiculoViewSet,
+                '/api/orcamentos/': views.OrcamentoViewSet}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados()
+        cls.cliente = Usuario.objects.get(username='cliente0')
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def responder(self, viewset, acao, url, usuario, assincrona, **kwargs):
+        with override_settings(LEITURA_ASSINCRONA=assincrona):
+            view = viewset.as_view({'get': acao})
+        request = self.factory.get(url)
+        if usuario is not None:
+            force_authenticate(request, usuario)
+        catalogo.local.limpar()
+        response = async_to_sync(view)(request, **kwargs) if assincrona else view(request, **kwargs)
+        return response.status_code, response.render().content
+
+    def comparar(self, viewset, acao, url, usuario=None, **kwargs):
+        sincrona = self.responder(viewset, acao, url, usuario, False, **kwargs)
+        self.assertEqual(self.responder(viewset, acao, url, usuario, True, **kwargs), sincrona)
+        return sincrona[0]
+
+    def test_listagem_e_detalhe_iguais_aos_sincronos(self):
+        for url, viewset in self.VIEWSETS.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.comparar(viewset, 'list', f'{url}?page_size=2', self.gerente), 200)
+                pk = viewset.queryset.model.objects.order_by('pk').values_list('pk', flat=True).last()
+                self.assertEqual(self.comparar(viewset, 'retrieve', f'{url}{pk}/', self.gerente, pk=pk), 200)
+
+    def test_escopo_e_permissoes(self):
+        orcamento = Orcamento.objects.exclude(veiculo__cliente=self.cliente).first()
+        url = f'/api/orcamentos/{orcamento.pk}/'
+        self.assertEqual(self.comparar(views.OrcamentoViewSet, 'retrieve', url, self.cliente, pk=orcamento.pk), 404)
+        self.assertEqual(self.comparar(views.OrcamentoViewSet, 'list', '/api/orcamentos/'), 403)
+        self.assertEqual(self.comparar(views.PecaViewSet, 'retrieve', '/api/pecas/0/', pk=0), 404)
+
+
+class ListaRapidaTests(TestCase):
+    # o caminho rápido (values_list) gera o mesmo JSON, byte a byte, que os serializers
+
+    URLS = [
+        '/api/veiculos/?page_size=2', '/api/veiculos/?ordering=-data_cadastro&page_size=3',
+        '/api/veiculos/?search=honda', '/api/pecas/?page_size=2', '/api/pecas/?ordering=-preco_unitario',
+        '/api/pecas/?search=peca&page_size=2',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados()
+        Peca.objects.filter(codigo='P0').update(quantidade_estoque=1, status='esgotado')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def obter(self, url, rapida):
+        catalogo.local.limpar()
+        with override_settings(LISTA_RAPIDA=rapida):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_mesmo_json_que_o_serializer(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                # a página seguinte pelo cursor também
+                while url:
+                    conteudo = self.obter(url, True)
+                    self.assertEqual(conteudo, self.obter(url, False))
+                    url = json.loads(conteudo)['next']
+
+
+class CamposTests(TestCase):
+    # ?fields=/?exclude=/?expand= mudam as chaves e também o que é lido do banco
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+        catalogo.local.limpar()
+
+    def obter(self, url, consultas):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        leitura = capturadas.captured_queries
+        self.assertEqual(len(leitura), consultas)
+        return response.data, ' '.join(query['sql'] for query in leitura)
+
+    def test_so_os_campos_pedidos(self):
+        dados, sql = self.obter('/api/veiculos/?fields=placa,modelo', 1)
+        self.assertEqual(list(dados['results'][0]), ['placa', 'modelo'])
+        self.assertNotIn('observacoes', sql)
+        self.assertNotIn('backend_usuario', sql)
+
+        dados, sql = self.obter('/api/pecas/?exclude=descricao', 1)
+        self.assertNotIn('descricao', dados['results'][0])
+        self.assertIn('em_estoque', dados['results'][0])
+        self.assertNotIn('descricao', sql)
+
+        dados, sql = self.obter('/api/orcamentos/?fields=id,status', 1)
+        self.assertEqual(list(dados['results'][0]), ['id', 'status'])
+        self.assertNotIn('descricao_problema', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_sem_itens_nao_faz_prefetch(self):
+        ordem = OrdemServico.objects.first()
+        dados, _ = self.obter(f'/api/ordens-servico/{ordem.pk}/?exclude=itens_pecas', 1)
+        self.assertNotIn('itens_pecas', dados)
+        self.assertEqual(dados['orcamento_info'], str(ordem.orcamento))
+
+    def test_expand(self):
+        dados, _ = self.obter('/api/veiculos/?fields=placa&expand=cliente', 1)
+        self.assertEqual(dados['results'][0]['cliente']['username'], 'cliente0')
+        dados, _ = self.obter('/api/ordens-servico/?fields=id&expand=orcamento', 1)
+        self.assertIn('veiculo_info', dados['results'][0]['orcamento'])
+
+    def test_campo_desconhecido(self):
+        self.assertEqual(self.client.get('/api/veiculos/?fields=placa,nada').status_code, 400)
+        self.assertEqual(self.client.get('/api/pecas/?expand=fabricante').status_code, 400)
+
+    def test_leitura_assincrona(self):
+        with override_settings(LEITURA_ASSINCRONA=True):
+            view = views.VeiculoViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/api/veiculos/?fields=placa&expand=cliente')
+        force_authenticate(request, self.gerente)
+        response = async_to_sync(view)(request)
+        self.assertEqual(list(response.data['results'][0]), ['placa', 'cliente'])
+
+
+class CondicionalTests(TestCase):
+    # ETag/Last-Modified: 304 com só a query do token, e token novo a cada escrita
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+        catalogo.local.limpar()
+
+    def nao_modificado(self, url, **cabecalhos):
+        with self.assertNumQueries(1):
+            response = self.client.get(url, **cabecalhos)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return response
+
+    def test_get_simples_sem_query_do_token(self):
+        for url, consultas in [('/api/pecas/', 1), ('/api/orcamentos/', 1), ('/api/ordens-servico/', 2)]:
+            with self.subTest(url=url):
+                catalogo.local.limpar()
+                with self.assertNumQueries(consultas):
+                    response = self.client.get(url)
+                self.assertEqual(response['ETag'], f'"{hashlib.md5(response.content).hexdigest()}"')
+                self.assertNotIn('Last-Modified', response)
+
+    def test_listagem_de_pecas(self):
+        # o ETag do GET simples (hash do corpo) vale um 304, que já traz o token
+        corpo = self.client.get('/api/pecas/')['ETag']
+        response = self.client.get('/api/pecas/', HTTP_IF_NONE_MATCH=corpo)
+        self.assertEqual(response.status_code, 304)
+        etag = response['ETag']
+        self.assertNotEqual(etag, corpo)
+        self.assertEqual(self.nao_modificado('/api/pecas/', HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+        # outra URL (filtro, página) tem outro ETag
+        self.assertEqual(self.client.get('/api/pecas/?page_size=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        Peca.objects.reduzir_estoque(Peca.objects.first().pk, 1)
+        response = self.client.get('/api/pecas/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.nao_modificado('/api/pecas/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_linha_fora_da_pagina_nao_muda_o_etag(self):
+        url = '/api/pecas/?page_size=2'
+        etag = self.client.get(url, HTTP_IF_NONE_MATCH='"x"')['ETag']
+        fora = Peca.objects.order_by('nome', 'pk').last()
+        Peca.objects.reduzir_estoque(fora.pk, 1)
+        self.nao_modificado(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_detalhe_da_ordem(self):
+        ordem = OrdemServico.objects.first()
+        url = f'/api/ordens-servico/{ordem.pk}/'
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"x"')
+        etag, ultima = response['ETag'], response['Last-Modified']
+        self.nao_modificado(url, HTTP_IF_NONE_MATCH=etag)
+        self.nao_modificado(url, HTTP_IF_MODIFIED_SINCE=ultima)
+
+        # remover um item e mexer no estoque de uma peça da ordem mudam o ETag
+        ordem.itens_pecas.first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Peca.objects.adicionar_estoque(ordem.itens_pecas.first().peca_id, 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_leitura_assincrona(self):
+        with override_settings(LEITURA_ASSINCRONA=True):
+            view = views.PecaViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        request = factory.get('/api/pecas/', HTTP_IF_NONE_MATCH='"x"')
+        force_authenticate(request, self.gerente)
+        etag = async_to_sync(view)(request)['ETag']
+
+        request = factory.get('/api/pecas/', HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, self.gerente)
+        self.assertEqual(async_to_sync(view)(request).status_code, 304)
+
+
+@override_settings(EVENTOS_INTERVALO=0.02, EVENTOS_DURACAO=0.5)
+class EventosTests(TestCase):
+    # outbox gravado junto com o status e entregue pelo feed SSE só a quem vê o orçamento
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+        cls.cliente = Usuario.objects.get(username='cliente0')
+        cls.mecanico = Usuario.objects.get(username='mecanico')
+        veiculo = Veiculo.objects.get(cliente=cls.cliente)
+        cls.pendente = Orcamento.objects.create(
+            veiculo=veiculo, mecanico_responsavel=cls.mecanico, data_validade=timezone.now().date() + timedelta(days=10),
+            descricao_problema='Freio', valor_mao_obra=Decimal('80.00')
+        )
+
+    def eventos(self, **filtros):
+        return list(EventoStatus.objects.filter(**filtros).values_list('tipo', 'status_anterior', 'status_novo'))
+
+    def test_transicoes_gravam_o_outbox(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        self.assertEqual(client.post(f'/api/orcamentos/{self.pendente.pk}/aprovar/').status_code, 200)
+        self.assertEqual(self.eventos(objeto_id=self.pendente.pk, tipo='orcamento')[-1], ('orcamento', 'pendente', 'aprovado'))
+
+        client.force_authenticate(self.mecanico)
+        response = client.post(f'/api/orcamentos/{self.pendente.pk}/gerar_ordem_servico/', {'km_entrada': 10})
+        ordem_id = response.data['id']
+        ItemPeca.objects.create(ordem_servico_id=ordem_id, peca=Peca.objects.first(), quantidade=1,
+                                preco_unitario_cobrado='10.00')
+        self.assertEqual(client.post(f'/api/ordens-servico/{ordem_id}/concluir/').status_code, 200)
+        self.assertEqual(self.eventos(objeto_id=ordem_id, tipo='ordem_servico'), [
+            ('ordem_servico', None, 'em_andamento'), ('ordem_servico', 'em_andamento', 'concluido'),
+        ])
+        self.assertEqual(EventoStatus.objects.filter(objeto_id=ordem_id).values_list('cliente', flat=True)[0],
+                         self.cliente.pk)
+
+    def test_status_e_evento_na_mesma_transacao(self):
+        with mock.patch.object(EventoStatus.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.pendente.aprovar()
+        self.pendente.refresh_from_db()
+        self.assertEqual(self.pendente.status, 'pendente')
+
+    async def ler(self, usuario, enquanto=None, headers=None):
+        client = AsyncClient()
+        await client.aforce_login(usuario)
+        response = await client.get('/api/eventos/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        partes = []
+        async for parte in response.streaming_content:
+            partes.append(parte.decode())
+            if enquanto is not None and len(partes) == 1:
+                await enquanto()
+        return ''.join(partes)
+
+    async def test_feed_com_last_event_id(self):
+        texto = await self.ler(self.cliente, headers={'Last-Event-ID': '0'})
+        ids = [int(linha[4:]) for linha in texto.splitlines() if linha.startswith('id: ')]
+        visiveis = [evento async for evento in EventoStatus.objects.filter(cliente=self.cliente).values_list('pk', flat=True)]
+        self.assertEqual(ids, visiveis)
+
+    async def test_mais_eventos_que_o_lote_dentro_da_janela(self):
+        # os já entregues ainda na janela não seguram os novos atrás deles
+        difusor = eventos.Difusor()
+        difusor.piso = (await EventoStatus.objects.aaggregate(ultimo=Max('pk')))['ultimo'] or 0
+        fila = asyncio.Queue()
+        difusor.filas[fila] = lambda evento: True
+
+        async def gravar(quantidade):
+            criados = await EventoStatus.objects.abulk_create([
+                EventoStatus(tipo='orcamento', objeto_id=self.pendente.pk, orcamento_id=self.pendente.pk,
+                             cliente_id=self.cliente.pk, mecanico_id=self.mecanico.pk, status_novo='pendente')
+                for _ in range(quantidade)
+            ])
+            return [evento.pk for evento in criados]
+
+        entregues = []
+        for quantidade in [difusor.lote + 2, 3]:
+            esperados = await gravar(quantidade)
+            await difusor.consultar()
+            recebidos = []
+            while not fila.empty():
+                recebidos.append(fila.get_nowait().pk)
+            entregues += recebidos
+            self.assertEqual(recebidos, esperados)
+        self.assertEqual(len(set(entregues)), difusor.lote + 5)
+
+    async def test_feed_ao_vivo(self):
+        async def aprovar():
+            await sync_to_async(self.pendente.aprovar)()
+
+        texto = await self.ler(self.cliente, enquanto=aprovar)
+        self.assertIn('"status": "aprovado"', texto)
+        self.assertIn('event: orcamento', texto)
+
+        # outro cliente não recebe
+        outro = await Usuario.objects.aget(username='cliente1')
+        texto = await self.ler(outro, headers={'Last-Event-ID': '0'})
+        self.assertNotIn(f'"orcamento_id": {self.pendente.pk},', texto)
+
+    def test_sem_asgi_e_sem_login(self):
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get('/api/eventos/').status_code, 501)
+        self.assertEqual(async_to_sync(AsyncClient().get)('/api/eventos/').status_code, 401)
+
+
+class AlteracoesTests(TestCase):
+    # change log gravado junto com a escrita e lido por offset
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+        cls.peca = Peca.objects.first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def ler(self, **params):
+        response = self.client.get('/api/alteracoes/', params)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(linha) for linha in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_escritas_e_movimentacoes_de_estoque(self):
+        inicio = Alteracao.objects.latest('pk').pk
+        self.peca.reduzir_estoque(3)
+        item = ItemPeca.objects.filter(peca=self.peca).first()
+        item_id = item.pk
+        item.delete()
+        response = self.client.post('/api/pecas/lote/', [
+            {'codigo': self.peca.codigo, 'estoque_minimo': 1},
+            {'codigo': 'NOVA', 'nome': 'Nova', 'descricao': 'x', 'fabricante': 'Fab', 'preco_unitario': '1.00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+
+        entradas = [(e['tabela'], e['objeto_id'], e['operacao']) for e in self.ler(desde=inicio)]
+        nova = Peca.objects.get(codigo='NOVA')
+        self.assertEqual(entradas, [
+            ('peca', self.peca.pk, 'estoque'), ('itempeca', item_id, 'remocao'),
+            ('peca', nova.pk, 'criacao'), ('peca', self.peca.pk, 'atualizacao'),
+        ])
+        estoque = Alteracao.objects.get(pk__gt=inicio, operacao='estoque')
+        self.assertEqual(estoque.detalhe, {'delta': -3, 'motivo': 'uso'})
+        self.assertEqual(estoque.dados['quantidade_estoque'], 97)
+
+    def test_escrita_e_entrada_na_mesma_transacao(self):
+        with mock.patch.object(Alteracao.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Peca.objects.get(pk=self.peca.pk).save()
+        with mock.patch.object(Alteracao.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.peca.adicionar_estoque(5)
+        self.assertEqual(Peca.objects.get(pk=self.peca.pk).quantidade_estoque, 100)
+
+    def test_leitura_por_offset(self):
+        todas = self.ler()
+        self.assertEqual([e['offset'] for e in todas], list(Alteracao.objects.values_list('pk', flat=True)))
+        self.assertEqual(self.ler(desde=todas[1]['offset'], limite=2), todas[2:4])
+        self.assertTrue(all(e['tabela'] == 'orcamento' for e in self.ler(tabela='orcamento')))
+        self.assertEqual(self.client.get('/api/alteracoes/', {'tabela': 'usuario'}).status_code, 400)
+
+        self.client.force_authenticate(Usuario.objects.get(username='mecanico'))
+        self.assertEqual(self.client.get('/api/alteracoes/').status_code, 403)
+
+    def test_compactacao_mantem_a_ultima_de_cada_objeto(self):
+        self.peca.reduzir_estoque(1)
+        self.peca.reduzir_estoque(1)
+        ItemPeca.objects.filter(peca=self.peca).first().delete()
+        ultimas = {(e['tabela'], e['objeto_id']): e for e in self.ler()}
+
+        call_command('compactar_alteracoes', stdout=mock.MagicMock())
+        self.assertEqual({(e['tabela'], e['objeto_id']): e for e in self.ler()}, ultimas)
+        self.assertEqual(Alteracao.objects.count(), len(ultimas))
+
+        call_command('compactar_alteracoes', remover_exclusoes=True, stdout=mock.MagicMock())
+        self.assertFalse(Alteracao.objects.filter(operacao='remocao').exists())
+
+
+class InstrumentacaoTests(TestCase):
+    # queries, tempos e repetições medidos por requisição e agregados por view
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+        metricas.zerar()
+
+    def test_cabecalhos_e_histogramas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/ordens-servico/')
+        total = len(consultas)
+        self.assertEqual(int(response['X-Consultas']), total)
+        self.assertEqual(response['X-Consultas-Repetidas'], '0')
+        self.assertRegex(response['Server-Timing'], r'^banco;dur=[\d.]+, serializacao;dur=[\d.]+, total;dur=[\d.]+$')
+
+        b''.join(self.client.get('/api/ordens-servico/exportar/').streaming_content)
+        por_view = self.client.get('/api/metricas/').data['views']
+        self.assertEqual(por_view['OrdemServicoViewSet.list']['consultas']['maximo'], total)
+        self.assertEqual(por_view['OrdemServicoViewSet.list']['bytes']['maximo'], len(response.content))
+        self.assertEqual(por_view['OrdemServicoViewSet.list']['status'], {'2xx': 1})
+        # streaming: registrado quando o corpo termina, com as queries feitas durante ele
+        self.assertGreater(por_view['OrdemServicoViewSet.exportar']['consultas']['maximo'], 0)
+        self.assertGreater(por_view['OrdemServicoViewSet.exportar']['bytes']['maximo'], 0)
+
+        self.client.force_authenticate(Usuario.objects.get(username='mecanico'))
+        self.assertEqual(self.client.get('/api/metricas/').status_code, 403)
+
+    def test_consultas_repetidas(self):
+        def view_n_mais_um(request):
+            for item in ItemPeca.objects.all():
+                item.peca.codigo
+            return HttpResponse()
+
+        itens = ItemPeca.objects.count()
+        response = InstrumentacaoMiddleware(view_n_mais_um)(APIRequestFactory().get('/'))
+        self.assertEqual(response['X-Consultas'], str(itens + 1))
+        self.assertEqual(response['X-Consultas-Repetidas'], str(itens - 1))
+        repetidas = metricas.como_dict()['views']['sem_view']['consultas_repetidas']
+        self.assertEqual([(r['vezes_max'], r['requisicoes']) for r in repetidas], [(itens, 1)])
+        self.assertIn('FROM "backend_peca"', repetidas[0]['sql'])
+
+    def test_requisicao_async(self):
+        client = AsyncClient()
+        client.force_login(self.gerente)
+        response = async_to_sync(client.get)('/api/pecas/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Consultas']), 0)
+        self.assertEqual(metricas.como_dict()['views']['PecaViewSet.list']['requisicoes'], 1)
+
+
+class ContadoresTests(TestCase):
+    # /metrics: contadores de negócio depois do commit, lidos sem tocar no banco
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gerente = criar_dados(2)
+
+    def ler(self, **headers):
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        valores = {}
+        for linha in response.content.decode().splitlines():
+            if linha and not linha.startswith('#'):
+                serie, valor = linha.rsplit(' ', 1)
+                valores[serie] = float(valor)
+        return valores
+
+    def test_transicoes_e_estoque_contam_depois_do_commit(self):
+        antes = self.ler()
+        peca = Peca.objects.first()
+        ordem = OrdemServico.objects.first()
+        with transaction.atomic():
+            ordem.concluir()
+            transaction.set_rollback(True)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrdemServico.objects.get(pk=ordem.pk).concluir()
+            peca.adicionar_estoque(5)
+        self.assertFalse(peca.reduzir_estoque(10 ** 6))
+
+        depois = self.ler()
+
+        def delta(serie):
+            return depois.get(serie, 0) - antes.get(serie, 0)
+        self.assertEqual(delta('oficina_ordem_servico_status_total{status="concluido"}'), 1)
+        self.assertEqual(delta('oficina_ordem_servico_execucao_segundos_count'), 1)
+        self.assertEqual(delta('oficina_estoque_movimentacoes_total{motivo="uso"}'), 2)
+        self.assertEqual(delta('oficina_estoque_unidades_total{motivo="reposicao"}'), 5)
+        self.assertEqual(delta('oficina_estoque_insuficiente_total'), 1)
+
+    def test_scrape_sem_banco(self):
+        self.client.force_login(self.gerente)
+        self.client.get('/api/pecas/')
+        with self.assertNumQueries(0):
+            valores = self.ler()
+        self.assertGreater(valores['oficina_http_requisicao_segundos_count{view="PecaViewSet.list"}'], 0)
+
+        with override_settings(METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.ler(authorization='Bearer segredo')
+
+
+class BancoTests(TestCase):
+    # roteamento da réplica de leitura
+
+    def test_roteador_replica(self):
+        roteador = RoteadorReplica()
+        # fora de um request roteado (comandos, workers, testes) tudo fica no default
+        self.assertEqual(roteador.db_for_read(Peca), 'default')
+        estado = roteamento.Estado()
+        estado.replica = 'replica'
+        token = roteamento._estado.set(estado)
+        try:
+            # TestCase roda tudo dentro de uma transação: leitura fica no default
+            self.assertEqual(roteador.db_for_read(Peca), 'default')
+            with mock.patch.object(connections['default'], 'in_atomic_block', False):
+                self.assertEqual(roteador.db_for_read(Peca), 'replica')
+                self.assertEqual(roteador.db_for_read(Session), 'default')
+                # depois da primeira escrita o request lê o que escreveu
+                self.assertEqual(roteador.db_for_write(Peca), 'default')
+                self.assertEqual(roteador.db_for_read(Peca), 'default')
+        finally:
+            roteamento._estado.reset(token)
+        self.assertTrue(roteador.allow_migrate('default', 'backend'))
+        # réplica SQLite é outro arquivo, com o próprio schema
+        self.assertTrue(roteador.allow_migrate('replica', 'backend'))
+
+
+@override_settings(REPLICAS_LEITURA=['replica'])
+class ReplicaTests(TransactionTestCase):
+    # dois bancos SQLite: o que só existe na réplica mostra de onde veio a leitura.
+    # TransactionTestCase porque dentro de transação as leituras ficam no principal
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.gerente = Usuario.objects.create(username='gerente', tipo='gerente', cpf='000', telefone='0')
+        self.cliente = Usuario.objects.create(username='cliente', tipo='cliente', cpf='100', telefone='0')
+        Veiculo.objects.create(placa='PRI0001', marca='Honda', modelo='Civic', ano=2020, cor='Prata', cliente=self.cliente)
+        # a réplica "atrasada": mesmo cliente, outro veículo; bulk_create não dispara sinais no default
+        Usuario.objects.using('replica').bulk_create([
+            Usuario(pk=self.gerente.pk, username='gerente', tipo='gerente', cpf='000', telefone='0'),
+            Usuario(pk=self.cliente.pk, username='cliente', tipo='cliente', cpf='100', telefone='0'),
+        ])
+        Veiculo.objects.using('replica').bulk_create([
+            Veiculo(placa='REP0001', marca='Fiat', modelo='Uno', ano=2010, cor='Branco', cliente_id=self.cliente.pk),
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.gerente)
+
+    def placas(self):
+        response = self.client.get('/api/veiculos/?fields=placa')
+        self.assertEqual(response.status_code, 200)
+        return sorted(veiculo['placa'] for veiculo in response.json()['results'])
+
+    async def exportar_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(self.gerente)
+        response = await client.get('/api/veiculos/exportar/')
+        return b''.join([parte async for parte in response]).decode()
+
+    def test_listagem_e_exportacao_leem_da_replica(self):
+        self.assertEqual(self.placas(), ['REP0001'])
+        corpo = b''.join(self.client.get('/api/veiculos/exportar/').streaming_content).decode()
+        self.assertIn('REP0001', corpo)
+        self.assertNotIn('PRI0001', corpo)
+        # sob ASGI os blocos rodam em thread e continuam na réplica
+        self.assertEqual(async_to_sync(self.exportar_asgi)(), corpo)
+        # ações fora de REPLICA_ACOES e viewsets com replica = False ficam no principal
+        with override_settings(REPLICA_ACOES=['retrieve']):
+            self.assertEqual(self.placas(), ['PRI0001'])
+
+    def test_escrita_fixa_a_sessao_no_principal(self):
+        response = self.client.post('/api/veiculos/', {
+            'placa': 'NOV0001', 'marca': 'VW', 'modelo': 'Gol', 'ano': 2015, 'cor': 'Preto',
+            'cliente': self.cliente.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        cookie = response.cookies['fixar_primario']
+        self.assertEqual(cookie['max-age'], 15)
+        self.assertTrue(cookie['httponly'])
+        # com o cookie, a leitura seguinte vê a própria escrita
+        self.assertEqual(self.placas(), ['NOV0001', 'PRI0001'])
+        # leitura sem escrita não renova a fixação; cookie expirado volta para a réplica
+        del self.client.cookies['fixar_primario']
+        self.assertEqual(self.placas(), ['REP0001'])
+        self.assertNotIn('fixar_primario', self.client.get('/api/veiculos/').cookies)
+
+    def test_usuario_autenticado_lido_do_principal(self):
+        # na réplica o gerente ainda é cliente e o usuário novo não existe
+        Usuario.objects.using('replica').filter(pk=self.gerente.pk).update(tipo='cliente')
+        novo = Usuario.objects.create(username='novo', tipo='gerente', cpf='002', telefone='0')
+        for usuario in [self.gerente, novo]:
+            with self.subTest(usuario=usuario.username):
+                client = APIClient()
+                client.force_login(usuario)
+                response = client.get('/api/veiculos/?fields=placa')
+                self.assertEqual(response.status_code, 200)
+                # escopo de gerente, dados da réplica
+                self.assertEqual([veiculo['placa'] for veiculo in response.json()['results']], ['REP0001'])
+
+    def test_cache_do_catalogo_so_guarda_leitura_do_principal(self):
+        peca = Peca.objects.create(
+            codigo='P0', nome='Peça 0', descricao='Peça de teste', fabricante='Fab',
+            quantidade_estoque=100, preco_unitario='10.00'
+        )
+        Peca.objects.using('replica').bulk_create([Peca(
+            pk=peca.pk, codigo='P0', nome='Peça 0', descricao='Peça de teste', fabricante='Fab',
+            quantidade_estoque=100, preco_unitario='10.00'
+        )])
+        catalogo.local.limpar()
+        url = f'/api/pecas/{peca.pk}/'
+
+        def estoque():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return response['X-Cache'], response.json()['quantidade_estoque']
+
+        # escrita no principal que a réplica ainda não recebeu
+        Peca.objects.reduzir_estoque(peca.pk, 30)
+        self.assertEqual(estoque(), ('MISS', 100))
+        Peca.objects.using('replica').filter(pk=peca.pk).update(quantidade_estoque=70)
+        self.assertEqual(estoque(), ('MISS', 70))
+
+        # lida no principal (sessão fixada), a peça vai para o cache e a réplica aproveita
+        self.client.cookies['fixar_primario'] = '1'
+        self.assertEqual(estoque(), ('MISS', 70))
+        del self.client.cookies['fixar_primario']
+        self.assertEqual(estoque(), ('HIT', 70))
+
+
+class SemearBenchTests(TestCase):
+    # gerador de dados e suíte de benchmark numa escala mínima: toda rota do router passa sem erro
+
+    def test_semear_e_bench_api(self):
+        saida = mock.MagicMock()
+        call_command('semear', usuarios=40, veiculos=60, pecas=30, orcamentos=300, ordens=120, stdout=saida)
+        self.assertEqual(OrdemServico.objects.count(), 120)
+        self.assertFalse(OrdemServico.objects.exclude(orcamento__status='aprovado').exists())
+        self.assertFalse(Orcamento.objects.filter(status='pendente', data_validade__lt=timezone.localdate()).exists())
+        orcamento = Orcamento.objects.filter(ordem_servico__isnull=False).first()
+        self.assertEqual(orcamento.valor_total, orcamento.valor_mao_obra + sum(
+            item.quantidade * item.preco_unitario_cobrado for item in orcamento.ordem_servico.itens_pecas.all()
+        ))
+
+        antes = Peca.objects.order_by('pk').values_list('quantidade_estoque', flat=True)[:30]
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'bench.json')
+            call_command('bench_api', repeticoes=3, aquecimento=0, saida=arquivo, stdout=saida, stderr=saida)
+            with open(arquivo, encoding='utf-8') as resultado:
+                relatorio = json.load(resultado)
+
+        self.assertEqual(relatorio['rotas_sem_caso'], [])
+        falhas = {nome: caso.get('exemplo_erro') for nome, caso in relatorio['casos'].items()
+                  if caso['erros'] or caso['requisicoes'] != 3}
+        self.maxDiff = None
+        self.assertEqual(falhas, {})
+        # tudo desfeito no fim
+        self.assertEqual(list(Peca.objects.order_by('pk').values_list('quantidade_estoque', flat=True)[:30]), list(antes))
@@ -1,15 +1,39 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.shortcuts import render
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from datetime import datetime
 from rest_framework import viewsets
 from rest_framework import filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework import serializers as drf_serializers
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, BasePermission
-from .models import Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca
-from .serializers import UsuarioSerializer, VeiculoSerializer, PecaSerializer, OrcamentoSerializer, OrdemServicoSerializer, ItemPecaSerializer
+from .models import (
+    Usuario, Veiculo, Peca, Orcamento, OrdemServico, ItemPeca, TarefaConclusao,
+    ResumoDiarioMecanico, ResumoStatusOrdem, ConsumoDiarioPeca,
+)
+from . import alteracoes, busca, conclusao
+from .instrumentacao import metricas
+from .assincrono import LeituraAssincronaMixin
+from .busca import BuscaTextoFilter
+from .cache import catalogo, invalidar_pecas
+from .campos import CamposMixin
+from .condicional import CondicionalMixin
+from .escopo import EscopoMixin
+from .exportacao import ExportacaoMixin
+from .periodo import PeriodoFilter, ler_periodo
+from .rapido import ListaRapidaMixin
+from .serializers import (
+    UsuarioSerializer, VeiculoSerializer, PecaSerializer, OrcamentoSerializer, OrdemServicoSerializer, ItemPecaSerializer,
+    PecaLoteSerializer, ItemPecaLoteSerializer, TarefaConclusaoSerializer,
+)
 
 # permissões custom pra cada tipo de usuário
 class IsCliente(BasePermission):
@@ -29,7 +53,7 @@ class IsMecanicoOrGerente(BasePermission):
         return request.user.is_authenticated and request.user.tipo in ['mecanico', 'gerente']
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(CondicionalMixin, CamposMixin, EscopoMixin, viewsets.ModelViewSet):
 
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
@@ -37,34 +61,168 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
 
 
-        queryset = Usuario.objects.all()
+        queryset = super().get_queryset()
         tipo = self.request.query_params.get('tipo', None)
         if tipo is not None:
             queryset = queryset.filter(tipo=tipo)
         return queryset
 
-class VeiculoViewSet(viewsets.ModelViewSet):
+class VeiculoViewSet(CondicionalMixin, CamposMixin, ListaRapidaMixin, LeituraAssincronaMixin, EscopoMixin, ExportacaoMixin, viewsets.ModelViewSet):
 
 
     queryset = Veiculo.objects.all().select_related('cliente')
 
     serializer_class = VeiculoSerializer
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, BuscaTextoFilter, PeriodoFilter]
 
     search_fields = ['placa', 'marca', 'modelo', 'cliente__username', 'cliente__first_name', 'cliente__last_name']
 
+    periodo_campos = ['data_cadastro']
+
     ordering_fields = ['marca', 'modelo', 'ano', 'data_cadastro']
 
     ordering = ['marca', 'modelo']
+
+    # ?expand=cliente (backend/campos.py)
+    expansoes = {'cliente': UsuarioSerializer}
+
+    # ETag/304 (backend/condicional.py): cliente_nome e cliente_info vêm do cliente
+    versao_campos = ['atualizado_em', 'cliente__atualizado_em']
     
-class PecaViewSet(viewsets.ModelViewSet):
+class PecaViewSet(CondicionalMixin, CamposMixin, ListaRapidaMixin, LeituraAssincronaMixin, ExportacaoMixin, viewsets.ModelViewSet):
     queryset = Peca.objects.all()
     serializer_class = PecaSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, BuscaTextoFilter]
     search_fields = ['codigo', 'nome', 'fabricante']
     ordering_fields = ['nome', 'fabricante', 'preco_unitario', 'quantidade_estoque']
     ordering = ['nome']
+
+    # list/retrieve passam pelo cache do catálogo (backend/cache.py), depois
+    # do 304 da leitura condicional (backend/condicional.py)
+    def list(self, request, *args, **kwargs):
+        listar = super().list
+        return self.nao_modificado(request) or self.responder_do_cache(
+            'lista', request, lambda: listar(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        detalhar = super().retrieve
+        escopo = f"peca:{kwargs[self.lookup_url_kwarg or self.lookup_field]}"
+        return self.nao_modificado(request) or self.responder_do_cache(
+            escopo, request, lambda: detalhar(request, *args, **kwargs)
+        )
+
+    def responder_do_cache(self, escopo, request, calcular):
+        dados, do_cache = catalogo.obter(escopo, request.build_absolute_uri(), lambda: calcular().data)
+        return self.resposta_do_cache(dados, do_cache)
+
+    # o mesmo para as views async (LEITURA_ASSINCRONA)
+    async def alist(self, request, *args, **kwargs):
+        listar = super().alist
+        return await self.anao_modificado(request) or await self.aresponder_do_cache(
+            'lista', request, lambda: listar(request, *args, **kwargs)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        detalhar = super().aretrieve
+        escopo = f"peca:{kwargs[self.lookup_url_kwarg or self.lookup_field]}"
+        return await self.anao_modificado(request) or await self.aresponder_do_cache(
+            escopo, request, lambda: detalhar(request, *args, **kwargs)
+        )
+
+    async def aresponder_do_cache(self, escopo, request, calcular):
+        async def calcular_dados():
+            return (await calcular()).data
+
+        dados, do_cache = await catalogo.aobter(escopo, request.build_absolute_uri(), calcular_dados)
+        return self.resposta_do_cache(dados, do_cache)
+
+    def resposta_do_cache(self, dados, do_cache):
+        response = Response(dados)
+        response['X-Cache'] = 'HIT' if do_cache else 'MISS'
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsGerente])
+    def lote(self, request):
+
+        # cria ou atualiza (por codigo) muitas peças de uma vez: valida todas
+        # as linhas antes, grava com bulk_create/bulk_update numa transação
+        linhas = request.data
+        if not isinstance(linhas, list) or not linhas:
+            return Response({'erro': 'Envie uma lista de peças'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(linhas) > settings.LOTE_MAX_LINHAS:
+            return Response(
+                {'erro': f'Máximo de {settings.LOTE_MAX_LINHAS} linhas por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        codigos = [linha.get('codigo') for linha in linhas if isinstance(linha, dict) and linha.get('codigo')]
+        existentes = dict(Peca.objects.filter(codigo__in=codigos).values_list('codigo', 'id'))
+
+        # um serializer para criação e outro parcial para atualização, reusados
+        # em todas as linhas: montar os campos a cada linha custa mais que validar
+        serializers_lote = {False: PecaLoteSerializer(), True: PecaLoteSerializer(partial=True)}
+        erros = []
+        validas = []
+        vistos = {}
+        for indice, linha in enumerate(linhas):
+            if not isinstance(linha, dict):
+                erros.append({'linha': indice, 'erros': {'non_field_errors': ['Cada linha deve ser um objeto']}})
+                continue
+            codigo = linha.get('codigo')
+            # sem código a linha cai na validação do serializer, não na de repetidos
+            if codigo:
+                if codigo in vistos:
+                    erros.append({'linha': indice, 'erros': {'codigo': [f'Código repetido no lote (linha {vistos[codigo]})']}})
+                    continue
+                vistos[codigo] = indice
+
+            peca_id = existentes.get(codigo)
+            try:
+                dados = serializers_lote[peca_id is not None].run_validation(linha)
+            except drf_serializers.ValidationError as exc:
+                erros.append({'linha': indice, 'erros': exc.detail})
+            else:
+                validas.append((peca_id, dados))
+
+        if erros:
+            return Response({'erro': 'Lote com linhas inválidas', 'linhas': erros}, status=status.HTTP_400_BAD_REQUEST)
+
+        novas = [Peca(**dados) for peca_id, dados in validas if peca_id is None]
+
+        # linhas de atualização agrupadas pelos campos enviados: um bulk_update por grupo
+        # bulk_update não passa pelo auto_now: atualizado_em vai junto
+        agora = timezone.now()
+        grupos = defaultdict(list)
+        for peca_id, dados in validas:
+            if peca_id is not None:
+                grupos[tuple(sorted(dados))].append(Peca(pk=peca_id, atualizado_em=agora, **dados))
+        atualizadas = [peca.pk for objs in grupos.values() for peca in objs]
+
+        with transaction.atomic():
+            Peca.objects.bulk_create(novas, batch_size=1000)
+            for campos, objs in grupos.items():
+                Peca.objects.bulk_update(objs, campos + ('atualizado_em',), batch_size=1000)
+            ids = [peca.pk for peca in novas] + atualizadas
+            # status e abaixo_minimo seguem quantidade_estoque/estoque_minimo gravados
+            Peca.objects.recalcular_estoque(ids)
+
+            # bulk_* não dispara post_save: índice de busca, cache e change log à mão
+            busca.reindexar(Peca, Peca.objects.filter(pk__in=ids))
+            invalidar_pecas(ids)
+            alteracoes.registrar(Peca, [peca.pk for peca in novas], 'criacao')
+            alteracoes.registrar(Peca, atualizadas, 'atualizacao')
+
+        return Response({
+            'criadas': len(novas),
+            'atualizadas': len(atualizadas),
+            'ids_criados': [peca.pk for peca in novas],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsGerente])
+    def estatisticas_cache(self, request):
+        return Response(catalogo.estatisticas(), status=status.HTTP_200_OK)
     
     def get_queryset(self):
 
@@ -83,10 +241,11 @@ class PecaViewSet(viewsets.ModelViewSet):
             
         # Filtro por estoque míni
         estoque_minimo = self.request.query_params.get('estoque_minimo')
+        # abaixo_minimo é mantido a cada movimentação de estoque e tem índice parcial
         if estoque_minimo == 'true':
-            queryset = queryset.filter(quantidade_estoque__lte=models.F('estoque_minimo'))
+            queryset = queryset.filter(abaixo_minimo=True)
         elif estoque_minimo == 'false':
-            queryset = queryset.filter(quantidade_estoque__gt=models.F('estoque_minimo'))
+            queryset = queryset.filter(abaixo_minimo=False)
             
         return queryset
         
@@ -146,8 +305,67 @@ class PecaViewSet(viewsets.ModelViewSet):
                 {'erro': f'Erro interno: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    @action(detail=False, methods=['get'])
+    def reposicao(self, request):
+
+        # fila de reposição: lê só as peças marcadas (O(resultado)) e sugere a
+        # quantidade a comprar pelo consumo médio dos últimos `dias`
+        import math
+        from datetime import timedelta
+
+        try:
+            dias = int(request.query_params.get('dias', 30))
+            cobertura = int(request.query_params.get('cobertura', 30))
+        except ValueError:
+            return Response(
+                {'erro': 'dias e cobertura devem ser números inteiros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if dias <= 0 or cobertura < 0:
+            return Response(
+                {'erro': 'dias deve ser maior que zero e cobertura não pode ser negativa'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        pecas = list(
+            Peca.objects.filter(abaixo_minimo=True)
+            .exclude(status='descontinuado')
+            .order_by('nome', 'id')
+        )
+        consumo = dict(
+            ConsumoDiarioPeca.objects
+            .filter(peca_id__in=[peca.pk for peca in pecas], data__gt=timezone.localdate() - timedelta(days=dias))
+            .values('peca_id')
+            .annotate(total=models.Sum('quantidade'))
+            .values_list('peca_id', 'total')
+        )
+
+        fila = []
+        for peca in pecas:
+            consumido = consumo.get(peca.pk, 0)
+            media_diaria = consumido / dias
+            alvo = peca.estoque_minimo + math.ceil(media_diaria * cobertura)
+            fila.append({
+                'id': peca.id,
+                'codigo': peca.codigo,
+                'nome': peca.nome,
+                'fabricante': peca.fabricante,
+                'quantidade_estoque': peca.quantidade_estoque,
+                'estoque_minimo': peca.estoque_minimo,
+                'status': peca.status,
+                'consumo_periodo': consumido,
+                'consumo_medio_diario': round(media_diaria, 2),
+                'quantidade_sugerida': max(alvo - peca.quantidade_estoque, 0),
+            })
+
+        return Response({
+            'dias': dias,
+            'cobertura': cobertura,
+            'pecas': fila
+        }, status=status.HTTP_200_OK)
     
-class OrcamentoViewSet(viewsets.ModelViewSet):
+class OrcamentoViewSet(CondicionalMixin, CamposMixin, LeituraAssincronaMixin, EscopoMixin, ExportacaoMixin, viewsets.ModelViewSet):
 
     queryset = Orcamento.objects.all().select_related('veiculo', 'mecanico_responsavel')
 
@@ -155,35 +373,29 @@ class OrcamentoViewSet(viewsets.ModelViewSet):
 
     permission_classes = [IsAuthenticated]
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, BuscaTextoFilter, PeriodoFilter]
 
     search_fields = ['veiculo__placa', 'mecanico_responsavel__username', 'descricao_problema']
 
+    periodo_campos = ['data_criacao']
+
     ordering_fields = ['data_criacao', 'data_validade', 'valor_total', 'status']
 
     ordering = ['-data_criacao']
+
+    expansoes = {'veiculo': VeiculoSerializer}
+
+    versao_campos = [
+        'atualizado_em', 'veiculo__atualizado_em', 'veiculo__cliente__atualizado_em',
+        'mecanico_responsavel__atualizado_em',
+    ]
     
     def get_queryset(self):
 
-        user = self.request.user
+        # filtro de permissão por tipo de usuário: EscopoMixin (backend/escopo.py)
+        # veiculo__cliente: aprovar/rejeitar comparam o dono do veículo com o usuário
+        queryset = super().get_queryset().select_related('veiculo__cliente', 'mecanico_responsavel')
 
-        queryset = Orcamento.objects.select_related('veiculo', 'mecanico_responsavel')
-        
-        #filtro de permissão
-
-        if user.tipo == 'cliente':
-            # Procliente ver apenas orçamentos dos seus próprios veículos
-            queryset = queryset.filter(veiculo__cliente=user)
-        elif user.tipo == 'mecanico':
-            # Mecânico vê orçamentos atribuídos a ele
-            queryset = queryset.filter(mecanico_responsavel=user)
-        elif user.tipo == 'gerente':
-            # Gerente pode ver todos os orçamentos
-            pass
-        else:
-            # Se não é nenhum tipo reconhecido, não vê nada
-            queryset = queryset.none()
-            
         #  filtros doquery params
         cliente = self.request.query_params.get('cliente')
 
@@ -195,19 +407,8 @@ class OrcamentoViewSet(viewsets.ModelViewSet):
         if status_filtro:
             queryset = queryset.filter(status=status_filtro)
             
-        # Filtro por período
-        data_inicio = self.request.query_params.get('data_inicio')
-
-        data_fim = self.request.query_params.get('data_fim')
-
-        if data_inicio:
-
-            queryset = queryset.filter(data_criacao__date__gte=data_inicio)
-
-        if data_fim:
+        # Filtro por período: PeriodoFilter (data_inicio, data_fim ou periodo sobre data_criacao)
 
-            queryset = queryset.filter(data_criacao__date__lte=data_fim)
-            
         return queryset
     
     @action(detail=True, methods=['post'])
@@ -254,7 +455,9 @@ class OrcamentoViewSet(viewsets.ModelViewSet):
 
         orcamento.observacoes = f"Rejeitado: {motivo}"
 
-        orcamento.save()
+        # status e evento do outbox (backend/eventos.py) na mesma transação
+        with transaction.atomic():
+            orcamento.save()
         
         return Response({'mensagem': 'Orçamento rejeitado com sucesso'}, status=status.HTTP_200_OK)
     
@@ -298,40 +501,66 @@ class OrcamentoViewSet(viewsets.ModelViewSet):
 
         km_entrada = request.data.get('km_entrada', 0)
         
-        ordem = OrdemServico.objects.create(
-            orcamento=orcamento,
-            data_inicio=data_inicio,
-            data_previsao=data_previsao,
-            km_entrada=km_entrada,
-            status='em_andamento'
-        )
+        with transaction.atomic():
+            ordem = OrdemServico.objects.create(
+                orcamento=orcamento,
+                data_inicio=data_inicio,
+                data_previsao=data_previsao,
+                km_entrada=km_entrada,
+                status='em_andamento'
+            )
         
         serializer = OrdemServicoSerializer(ordem)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
-class OrdemServicoViewSet(viewsets.ModelViewSet):
+class OrdemServicoViewSet(CondicionalMixin, CamposMixin, EscopoMixin, ExportacaoMixin, viewsets.ModelViewSet):
 
-    queryset = OrdemServico.objects.all().select_related('orcamento__veiculo').prefetch_related('itens_pecas')
+    queryset = OrdemServico.objects.all().select_related('orcamento__veiculo')
 
     serializer_class = OrdemServicoSerializer
 
     permission_classes = [IsAuthenticated]
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter, PeriodoFilter]
 
     search_fields = ['orcamento__veiculo__placa', 'status']
 
+    periodo_campos = ['data_inicio', 'data_conclusao']
+
     ordering_fields = ['data_inicio', 'data_previsao', 'data_conclusao', 'status']
 
     ordering = ['-data_inicio']
+
+    expansoes = {'orcamento': OrcamentoSerializer}
+
+    # o detalhe mostra o orçamento, os itens e o estoque de cada peça
+    versao_campos = [
+        'atualizado_em', 'orcamento__atualizado_em', 'orcamento__veiculo__atualizado_em',
+        'orcamento__mecanico_responsavel__atualizado_em', 'itens_pecas__atualizado_em',
+        'itens_pecas__peca__atualizado_em',
+    ]
+
+    def get_queryset(self):
+
+        queryset = super().get_queryset()
+
+        # list/retrieve serializam itens_pecas e leem peca.nome, peca.codigo e
+        # peca.quantidade_estoque de cada item: uma query para itens+peças
+        # (nenhuma se ?fields=/?exclude= deixar itens_pecas de fora)
+        if self.action in ('list', 'retrieve') and self.campo_pedido('itens_pecas'):
+            queryset = queryset.prefetch_related(
+                Prefetch('itens_pecas', queryset=ItemPeca.objects.select_related('peca'))
+            )
+        return queryset
     
     @action(detail=True, methods=['post'])
     def adicionar_peca(self, request, pk=None):
 
 
-        try:
+        # fora do try: ordem fora do escopo do usuário é 404, não erro interno
+        ordem = self.get_object()
 
-            ordem = self.get_object()
+        try:
 
             user = request.user
             
@@ -397,10 +626,91 @@ class OrdemServicoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['post'])
+    def adicionar_pecas(self, request, pk=None):
+
+        # versão em lote de adicionar_peca: todas as linhas validadas antes,
+        # estoque conferido com uma query e itens gravados com bulk_create
+        ordem = self.get_object()
+
+        if request.user.tipo not in ['mecanico', 'gerente']:
+            return Response(
+                {'erro': 'Apenas mecânicos e gerentes podem adicionar peças'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        linhas = request.data
+        if not isinstance(linhas, list) or not linhas:
+            return Response({'erro': 'Envie uma lista de peças'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(linhas) > settings.LOTE_MAX_LINHAS:
+            return Response(
+                {'erro': f'Máximo de {settings.LOTE_MAX_LINHAS} linhas por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = ItemPecaLoteSerializer(data=linhas, many=True)
+        if not serializer.is_valid():
+            return Response({
+                'erro': 'Lote com linhas inválidas',
+                'linhas': [{'linha': indice, 'erros': erro} for indice, erro in enumerate(serializer.errors) if erro]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        validas = list(enumerate(serializer.validated_data))
+
+        with transaction.atomic():
+            # trava a ordem: nada de concluir no meio da inclusão
+            ordem = OrdemServico.objects.select_for_update().get(pk=ordem.pk)
+            if ordem.status not in ['em_andamento', 'aguardando_pecas']:
+                return Response(
+                    {'erro': 'Peças só podem ser adicionadas em ordens em andamento ou aguardando peças'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            peca_ids = [dados['peca_id'] for _, dados in validas]
+            pecas = Peca.objects.in_bulk(peca_ids)
+            ja_na_ordem = set(ordem.itens_pecas.filter(peca_id__in=peca_ids).values_list('peca_id', flat=True))
+
+            linhas_erro = []
+            vistos = {}
+            for indice, dados in validas:
+                peca = pecas.get(dados['peca_id'])
+                if peca is None:
+                    linhas_erro.append({'linha': indice, 'erros': {'peca_id': ['Peça não encontrada']}})
+                elif dados['peca_id'] in vistos:
+                    linhas_erro.append({'linha': indice, 'erros': {'peca_id': [f"Peça repetida no lote (linha {vistos[dados['peca_id']]})"]}})
+                elif dados['peca_id'] in ja_na_ordem:
+                    linhas_erro.append({'linha': indice, 'erros': {'peca_id': ['Peça já adicionada a essa ordem']}})
+                else:
+                    disponivel, mensagem = peca.verificar_disponibilidade(dados['quantidade'])
+                    if not disponivel:
+                        linhas_erro.append({'linha': indice, 'erros': {'quantidade': [mensagem]}})
+                vistos.setdefault(dados['peca_id'], indice)
+
+            if linhas_erro:
+                return Response({'erro': 'Lote com linhas inválidas', 'linhas': linhas_erro}, status=status.HTTP_400_BAD_REQUEST)
+
+            itens = ItemPeca.objects.bulk_create([
+                ItemPeca(
+                    ordem_servico=ordem,
+                    peca=pecas[dados['peca_id']],
+                    quantidade=dados['quantidade'],
+                    preco_unitario_cobrado=dados['preco_unitario_cobrado']
+                )
+                for _, dados in validas
+            ], batch_size=1000)
+            alteracoes.registrar(ItemPeca, [item.pk for item in itens], 'criacao')
+
+        return Response(ItemPecaSerializer(itens, many=True).data, status=status.HTTP_201_CREATED)
+
+    def conclusao_assincrona(self, request):
+        valor = request.query_params.get('assincrono')
+        if valor is None:
+            return getattr(settings, 'CONCLUSAO_ASSINCRONA', False)
+        return valor.lower() in ('1', 'true', 'sim')
+
     @action(detail=True, methods=['post'])
     def concluir(self, request, pk=None):
+        ordem = self.get_object()
         try:
-            ordem = self.get_object()
             user = request.user
             
             if user.tipo not in ['mecanico', 'gerente']:
@@ -421,44 +731,17 @@ class OrdemServicoViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
-            estoque_insuficiente = []
-            for item in ordem.itens_pecas.all():
-                if not item.estoque_reduzido:  # Só verificar se ainda não foi reduzido
-                    disponivel, mensagem = item.peca.verificar_disponibilidade(item.quantidade)
-                    if not disponivel:
-                        estoque_insuficiente.append({
-                            'peca': item.peca.codigo,
-                            'nome': item.peca.nome,
-                            'quantidade_necessaria': item.quantidade,
-                            'quantidade_disponivel': item.peca.quantidade_estoque,
-                            'erro': mensagem
-                        })
-                        
-            if estoque_insuficiente:
-                return Response({
-                    'erro': 'Estoque insuficiente para concluir ordem de serviço',
-                    'pecas_com_problema': estoque_insuficiente
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-            ordem.status = 'concluido'
-            ordem.data_conclusao = timezone.now()
-            ordem.save()
-            
-            
-            return Response({
-                'mensagem': 'Ordem de serviço concluída com sucesso',
-                'ordem_servico_id': ordem.id,
-                'data_conclusao': ordem.data_conclusao,
-                'pecas_utilizadas': [
-                    {
-                        'codigo': item.peca.codigo,
-                        'nome': item.peca.nome,
-                        'quantidade_utilizada': item.quantidade,
-                        'estoque_atual': item.peca.quantidade_estoque
-                    }
-                    for item in ordem.itens_pecas.all()
-                ]
-            }, status=status.HTTP_200_OK)
+            # ?assincrono=true (ou CONCLUSAO_ASSINCRONA): enfileira e responde 202 com a tarefa
+            if self.conclusao_assincrona(request):
+                tarefa, _ = conclusao.enfileirar(ordem, user)
+                url = reverse('tarefaconclusao-detail', args=[tarefa.pk], request=request)
+                return Response(
+                    {'tarefa_id': tarefa.pk, 'status': tarefa.status, 'url': url},
+                    status=status.HTTP_202_ACCEPTED, headers={'Location': url}
+                )
+
+            codigo, corpo = conclusao.concluir_ordem(ordem.pk)
+            return Response(corpo, status=codigo)
             
         except Exception as e:
             return Response(
@@ -466,7 +749,7 @@ class OrdemServicoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-class ItemPecaViewSet(viewsets.ModelViewSet):
+class ItemPecaViewSet(CondicionalMixin, CamposMixin, EscopoMixin, ExportacaoMixin, viewsets.ModelViewSet):
 
     queryset = ItemPeca.objects.all().select_related('ordem_servico', 'peca')
 
@@ -478,4 +761,168 @@ class ItemPecaViewSet(viewsets.ModelViewSet):
 
     ordering_fields = ['quantidade', 'preco_unitario_cobrado']
     
-    ordering = ['peca__nome'] 
\ No newline at end of file
+    ordering = ['peca__nome']
+
+    expansoes = {'peca': PecaSerializer}
+
+    versao_campos = ['atualizado_em', 'peca__atualizado_em']
+
+class TarefaConclusaoViewSet(CamposMixin, EscopoMixin, viewsets.ReadOnlyModelViewSet):
+
+    # acompanhamento das conclusões enfileiradas por concluir?assincrono=true
+    queryset = TarefaConclusao.objects.all()
+
+    serializer_class = TarefaConclusaoSerializer
+
+    permission_classes = [IsMecanicoOrGerente]
+
+    ordering = ['-criada_em']
+
+    # o cliente consulta logo depois de enfileirar: uma réplica atrasada responderia 404
+    replica = False
+
+class RelatorioViewSet(viewsets.ViewSet):
+
+    # leituras sobre as tabelas de resumo: custo proporcional aos dias, não às linhas
+    permission_classes = [IsGerente]
+
+    def get_periodo(self, request):
+
+        from datetime import timedelta
+
+        fim = timezone.localdate()
+        return ler_periodo(request.query_params, padrao=(fim - timedelta(days=30), fim))
+
+    def list(self, request):
+
+        try:
+            inicio, fim = self.get_periodo(request)
+        except ValidationError as e:
+            return Response({'erro': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        receita = (
+            ResumoDiarioMecanico.objects
+            .filter(data__gte=inicio, data__lte=fim)
+            .values('mecanico_id', 'mecanico__username')
+            .annotate(
+                orcamentos_aprovados=models.Sum('orcamentos_aprovados'),
+                valor_aprovado=models.Sum('valor_aprovado'),
+                ordens_concluidas=models.Sum('ordens_concluidas'),
+                valor_concluido=models.Sum('valor_concluido'),
+            )
+            .order_by('-valor_concluido')
+        )
+        consumo = (
+            ConsumoDiarioPeca.objects
+            .filter(data__gte=inicio, data__lte=fim)
+            .values('peca_id', 'peca__codigo', 'peca__nome')
+            .annotate(quantidade=models.Sum('quantidade'))
+            .order_by('-quantidade')
+        )
+
+        return Response({
+            'periodo': {'inicio': inicio, 'fim': fim},
+            'receita_por_mecanico': [
+                {
+                    'mecanico_id': linha['mecanico_id'],
+                    'mecanico': linha['mecanico__username'],
+                    'orcamentos_aprovados': linha['orcamentos_aprovados'],
+                    'valor_aprovado': linha['valor_aprovado'],
+                    'ordens_concluidas': linha['ordens_concluidas'],
+                    'valor_concluido': linha['valor_concluido'],
+                }
+                for linha in receita
+            ],
+            'ordens_por_status': {
+                linha['status']: linha['quantidade']
+                for linha in ResumoStatusOrdem.objects.values('status')
+                .annotate(quantidade=models.Sum('quantidade')).filter(quantidade__gt=0).order_by('status')
+            },
+            'consumo_pecas': [
+                {
+                    'peca_id': linha['peca_id'],
+                    'codigo': linha['peca__codigo'],
+                    'nome': linha['peca__nome'],
+                    'quantidade': linha['quantidade'],
+                }
+                for linha in consumo
+            ],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def receita_diaria(self, request):
+
+        try:
+            inicio, fim = self.get_periodo(request)
+        except ValidationError as e:
+            return Response({'erro': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = ResumoDiarioMecanico.objects.filter(data__gte=inicio, data__lte=fim)
+        mecanico = request.query_params.get('mecanico')
+        if mecanico:
+            queryset = queryset.filter(mecanico_id=mecanico)
+
+        return Response([
+            {
+                'data': resumo['data'],
+                'orcamentos_aprovados': resumo['orcamentos_aprovados'],
+                'valor_aprovado': resumo['valor_aprovado'],
+                'ordens_concluidas': resumo['ordens_concluidas'],
+                'valor_concluido': resumo['valor_concluido'],
+            }
+            for resumo in queryset.values('data').annotate(
+                orcamentos_aprovados=models.Sum('orcamentos_aprovados'),
+                valor_aprovado=models.Sum('valor_aprovado'),
+                ordens_concluidas=models.Sum('ordens_concluidas'),
+                valor_concluido=models.Sum('valor_concluido'),
+            ).order_by('data')
+        ], status=status.HTTP_200_OK)
+
+
+class AlteracaoViewSet(viewsets.ViewSet):
+
+    # change log para sincronização incremental (backend/alteracoes.py)
+    permission_classes = [IsGerente]
+
+    # o offset desde= é do principal: na réplica o cliente poderia pular alterações
+    replica = False
+
+    def list(self, request):
+        params = request.query_params
+        try:
+            desde = int(params.get('desde', 0))
+            limite = int(params.get('limite', settings.ALTERACOES_LIMITE))
+        except ValueError:
+            return Response({'erro': 'desde e limite devem ser números inteiros'}, status=status.HTTP_400_BAD_REQUEST)
+        if desde < 0 or not 0 < limite <= settings.ALTERACOES_LIMITE:
+            return Response(
+                {'erro': f'desde deve ser >= 0 e limite entre 1 e {settings.ALTERACOES_LIMITE}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tabelas = [tabela for tabela in params.get('tabela', '').split(',') if tabela]
+        desconhecidas = [tabela for tabela in tabelas if tabela not in alteracoes.TABELAS]
+        if desconhecidas:
+            return Response(
+                {'erro': f'Tabelas desconhecidas: {", ".join(desconhecidas)}. Use: {", ".join(alteracoes.TABELAS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return alteracoes.resposta_alteracoes(request, desde, limite, tabelas)
+
+
+class MetricaViewSet(viewsets.ViewSet):
+
+    # histogramas da instrumentação por view e ação, deste processo (backend/instrumentacao.py)
+    permission_classes = [IsGerente]
+
+    # não lê o banco
+    replica = False
+
+    def list(self, request):
+        return Response(metricas.como_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def zerar(self, request):
+        metricas.zerar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oficina.settings')
+# leituras de peças, veículos e orçamentos pelas views async (LEITURA_ASSINCRONA)
+os.environ.setdefault('LEITURA_ASSINCRONA', '1')
 
 application = get_asgi_application()
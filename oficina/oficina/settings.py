@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # primeiro da lista: mede também o que os outros middlewares consultam
+    'backend.instrumentacao.InstrumentacaoMiddleware',
+    # antes de sessão e autenticação: as leituras delas seguem a réplica do request
+    'backend.roteamento.RoteamentoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,25 +79,92 @@ WSGI_APPLICATION = 'oficina.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Configuração para SQLite (desenvolvimento)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# BANCO=sqlite (padrão, desenvolvimento) ou postgresql (produção, configurado
+# pelas variáveis POSTGRES_*)
+BANCO = os.environ.get('BANCO', 'sqlite')
+
+if BANCO == 'postgresql':
+    # pool do psycopg 3 por processo: no fim do request a conexão volta para o
+    # pool em vez de fechar. Atrás de um PgBouncer, POSTGRES_POOL=0 mantém a
+    # conexão do próprio Django aberta por POSTGRES_CONN_MAX_AGE segundos.
+    # CONN_HEALTH_CHECKS testa a conexão antes de reaproveitá-la (no pool, ao
+    # tirá-la dele) e descarta as que o servidor derrubou
+    POSTGRES_POOL = os.environ.get('POSTGRES_POOL', '1') == '1'
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'oficina_db'),
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # PgBouncer em modo transaction não mantém cursores entre transações
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_PGBOUNCER', '0') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('POSTGRES_CONNECT_TIMEOUT', 5)),
+            # teto de cada statement (ms) em toda conexão: uma query presa é
+            # cancelada em vez de segurar o worker e a conexão do pool
+            'options': '-c statement_timeout={} -c idle_in_transaction_session_timeout={}'.format(
+                int(os.environ.get('POSTGRES_STATEMENT_TIMEOUT', 30000)),
+                int(os.environ.get('POSTGRES_IDLE_TRANSACTION_TIMEOUT', 60000)),
+            ),
+        },
     }
-}
+    if POSTGRES_POOL:
+        _postgres['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+            # segundos esperando uma conexão livre antes de dar erro
+            'timeout': float(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+        }
+    DATABASES = {'default': _postgres}
+
+    # POSTGRES_REPLICA_HOST=host1,host2 liga as réplicas de leitura
+    # (backend/roteamento.py), com os aliases replica, replica_2, ...
+    REPLICAS_LEITURA = []
+    for _indice, _host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOST', '').split(','))):
+        _alias = 'replica' if _indice == 0 else f'replica_{_indice + 1}'
+        DATABASES[_alias] = {
+            **_postgres,
+            'HOST': _host.strip(),
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', _postgres['PORT']),
+            'OPTIONS': {**_postgres['OPTIONS']},
+            # nos testes a réplica é o próprio banco de teste
+            'TEST': {'MIRROR': 'default'},
+        }
+        REPLICAS_LEITURA.append(_alias)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # SQLITE_PATH aponta outro arquivo (ex.: servidores do bench_servidores)
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # escritas concorrentes (requests e workers de conclusão): a transação
+            # já pega a trava de escrita ao abrir e espera até 20s por ela, em vez
+            # de falhar com "database is locked" ao promover leitura para escrita
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
+    }
+    # réplica local: outro arquivo SQLite (SQLITE_REPLICA_PATH) atualizado por
+    # fora, ex. uma cópia periódica do principal. Sem ele o alias aponta para o
+    # próprio principal e fica fora do roteamento; nos testes vira um banco de
+    # teste separado, que ReplicaTests liga com override_settings
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('SQLITE_REPLICA_PATH', DATABASES['default']['NAME']),
+    }
+    REPLICAS_LEITURA = ['replica'] if os.environ.get('SQLITE_REPLICA_PATH') else []
 
-# Configuração para PostgreSQL (produção) - comentada para desenvolvimento
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': 'oficina_db',
-#         'USER': 'postgres',
-#         'PASSWORD': 'password',
-#         'HOST': 'localhost',
-#         'PORT': '5432',
-#     }
-# }
+DATABASE_ROUTERS = ['backend.roteamento.RoteadorReplica']
+# GET destas ações vai para uma réplica (viewsets com replica = False ficam fora)
+REPLICA_ACOES = ['list', 'retrieve', 'exportar', 'receita_diaria']
+# depois de uma escrita, a sessão lê do principal por este tempo (mais que o atraso da réplica)
+REPLICA_FIXACAO_SEGUNDOS = 15
+REPLICA_FIXACAO_COOKIE = 'fixar_primario'
 
 
 # Password validation
@@ -138,3 +210,81 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # usuário custom
 AUTH_USER_MODEL = 'backend.Usuario'
+
+# paginação por cursor (keyset) em todos os endpoints do router
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.KeysetPagination',
+}
+
+PAGINACAO_PAGE_SIZE = 50
+PAGINACAO_MAX_PAGE_SIZE = 500
+
+# cache read-through do catálogo de peças (backend/cache.py)
+CATALOGO_CACHE_MAX_ITENS = 1000
+# alias em CACHES compartilhado entre processos (ex.: Redis); None = só o LRU local,
+# que fica desligado quando WEB_CONCURRENCY (processos do gunicorn/uvicorn) > 1
+CATALOGO_CACHE_BACKEND = os.environ.get('CATALOGO_CACHE_BACKEND') or None
+CATALOGO_CACHE_TIMEOUT = 300
+# validade das entradas no LRU local de cada processo
+CATALOGO_CACHE_TIMEOUT_LOCAL = 30
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# linhas por status em ResumoStatusOrdem (backend/relatorios.py): mais fatias,
+# menos espera entre conclusões simultâneas
+RELATORIOS_FATIAS = 8
+
+# tamanho máximo dos endpoints de lote (/api/pecas/lote/, adicionar_pecas)
+LOTE_MAX_LINHAS = 10000
+
+# linhas lidas do banco por vez nas exportações em streaming (exportar/)
+EXPORTACAO_CHUNK_SIZE = 2000
+
+# concluir de ordem de serviço: ?assincrono=true enfileira e responde 202;
+# com CONCLUSAO_ASSINCRONA = True esse passa a ser o padrão
+CONCLUSAO_ASSINCRONA = False
+# threads do pool no próprio processo; com CONCLUSAO_POOL_LOCAL = False as
+# tarefas ficam para manage.py processar_conclusoes
+CONCLUSAO_POOL_LOCAL = True
+CONCLUSAO_WORKERS = 4
+CONCLUSAO_MAX_TENTATIVAS = 3
+# tarefas em processamento há mais que isso (s) voltam para a fila quando um pool
+# local sobe ou fica ocioso (worker que morreu no meio da conclusão)
+CONCLUSAO_TIMEOUT_ABANDONADA = 300
+
+# GET de list/retrieve de peças, veículos e orçamentos como views async
+# (backend/assincrono.py); oficina/asgi.py liga por padrão, WSGI fica síncrono
+LEITURA_ASSINCRONA = os.environ.get('LEITURA_ASSINCRONA', '0') == '1'
+
+# listagens de veículos e peças montadas direto de values_list (backend/rapido.py)
+LISTA_RAPIDA = True
+
+# feed de eventos SSE (backend/eventos.py): consulta ao outbox por processo a
+# cada EVENTOS_INTERVALO segundos, comentário de heartbeat, e conexão fechada
+# depois de EVENTOS_DURACAO segundos (o navegador reconecta com Last-Event-ID)
+EVENTOS_INTERVALO = 1.0
+EVENTOS_HEARTBEAT = 15.0
+EVENTOS_DURACAO = 300
+EVENTOS_RETRY = 3.0
+# segundos em que um id já entregue ainda é relido, para eventos de transações que terminaram fora de ordem
+EVENTOS_JANELA = 5.0
+# eventos pendentes por conexão antes de ela ser fechada
+EVENTOS_FILA_MAXIMA = 1000
+
+# change log (backend/alteracoes.py): máximo de entradas por leitura de
+# /api/alteracoes/, e segundos que uma entrada espera antes de ser entregue.
+# No SQLite as escritas são serializadas e os offsets ficam visíveis em ordem;
+# com escritas concorrentes (PostgreSQL) uma transação lenta pode gravar um
+# offset menor depois de um maior já lido, então use um atraso maior que a
+# transação mais longa.
+ALTERACOES_LIMITE = 10000
+ALTERACOES_ATRASO = 0
+
+# instrumentação por requisição (backend/instrumentacao.py): cabeçalhos
+# Server-Timing/X-Consultas/X-Consultas-Repetidas nas respostas, e quantos SQLs
+# repetidos diferentes cada view guarda nos histogramas de /api/metricas/
+INSTRUMENTACAO_CABECALHOS = True
+INSTRUMENTACAO_MAX_REPETIDAS = 20
+
+# GET /metrics (backend/contadores.py): com token, o scraper manda
+# Authorization: Bearer <token>; sem token o endpoint fica aberto
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN') or None
@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from backend import views
+from backend import contadores, eventos, views
 
 router = DefaultRouter()
 router.register(r'usuarios', views.UsuarioViewSet)
@@ -26,8 +26,16 @@ router.register(r'pecas', views.PecaViewSet)
 router.register(r'orcamentos', views.OrcamentoViewSet)
 router.register(r'ordens-servico', views.OrdemServicoViewSet)
 router.register(r'itens-peca', views.ItemPecaViewSet)
+router.register(r'tarefas-conclusao', views.TarefaConclusaoViewSet)
+router.register(r'relatorios', views.RelatorioViewSet, basename='relatorio')
+router.register(r'alteracoes', views.AlteracaoViewSet, basename='alteracao')
+router.register(r'metricas', views.MetricaViewSet, basename='metrica')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # server-sent events, servido pelo ASGI (oficina/asgi.py)
+    path('api/eventos/', eventos.feed, name='eventos'),
+    # métricas no formato do Prometheus, sem tocar no banco (backend/contadores.py)
+    path('metrics', contadores.metrics, name='metrics'),
     path('api/', include(router.urls)),
 ]